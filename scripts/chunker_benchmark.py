@@ -0,0 +1,148 @@
+"""Compare how soon the text chunkers produce the first chunk to synthesize, given the token stream of a language model.
+
+The token streams are recorded once (with the time each token arrived) and then replayed into every chunker, so that all of them see the exact same input. By default the streams are generated by an OpenAI compatible chat completion API (set `CHAT_COMPLETION_BASE_URL`, `CHAT_COMPLETION_API_KEY` and `CHAT_COMPLETION_MODEL`). Without one, sample texts are replayed at a fixed rate of `TOKENS_PER_SECOND`.
+
+Usage:
+    uv run python scripts/chunker_benchmark.py
+"""
+
+import asyncio
+import re
+import statistics
+import time
+
+from openai import AsyncOpenAI
+from pydantic import BaseModel, SecretStr
+from pydantic_settings import BaseSettings
+
+from speaches.text_utils import ClauseChunker, SentenceChunker, TextChunker
+
+PROMPTS = [
+    "Explain in a few sentences why the sky is blue.",
+    "Give me three tips for a job interview, as a numbered list.",
+    "Who was Dr. Martin Luther King Jr. and what is he known for?",
+    "What's 12.5% of 3,200? Explain how you got there.",
+]
+SAMPLE_TEXTS = [
+    "Sure! The sky looks blue because of Rayleigh scattering, which affects shorter wavelengths of light much more than longer ones. As sunlight passes through the atmosphere, blue light gets scattered in every direction, so it reaches your eyes from all over the sky.",
+    "Here are three tips:\n1. Research the company beforehand.\n2. Prepare a few questions of your own.\n3. Arrive about 10 minutes early, e.g. to find the right room.",
+    "Dr. Martin Luther King Jr. was an American minister and activist, who led the civil rights movement from 1955 until his assassination in 1968. He's best known for his role in advancing civil rights through nonviolence.",
+    "12.5% of 3,200 is 400. To get there, note that 12.5% is one eighth, and 3,200 divided by 8 is 400.",
+]
+# roughly how a BPE tokenizer splits English text: words with their leading space, numbers and punctuation separately
+TOKEN_PATTERN = re.compile(r" ?\w+|\s+|[^\w\s]")
+
+
+class Config(BaseSettings):
+    chat_completion_base_url: str | None = None
+    chat_completion_api_key: SecretStr = SecretStr("does-not-matter")
+    chat_completion_model: str = "gpt-4o-mini"
+    tokens_per_second: float = 50
+    iterations: int = 3
+
+
+# (seconds since the start of the stream, token)
+type TokenStream = list[tuple[float, str]]
+
+
+class ChunkerResult(BaseModel):
+    time_to_first_chunk: float
+    first_chunk_words: int
+    average_chunk_words: float
+    total_chunks: int
+
+
+async def record_llm_stream(client: AsyncOpenAI, model: str, prompt: str) -> TokenStream:
+    stream = await client.chat.completions.create(
+        model=model, messages=[{"role": "user", "content": prompt}], stream=True
+    )
+    start = time.perf_counter()
+    tokens: TokenStream = []
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            tokens.append((time.perf_counter() - start, chunk.choices[0].delta.content))
+    return tokens
+
+
+def simulate_stream(text: str, tokens_per_second: float) -> TokenStream:
+    return [(i / tokens_per_second, token) for i, token in enumerate(TOKEN_PATTERN.findall(text))]
+
+
+async def replay(tokens: TokenStream, chunker: TextChunker) -> ChunkerResult:
+    async def produce() -> None:
+        start = time.perf_counter()
+        for offset, token in tokens:
+            await asyncio.sleep(max(0, offset - (time.perf_counter() - start)))
+            chunker.add_token(token)
+        chunker.close()
+
+    start = time.perf_counter()
+    producer = asyncio.create_task(produce())
+    chunks: list[str] = []
+    time_to_first_chunk = 0.0
+    async for chunk in chunker:
+        if not chunks:
+            time_to_first_chunk = time.perf_counter() - start
+        chunks.append(chunk)
+    await producer
+    word_counts = [len(chunk.split()) for chunk in chunks]
+    return ChunkerResult(
+        time_to_first_chunk=time_to_first_chunk,
+        first_chunk_words=word_counts[0] if word_counts else 0,
+        average_chunk_words=statistics.mean(word_counts) if word_counts else 0,
+        total_chunks=len(chunks),
+    )
+
+
+async def measure_scan_time(tokens: TokenStream, chunker: TextChunker) -> float:
+    """CPU time spent chunking a stream, without waiting between the tokens."""
+
+    async def consume() -> None:
+        async for _ in chunker:
+            pass
+
+    start = time.process_time()
+    consumer = asyncio.create_task(consume())
+    for _, token in tokens:
+        chunker.add_token(token)
+        # let the consumer wake up after every token, like it would when tokens arrive one at a time
+        await asyncio.sleep(0)
+    chunker.close()
+    await consumer
+    return time.process_time() - start
+
+
+async def main(config: Config) -> None:
+    if config.chat_completion_base_url is not None:
+        client = AsyncOpenAI(
+            base_url=config.chat_completion_base_url, api_key=config.chat_completion_api_key.get_secret_value()
+        )
+        streams = [
+            await record_llm_stream(client, config.chat_completion_model, prompt)
+            for prompt in PROMPTS
+            for _ in range(config.iterations)
+        ]
+    else:
+        streams = [simulate_stream(text, config.tokens_per_second) for text in SAMPLE_TEXTS]
+
+    chunker_factories = {
+        "SentenceChunker": SentenceChunker,
+        "ClauseChunker": ClauseChunker,
+    }
+    print(
+        f"{'chunker':<16} {'time to first chunk (ms)':>25} {'first chunk words':>18} {'avg chunk words':>16} {'scan time (ms)':>15}"
+    )
+    for name, chunker_factory in chunker_factories.items():
+        results = [await replay(tokens, chunker_factory()) for tokens in streams]
+        scan_time = statistics.mean([await measure_scan_time(tokens, chunker_factory()) for tokens in streams])
+        print(
+            f"{name:<16} "
+            f"{statistics.mean(r.time_to_first_chunk for r in results) * 1000:>25.1f} "
+            f"{statistics.mean(r.first_chunk_words for r in results):>18.1f} "
+            f"{statistics.mean(r.average_chunk_words for r in results):>16.1f} "
+            f"{scan_time * 1000:>15.3f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(Config()))
@@ -1,36 +1,19 @@
 import base64
-from collections.abc import Generator
+from collections.abc import Buffer, Generator, Iterable
+from functools import lru_cache
 import io
+import itertools
 import logging
-import queue as queue_module
-import subprocess
-import threading
+import tempfile
 from typing import BinaryIO, Literal, Self, cast
 
+import av
 import numpy as np
 import soundfile as sf
 
-logger = logging.getLogger(__name__)
-
+from speaches.resample import StreamingResampler, resample
 
-# NOTE: `signal.resample_poly` **might** be a better option for resampling audio data
-def resample_audio_data(
-    data: np.typing.NDArray[np.float32], sample_rate: int, target_sample_rate: int
-) -> np.typing.NDArray[np.float32]:
-    ratio = target_sample_rate / sample_rate
-    target_length = int(len(data) * ratio)
-    return np.interp(np.linspace(0, len(data), target_length), np.arange(len(data)), data).astype(np.float32)
-
-
-# aip 'Write a function `resample_audio` which would take in RAW PCM 16-bit signed, little-endian audio data represented as bytes (`audio_bytes`) and resample it (either downsample or upsample) from `sample_rate` to `target_sample_rate` using numpy'
-def resample_audio_bytes(audio_bytes: bytes, sample_rate: int, target_sample_rate: int) -> bytes:
-    audio_data = np.frombuffer(audio_bytes, dtype=np.int16)
-    duration = len(audio_data) / sample_rate
-    target_length = int(duration * target_sample_rate)
-    resampled_data = np.interp(
-        np.linspace(0, len(audio_data), target_length, endpoint=False), np.arange(len(audio_data)), audio_data
-    )
-    return resampled_data.astype(np.int16).tobytes()
+logger = logging.getLogger(__name__)
 
 
 def convert_audio_format(
@@ -69,34 +52,416 @@ def audio_samples_from_file(file: BinaryIO, sample_rate: int) -> np.typing.NDArr
     return cast("np.typing.NDArray[np.float32]", audio_data)
 
 
+_RESAMPLE_GROUP_SIZE_SAMPLES = 48000
+# how far before the requested offset to seek, lets decoders with inter-frame state (e.g. mp3's bit reservoir) settle before the samples that are kept
+_SEEK_PREROLL_SECONDS = 0.5
+
+
+class AudioChannelError(ValueError):
+    pass
+
+
+def decode_audio(
+    file: BinaryIO | str,
+    sample_rate: int = 16000,
+    max_in_memory_samples: int | None = None,
+    *,
+    offset: float = 0.0,
+    duration: float | None = None,
+    channel: int | None = None,
+) -> np.typing.NDArray[np.float32]:
+    """Decode an audio file to mono float32 at `sample_rate`.
+
+    Decoded chunks are written into a single growable buffer (pre-sized from the container duration when it's known) rather than being collected and concatenated at the end, which avoids holding two copies of the audio.
+
+    If the decoded audio is (or turns out to be) longer than `max_in_memory_samples`, it's written to an anonymous temporary file instead and a copy-on-write `np.memmap` of it is returned. The OS pages the samples in as they are read and can evict them under memory pressure.
+
+    Only the `duration` seconds starting at `offset` seconds are returned. The container is seeked to `offset` so the skipped part doesn't get decoded, and decoding stops once `duration` seconds have been produced. If `channel` is set, only that (zero-based) channel is decoded instead of a downmix of all of them.
+    """
+    with av.open(file, mode="r", metadata_errors="ignore") as container:
+        # `duration` is in `av.time_base` units and is `None` when the container doesn't store it
+        estimated_duration = (
+            None if container.duration is None else max(0.0, container.duration / av.time_base - offset)
+        )
+        if duration is not None:
+            estimated_duration = duration if estimated_duration is None else min(duration, estimated_duration)
+        estimated_size = 0 if estimated_duration is None else int(estimated_duration * sample_rate) + sample_rate
+        chunks = _decode_container_chunks(
+            container,
+            sample_rate,
+            offset=offset,
+            duration=duration,
+            channel=channel,
+            seekable=isinstance(file, str) or file.seekable(),
+        )
+        if max_in_memory_samples is not None and estimated_size > max_in_memory_samples:
+            return spool_to_memmap(chunks)
+
+        buffer = np.empty(estimated_size, dtype=np.float32)
+        size = 0
+        for chunk in chunks:
+            if max_in_memory_samples is not None and size + len(chunk) > max_in_memory_samples:
+                # the container didn't report its duration (or under-reported it)
+                return spool_to_memmap(itertools.chain([buffer[:size], chunk], chunks))
+            if size + len(chunk) > len(buffer):
+                grown = np.empty(max(size + len(chunk), 2 * len(buffer)), dtype=np.float32)
+                grown[:size] = buffer[:size]
+                buffer = grown
+            buffer[size : size + len(chunk)] = chunk
+            size += len(chunk)
+    # don't keep a mostly unused allocation alive for the lifetime of the returned array
+    return buffer[:size] if size * 5 >= len(buffer) * 4 else buffer[:size].copy()
+
+
+def decode_audio_channels(
+    file: BinaryIO | str, sample_rate: int = 16000, *, offset: float = 0.0, duration: float | None = None
+) -> list[np.typing.NDArray[np.float32]]:
+    """Decode every channel of an audio file into a separate float32 array at `sample_rate` in a single pass.
+
+    See `decode_audio` for `offset` and `duration`.
+    """
+    with av.open(file, mode="r", metadata_errors="ignore") as container:
+        planes = list(
+            _decode_container_planes(
+                container,
+                sample_rate,
+                16000 * 30,
+                offset=offset,
+                duration=duration,
+                channel=None,
+                split_channels=True,
+                seekable=isinstance(file, str) or file.seekable(),
+            )
+        )
+        num_channels = container.streams.audio[0].channels
+    if len(planes) == 0:
+        return [np.empty(0, dtype=np.float32) for _ in range(num_channels)]
+    return list(np.concatenate(planes, axis=1))
+
+
+def spool_to_memmap(chunks: Iterable[np.typing.NDArray[np.float32]]) -> np.typing.NDArray[np.float32]:
+    """Write float32 chunks to an anonymous temporary file and return a copy-on-write `np.memmap` of it."""
+    # `TemporaryFile` is unlinked right away (on POSIX); the mapping keeps the data reachable until it's garbage collected
+    with tempfile.TemporaryFile() as f:
+        for chunk in chunks:
+            f.write(chunk.tobytes())
+        f.flush()
+        num_samples = f.tell() // np.dtype(np.float32).itemsize
+        if num_samples == 0:
+            return np.empty(0, dtype=np.float32)
+        logger.debug(f"Spooled {num_samples} decoded samples to disk")
+        return np.memmap(f, dtype=np.float32, mode="c", shape=(num_samples,))
+
+
+def _decode_container_chunks(
+    container: av.container.InputContainer,
+    sample_rate: int,
+    chunk_size_samples: int = 16000 * 30,
+    *,
+    offset: float = 0.0,
+    duration: float | None = None,
+    channel: int | None = None,
+    seekable: bool = True,
+) -> Generator[np.typing.NDArray[np.float32]]:
+    for planes in _decode_container_planes(
+        container,
+        sample_rate,
+        chunk_size_samples,
+        offset=offset,
+        duration=duration,
+        channel=channel,
+        split_channels=False,
+        seekable=seekable,
+    ):
+        yield planes[0]
+
+
+def _decode_container_planes(
+    container: av.container.InputContainer,
+    sample_rate: int,
+    chunk_size_samples: int,
+    *,
+    offset: float,
+    duration: float | None,
+    channel: int | None,
+    split_channels: bool,
+    seekable: bool,
+) -> Generator[np.typing.NDArray[np.float32]]:
+    """Yield chunks of shape `(channels, samples)`, where `channels` is 1 unless `split_channels` is set."""
+    stream = container.streams.audio[0]
+    if channel is not None:
+        num_channels = stream.channels
+        if channel >= num_channels:
+            raise AudioChannelError(
+                f"Channel {channel} was requested, but the audio only has {num_channels} channel(s)."
+            )
+    # `layout=None` keeps the input channel layout. The channels are downmixed after resampling, see `_downmix`
+    resampler = av.AudioResampler(format="fltp", layout=None, rate=sample_rate)
+    # decoded frames are tiny (~1k samples for mp3), resampling them in groups cuts the per-call overhead
+    input_fifo = av.AudioFifo()
+    output_fifo = av.AudioFifo()
+
+    # offsets are relative to the first sample, which isn't always at timestamp 0 (e.g. mp3 encoder delay)
+    start_time = (
+        0.0 if stream.start_time is None or stream.time_base is None else float(stream.start_time * stream.time_base)
+    )
+    offset += start_time
+    # non-seekable inputs (e.g. an upload that is still being received) are decoded from the start instead
+    if offset - start_time > _SEEK_PREROLL_SECONDS and seekable:
+        try:
+            # lands on the closest seek point at or before the target, the remainder is trimmed below
+            container.seek(int((offset - _SEEK_PREROLL_SECONDS) * av.time_base))
+        except av.error.FFmpegError:
+            logger.debug("Input isn't seekable, decoding it from the start")
+    end = None if duration is None else offset + duration
+    max_output_samples = None if duration is None else round(duration * sample_rate)
+    # input time (in seconds) of the next decoded sample, taken from the first frame's timestamp and counted from there
+    position: float | None = None
+    num_leading_output_samples: int | None = None  # output samples to discard before `offset`
+    num_output_samples = 0
+
+    frames = container.decode(audio=0)
+    while True:
+        try:
+            frame = next(frames, None)
+        except av.error.InvalidDataError:
+            # skip frames that fail to decode instead of discarding the whole file
+            continue
+        if frame is not None:
+            if position is None:
+                position = frame.time if frame.time is not None else start_time
+            frame_start, position = position, position + frame.samples / frame.sample_rate
+            if position <= offset:
+                continue
+            if num_leading_output_samples is None:
+                num_leading_output_samples = max(0, round((offset - frame_start) * sample_rate))
+            if channel is not None:
+                frame = _select_channel(frame, channel)
+            frame.pts = None  # the resampler doesn't need timestamps and may reject non-monotonic ones
+            input_fifo.write(frame)
+            if end is not None and position >= end:
+                frame = None  # the rest of the input isn't needed
+            elif input_fifo.samples < _RESAMPLE_GROUP_SIZE_SAMPLES:
+                continue
+        if input_fifo.samples > 0:
+            for resampled_frame in resampler.resample(input_fifo.read()):
+                # the resampler derives timestamps from the input's, which may not line up with the samples it has output so far (e.g. for WebM/Opus)
+                resampled_frame.pts = None
+                output_fifo.write(resampled_frame)
+        if frame is None:
+            for resampled_frame in resampler.resample(None):  # flush
+                resampled_frame.pts = None
+                output_fifo.write(resampled_frame)
+        if num_leading_output_samples:
+            num_discarded_samples = min(num_leading_output_samples, output_fifo.samples)
+            output_fifo.read(num_discarded_samples)
+            num_leading_output_samples -= num_discarded_samples
+        while output_fifo.samples >= chunk_size_samples and (
+            max_output_samples is None or num_output_samples + chunk_size_samples <= max_output_samples
+        ):
+            num_output_samples += chunk_size_samples
+            yield _clip(_downmix(_read_fifo(output_fifo, chunk_size_samples), split_channels))
+        if frame is None:
+            break
+    num_remaining_samples = output_fifo.samples
+    if max_output_samples is not None:
+        num_remaining_samples = min(num_remaining_samples, max_output_samples - num_output_samples)
+    if num_remaining_samples > 0:
+        yield _clip(_downmix(_read_fifo(output_fifo, num_remaining_samples), split_channels))
+
+
+def _read_fifo(fifo: av.AudioFifo, num_samples: int) -> np.typing.NDArray[np.float32]:
+    frame = fifo.read(num_samples)
+    assert frame is not None, "the fifo holds fewer samples than requested"
+    # the frames written to the fifo come from an `fltp` resampler
+    return cast("np.typing.NDArray[np.float32]", frame.to_ndarray())
+
+
+def _select_channel(frame: av.AudioFrame, channel: int) -> av.AudioFrame:
+    data = frame.to_ndarray()
+    # planar formats have a row per channel, packed ones interleave the channels in a single row
+    data = data[channel : channel + 1] if frame.format.is_planar else data[:, channel :: len(frame.layout.channels)]
+    mono_frame = av.AudioFrame.from_ndarray(np.ascontiguousarray(data), format=frame.format.name, layout="mono")
+    mono_frame.sample_rate = frame.sample_rate
+    return mono_frame
+
+
+def _downmix(data: np.typing.NDArray[np.float32], split_channels: bool) -> np.typing.NDArray[np.float32]:
+    if split_channels or len(data) == 1:
+        return data
+    # the average of the channels, which is what faster-whisper's decoder (and swresample, for integer sample formats) produces. With a float output format, swresample mixes at a higher gain instead, e.g. `(L + R) / sqrt(2)` for stereo
+    return data.mean(axis=0, keepdims=True, dtype=np.float32)
+
+
+def _clip(data: np.typing.NDArray[np.float32]) -> np.typing.NDArray[np.float32]:
+    # resampling may overshoot full scale slightly, keep samples in [-1.0, 1.0] like an integer sample format would
+    return np.clip(data, -1.0, 1.0, out=data)
+
+
 _SOUNDFILE_SUPPORTED_AUDIO_FORMATS = ("mp3", "flac", "wav")
 
 
+class AudioBuffer[T: np.generic]:
+    """Growable buffer of mono samples with amortized O(1) appends.
+
+    Storage grows by doubling. Samples are never overwritten once written, so the views returned by `data`, `tail` and `slice` stay valid (and unchanged) after further appends. Positions passed to `slice` are absolute, i.e. counted from the first sample ever appended, even if older samples have been dropped because of `max_size`.
+    """
+
+    def __init__(self, dtype: type[T], *, initial_capacity: int = 16000, max_size: int | None = None) -> None:
+        self.dtype = dtype
+        self.max_size = max_size
+        self._storage: np.typing.NDArray[T] = np.empty(initial_capacity, dtype=dtype)
+        self._start = 0  # index into `_storage` of the first retained sample
+        self._end = 0  # index into `_storage` past the last sample
+        self.num_dropped_samples = 0
+
+    @classmethod
+    def from_array(cls, data: np.typing.NDArray[T], *, max_size: int | None = None) -> "AudioBuffer[T]":
+        buffer = cls(data.dtype.type, initial_capacity=max(len(data), 16000), max_size=max_size)
+        buffer.append(data)
+        return buffer
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    @property
+    def total_size(self) -> int:
+        """Number of samples ever appended, including dropped ones."""
+        return self.num_dropped_samples + len(self)
+
+    @property
+    def data(self) -> np.typing.NDArray[T]:
+        """Zero-copy view of all retained samples."""
+        return self._storage[self._start : self._end]
+
+    def tail(self, size: int) -> np.typing.NDArray[T]:
+        """Zero-copy view of the last `size` samples (or fewer, if the buffer is shorter)."""
+        return self._storage[max(self._start, self._end - size) : self._end]
+
+    def slice(self, start: int, end: int | None = None) -> np.typing.NDArray[T]:
+        """Zero-copy view of the samples between the absolute positions `start` and `end`."""
+        if start < self.num_dropped_samples:
+            raise ValueError(f"Samples before position {self.num_dropped_samples} are no longer retained")
+        end = self.total_size if end is None else min(end, self.total_size)
+        offset = self._start - self.num_dropped_samples
+        return self._storage[offset + start : offset + max(start, end)]
+
+    def append(self, data: np.typing.NDArray[T]) -> None:
+        if len(data) == 0:
+            return
+        if self._end + len(data) > len(self._storage):
+            self._reallocate(len(self) + len(data))
+        self._storage[self._end : self._end + len(data)] = data
+        self._end += len(data)
+        if self.max_size is not None and len(self) > self.max_size:
+            num_dropped = len(self) - self.max_size
+            self._start += num_dropped
+            self.num_dropped_samples += num_dropped
+
+    def clear(self) -> None:
+        """Drop all samples. Unlike `max_size` trimming, positions restart from 0."""
+        self._storage = np.empty(len(self._storage), dtype=self.dtype)
+        self._start = self._end = 0
+        self.num_dropped_samples = 0
+
+    def _reallocate(self, required_size: int) -> None:
+        # a fresh allocation (rather than compacting in place) keeps previously returned views intact
+        capacity = len(self._storage)
+        while capacity < required_size:
+            capacity *= 2
+        if self.max_size is not None:
+            # room for `max_size` samples plus as much again, so that dropping old samples is amortized too
+            capacity = min(capacity, max(2 * self.max_size, required_size))
+        storage = np.empty(capacity, dtype=self.dtype)
+        storage[: len(self)] = self.data
+        self._storage = storage
+        self._end = len(self)
+        self._start = 0
+
+
+def int16_to_float32(data: np.typing.NDArray[np.int16]) -> np.typing.NDArray[np.float32]:
+    audio = data.astype(np.float32)
+    audio *= 1 / 32768.0
+    return audio
+
+
+def float32_to_int16(data: np.typing.NDArray[np.float32]) -> np.typing.NDArray[np.int16]:
+    # resampled audio can overshoot full scale slightly (Gibbs ringing), without clipping those samples would wrap around to the opposite polarity
+    scaled = data * 32767
+    return np.clip(scaled, -32768, 32767, out=scaled).astype(np.int16)
+
+
+type AudioSamples = np.typing.NDArray[np.float32] | np.typing.NDArray[np.int16]
+
+
+def ensure_float32(samples: AudioSamples) -> np.typing.NDArray[np.float32]:
+    """Return `samples` as float32, converting them only if they're int16."""
+    if samples.dtype == np.int16:
+        return int16_to_float32(cast("np.typing.NDArray[np.int16]", samples))
+    return cast("np.typing.NDArray[np.float32]", samples)
+
+
+def ensure_int16(samples: AudioSamples) -> np.typing.NDArray[np.int16]:
+    """Return `samples` as int16, converting them only if they're float32."""
+    if samples.dtype == np.float32:
+        return float32_to_int16(cast("np.typing.NDArray[np.float32]", samples))
+    return cast("np.typing.NDArray[np.int16]", samples)
+
+
 class Audio:
+    """Mono audio stored either as float32 samples in [-1.0, 1.0] or as int16 PCM samples.
+
+    `data` always returns float32. For int16 audio the conversion happens on first access and is cached, so audio that is only passed through (e.g. returned as PCM or written to a WAV file via `as_int16`/`as_bytes`) is never converted.
+    """
+
     def __init__(
         self,
-        data: np.typing.NDArray[np.float32],
+        data: AudioSamples,
         sample_rate: int,
         name: str | None = None,
     ) -> None:
-        self.data = data
+        self.samples = data
         self.sample_rate = sample_rate
         self.name = name
+        self._buffer: AudioBuffer | None = None
+        self._buffer_view: AudioSamples | None = None
+
+    @property
+    def samples(self) -> AudioSamples:
+        """The samples in their storage dtype."""
+        return self._samples
+
+    @samples.setter
+    def samples(self, samples: AudioSamples) -> None:
+        if samples.dtype not in (np.float32, np.int16):
+            raise ValueError(f"Unsupported audio dtype: {samples.dtype}")
+        self._samples = samples
+        self._float32_data: np.typing.NDArray[np.float32] | None = None
+
+    @property
+    def data(self) -> np.typing.NDArray[np.float32]:
+        if self._float32_data is None:
+            self._float32_data = ensure_float32(self._samples)
+        return self._float32_data
+
+    @data.setter
+    def data(self, data: np.typing.NDArray[np.float32]) -> None:
+        self.samples = data
 
     def __repr__(self) -> str:
-        return f"Audio(duration={self.duration:.2f}s, sample_rate={self.sample_rate}Hz, samples={len(self.data)})"
+        return f"Audio(duration={self.duration:.2f}s, sample_rate={self.sample_rate}Hz, samples={len(self.samples)})"
 
     @property
     def duration(self) -> float:
-        return len(self.data) / self.sample_rate
+        return len(self.samples) / self.sample_rate
 
     @property
     def size_in_bits(self) -> int:
-        return self.data.nbytes * 8
+        return self.samples.nbytes * 8
 
     @property
     def size_in_bytes(self) -> int:
-        return self.data.nbytes
+        return self.samples.nbytes
 
     @property
     def size_in_kb(self) -> float:
@@ -106,18 +471,20 @@ class Audio:
     def size_in_mb(self) -> float:
         return self.size_in_bytes / (1024.0 * 1024.0)
 
-    def extend(self, data: np.typing.NDArray[np.float32]) -> None:
-        self.data = np.append(self.data, data)
+    def extend(self, data: AudioSamples) -> None:
+        """Append samples, converting them to the storage dtype if needed."""
+        data = ensure_float32(data) if self._samples.dtype == np.float32 else ensure_int16(data)
+        # the samples may have been reassigned (e.g. by `resample`) since the buffer was last used
+        if self._buffer is None or self._samples is not self._buffer_view:
+            self._buffer = AudioBuffer.from_array(self._samples)
+        self._buffer.append(data)
+        self.samples = self._buffer_view = cast("AudioSamples", self._buffer.data)
 
-    def as_bytes(self) -> bytes:
-        # NOTE: a more correct approach would be to normalize the audio data first but I'd rather avoid doing that to not introduce any performance overhead given that I expect the data to already be in the [-1.0, 1.0] range
-        # Clip to [-1.0, 1.0] to avoid overflow
-        # audio = np.clip(self.data, -1.0, 1.0)
+    def as_int16(self) -> np.typing.NDArray[np.int16]:
+        return ensure_int16(self._samples)
 
-        # Scale to int16 range and convert
-        audio = (self.data * 32767).astype(np.int16)
-
-        return audio.tobytes()
+    def as_bytes(self) -> bytes:
+        return self.as_int16().tobytes()
 
     def to_base64(self) -> str:
         audio_bytes = self.as_bytes()
@@ -126,7 +493,7 @@ class Audio:
     def resample(self, target_sample_rate: int) -> Self:
         if self.sample_rate == target_sample_rate:
             return self
-        self.data = resample_audio_data(self.data, self.sample_rate, target_sample_rate)
+        self.data = resample(self.data, self.sample_rate, target_sample_rate)
         self.sample_rate = target_sample_rate
         return self
 
@@ -138,124 +505,156 @@ class Audio:
         for audio in audios:
             if audio.sample_rate != sample_rate:
                 raise ValueError("All audio segments must have the same sample rate to concatenate")
+        if all(audio.samples.dtype == np.int16 for audio in audios):
+            return Audio(np.concatenate([audio.as_int16() for audio in audios]), sample_rate=sample_rate)
         concatenated_data = np.concatenate([audio.data for audio in audios])
         return Audio(concatenated_data, sample_rate=sample_rate)
 
 
+# response format -> (container format, encoder)
+_ENCODED_AUDIO_FORMATS: dict[str, tuple[str, str]] = {
+    "mp3": ("mp3", "libmp3lame"),
+    "wav": ("wav", "pcm_s16le"),
+    "flac": ("flac", "flac"),
+    "opus": ("ogg", "libopus"),
+    "aac": ("adts", "aac"),
+}
+# in order of preference, the first one supported by the encoder is used
+_ENCODER_SAMPLE_FORMATS = ("s16", "s16p", "flt", "fltp")
+
+
+@lru_cache
+def _encoder_settings(audio_format: str, sample_rate: int) -> tuple[str, str, str, int]:
+    """Return the container format, encoder name, sample format and sample rate to encode `audio_format` with.
+
+    If the encoder doesn't support `sample_rate` (e.g. Opus only supports 8/12/16/24/48kHz), the closest higher supported sample rate is used instead, which is also what the `ffmpeg` CLI does.
+    """
+    container_format, codec_name = _ENCODED_AUDIO_FORMATS[audio_format]
+    codec = av.Codec(codec_name, "w")
+    supported_sample_rates = codec.audio_rates
+    if supported_sample_rates and sample_rate not in supported_sample_rates:
+        sample_rate = min(
+            (rate for rate in supported_sample_rates if rate >= sample_rate), default=max(supported_sample_rates)
+        )
+    supported_sample_formats = {sample_format.name for sample_format in codec.audio_formats or []}
+    sample_format = next(
+        sample_format for sample_format in _ENCODER_SAMPLE_FORMATS if sample_format in supported_sample_formats
+    )
+    return container_format, codec_name, sample_format, sample_rate
+
+
+class _WriteOnlySink(io.RawIOBase):
+    """A non-seekable file-like object that the muxer writes to. Its contents are drained after each write to the container."""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b: Buffer, /) -> int:
+        data = memoryview(b)
+        self._buffer += data
+        return data.nbytes
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class AudioEncoder:
+    """Incrementally encodes mono audio into one of the compressed/containerized response formats using PyAV.
+
+    Encoded bytes are returned as soon as the muxer produces them. Since the output isn't seekable, headers that are normally patched after the fact (e.g. the WAV data size) are left as placeholders, just like when streaming from the `ffmpeg` CLI.
+    """
+
+    def __init__(
+        self, audio_format: Literal["aac", "opus", "mp3", "flac", "wav"], sample_rate: int, target_sample_rate: int
+    ) -> None:
+        container_format, codec_name, sample_format, target_sample_rate = _encoder_settings(
+            audio_format, target_sample_rate
+        )
+        self.sample_rate = sample_rate
+        self._sink = _WriteOnlySink()
+        self._container = av.open(self._sink, mode="w", format=container_format)
+        stream = self._container.add_stream(codec_name, rate=target_sample_rate, layout="mono")
+        assert isinstance(stream, av.audio.stream.AudioStream)
+        stream.format = sample_format
+        self._stream = stream
+        self._resampler = av.AudioResampler(format=sample_format, layout="mono", rate=target_sample_rate)
+        # encoders like mp3, aac and opus only accept frames of a fixed size
+        self._fifo = av.AudioFifo()
+        self._frame_size = self._stream.codec_context.frame_size
+        self._pts = 0
+
+    def encode(self, audio: Audio) -> bytes:
+        if audio.sample_rate != self.sample_rate:
+            raise ValueError(f"Inconsistent sample rate: expected {self.sample_rate}, got {audio.sample_rate}")
+        frame = av.AudioFrame.from_ndarray(audio.as_int16().reshape(1, -1), format="s16", layout="mono")
+        frame.sample_rate = self.sample_rate
+        for resampled_frame in self._resampler.resample(frame):
+            self._fifo.write(resampled_frame)
+        self._encode_fifo(final=False)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Flush the encoder, write the container trailer and return the remaining bytes."""
+        try:
+            for resampled_frame in self._resampler.resample(None):
+                self._fifo.write(resampled_frame)
+            self._encode_fifo(final=True)
+            self._container.mux(self._stream.encode(None))
+        finally:
+            self._container.close()
+        return self._sink.drain()
+
+    def discard(self) -> None:
+        """Release the container without flushing the encoder, e.g. when the client has gone away. A no-op after `close`."""
+        self._container.close()
+
+    def _encode_fifo(self, *, final: bool) -> None:
+        frame_size = self._frame_size or self._fifo.samples
+        while self._fifo.samples >= frame_size > 0 or (final and self._fifo.samples > 0):
+            frame = self._fifo.read(frame_size) if self._fifo.samples >= frame_size else self._fifo.read()
+            assert frame is not None
+            frame.pts = self._pts
+            self._pts += frame.samples
+            self._container.mux(self._stream.encode(frame))
+
+
 def stream_audio_as_formatted_bytes(
     audio_generator: Generator[Audio],
     audio_format: Literal["aac", "pcm", "opus", "mp3", "flac", "wav"],
     sample_rate: int | None = None,
 ) -> Generator[bytes]:
     if audio_format == "pcm":
+        # a single resampler for the whole stream so that chunk boundaries don't introduce discontinuities
+        resampler: StreamingResampler | None = None
         for audio in audio_generator:
-            if sample_rate is not None:
-                audio.resample(sample_rate)
-            yield audio.as_bytes()
+            if sample_rate is None or audio.sample_rate == sample_rate:
+                yield audio.as_bytes()
+                continue
+            if resampler is None:
+                resampler = StreamingResampler(audio.sample_rate, sample_rate)
+            yield Audio(resampler.process(audio.data), sample_rate).as_bytes()
+        if resampler is not None:
+            yield Audio(resampler.flush(), resampler.target_sample_rate).as_bytes()
         return
 
     first_audio = next(audio_generator, None)
     if first_audio is None:
         return
 
-    source_sample_rate = first_audio.sample_rate
-    target_sample_rate = sample_rate if sample_rate is not None else source_sample_rate
-
-    format_args = {
-        "mp3": ["-f", "mp3", "-codec:a", "libmp3lame"],
-        "wav": ["-f", "wav"],
-        "flac": ["-f", "flac"],
-        "opus": ["-f", "opus", "-codec:a", "libopus"],
-        "aac": ["-f", "adts", "-codec:a", "aac"],
-    }
-
-    cmd = [
-        "ffmpeg",
-        "-f",
-        "s16le",
-        "-ar",
-        str(source_sample_rate),
-        "-ac",
-        "1",
-        "-i",
-        "pipe:0",
-        "-ar",
-        str(target_sample_rate),
-        *format_args[audio_format],
-        "pipe:1",
-        "-hide_banner",
-        "-loglevel",
-        "error",
-    ]
-
-    process = subprocess.Popen(
-        cmd,
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+    encoder = AudioEncoder(
+        audio_format,
+        sample_rate=first_audio.sample_rate,
+        target_sample_rate=sample_rate if sample_rate is not None else first_audio.sample_rate,
     )
-
-    output_queue: queue_module.Queue[bytes | None] = queue_module.Queue(maxsize=10)
-    error_queue: queue_module.Queue[Exception] = queue_module.Queue()
-
-    def write_to_stdin() -> None:
-        try:
-            if process.stdin is None:
-                raise RuntimeError("ffmpeg stdin is None")
-            process.stdin.write(first_audio.as_bytes())
-            for audio in audio_generator:
-                if audio.sample_rate != source_sample_rate:
-                    raise ValueError(
-                        f"Inconsistent sample rate: expected {source_sample_rate}, got {audio.sample_rate}"
-                    )
-                process.stdin.write(audio.as_bytes())
-            process.stdin.close()
-        except Exception as e:  # noqa: BLE001
-            error_queue.put(e)
-
-    def read_from_stdout() -> None:
-        try:
-            if process.stdout is None:
-                raise RuntimeError("ffmpeg stdout is None")
-            while True:
-                chunk = process.stdout.read(4096)
-                if not chunk:
-                    break
-                output_queue.put(chunk)
-            output_queue.put(None)
-        except Exception as e:  # noqa: BLE001
-            error_queue.put(e)
-
-    writer_thread = threading.Thread(target=write_to_stdin, daemon=True)
-    reader_thread = threading.Thread(target=read_from_stdout, daemon=True)
-
-    writer_thread.start()
-    reader_thread.start()
-
     try:
-        while True:
-            if not error_queue.empty():
-                raise error_queue.get()
-
-            try:
-                chunk = output_queue.get(timeout=0.1)
-            except queue_module.Empty:
-                continue
-
-            if chunk is None:
-                break
-
-            yield chunk
-
-        writer_thread.join(timeout=5.0)
-        reader_thread.join(timeout=5.0)
-
-        return_code = process.wait(timeout=5.0)
-        if return_code != 0:
-            stderr_output = process.stderr.read().decode() if process.stderr else ""
-            raise RuntimeError(f"ffmpeg failed with return code {return_code}: {stderr_output}")
-
-    except Exception:
-        process.kill()
-        process.wait()
-        raise
+        for audio in itertools.chain([first_audio], audio_generator):
+            if encoded := encoder.encode(audio):
+                yield encoded
+        yield encoder.close()
+    finally:
+        encoder.discard()
@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import Any, Literal
 
 from pydantic import BaseModel, Field, SecretStr
@@ -21,6 +22,13 @@ class WhisperConfig(BaseModel):
     num_workers: int = 1
 
 
+class PiperConfig(BaseModel):
+    num_workers: int = Field(default=1, ge=1)
+    """
+    Number of sentences of a request that are synthesized concurrently. Each worker gets its own copy of the model's ORT session, with the CPU threads split between them. Audio is still returned in order, as soon as the next sentence is ready.
+    """
+
+
 class OrtOptions(BaseModel):
     exclude_providers: list[str] = ["TensorrtExecutionProvider"]
     """
@@ -37,6 +45,72 @@ class OrtOptions(BaseModel):
     """
 
 
+class TtsCacheConfig(BaseModel):
+    enabled: bool = False
+    """
+    Cache the audio generated by `/v1/audio/speech` so that repeated requests (same model, voice, speed and text) skip inference. Whitespace differences in the input text are ignored.
+    """
+    memory_max_size_mb: float = Field(default=256, ge=0)
+    """
+    Maximum total size of the in-memory tier. Least recently used entries are evicted first.
+    """
+    disk_path: Path | None = None
+    """
+    Directory for the on-disk tier, which survives restarts. `null` disables the on-disk tier.
+    """
+    disk_max_size_mb: float = Field(default=4096, ge=0)
+    """
+    Maximum total size of the on-disk tier. Least recently used entries are evicted first.
+    """
+    max_input_length: int = Field(default=1000, ge=0)
+    """
+    Requests with longer input text (in characters) bypass the cache. Long-form text is rarely repeated verbatim.
+    """
+
+
+class StateStoreConfig(BaseModel):
+    backend: Literal["memory", "sqlite"] = "memory"
+    """
+    Where state that must outlive a single request (e.g. the transcripts of generated chat audio, which are looked up by `message.audio.id`) is kept.
+    `memory`: In the process' memory. Only works with a single worker.
+    `sqlite`: In a SQLite database at `sqlite_path`, shared by all workers on the same host.
+    """
+    max_entries: int = Field(default=4096, ge=1)
+    """
+    Maximum number of entries kept by the `memory` backend. Once reached, the oldest entries are evicted, even if they haven't expired yet.
+    """
+    sqlite_path: Path = Path("speaches_state.db")
+    """
+    Path of the SQLite database used by the `sqlite` backend.
+    """
+    flush_interval_ms: int = Field(default=50, ge=0)
+    """
+    Writes are batched and committed at most this long after they're made. Other workers don't see a write until it has been committed. Writes that the next request may look up on another worker (e.g. the transcripts of generated chat audio) are committed before the response is returned.
+    """
+    max_batch_size: int = Field(default=256, ge=1)
+    """
+    Pending writes are committed right away once there are this many of them.
+    """
+
+
+class RealtimeHistoryConfig(BaseModel):
+    """Limits on how much of a realtime conversation is sent to the language model when generating a response.
+
+    The history is cut at the start of a user turn, the session instructions are always sent and the latest turn is always kept. Without limits, the prompt (and with it the time until the response starts) keeps growing over the course of a session.
+    """
+
+    max_turns: int | None = Field(default=None, ge=1)
+    """
+    Maximum number of user turns (a user message and everything that follows it) to send.
+    `null`: No limit.
+    """
+    max_tokens: int | None = Field(default=None, ge=1)
+    """
+    Maximum number of tokens of conversation history to send, estimated from the length of the messages (about 4 characters per token).
+    `null`: No limit.
+    """
+
+
 # TODO: document `alias` behaviour within the docstring
 class Config(BaseSettings):
     """Configuration for the application. Values can be set via environment variables.
@@ -99,6 +173,31 @@ class Config(BaseSettings):
 
     whisper: WhisperConfig = WhisperConfig()
 
+    memmap_audio_threshold_seconds: float | None = Field(default=1800, ge=0)
+    """
+    Uploaded audio files longer than this (in seconds) are decoded into a temporary file on disk which is then memory-mapped, instead of being held in memory. This bounds the memory used by requests with very long audio files and lets the OS page cache deal with re-reads.
+    `null`: Always decode into memory.
+    """
+
+    tts_cache: TtsCacheConfig = TtsCacheConfig()
+
+    piper: PiperConfig = PiperConfig()
+
+    decode_workers: int = Field(default=0, ge=0)
+    """
+    Number of worker processes used to decode compressed (mp3, ogg, m4a, ...) uploads. Offloading decoding lets it scale with the number of CPU cores without competing with request handling and inference for the GIL. Raw PCM and WAV uploads are always parsed inline since there's little to decode.
+    `0`: Decode in the request thread.
+    """
+
+    decode_uploads_while_receiving: bool = True
+    """
+    Start decoding uploaded audio files while they are still being received, rather than after the whole request body has arrived, so that decoding overlaps with the upload. This only applies when the `offset`, `duration` and `channel` form fields (if any) are sent before the file, as most clients do. Otherwise, and for files that can't be decoded without seeking (e.g. MP4 files with the index at the end), the fully received upload is decoded as usual, see `decode_workers`.
+    """
+
+    state_store: StateStoreConfig = StateStoreConfig()
+
+    realtime_history: RealtimeHistoryConfig = RealtimeHistoryConfig()
+
     # TODO: remove the underscore prefix from the field name
     _unstable_vad_filter: bool = True
     """
@@ -0,0 +1,94 @@
+from concurrent.futures import ProcessPoolExecutor
+import io
+import logging
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+import tempfile
+from typing import Literal
+import weakref
+
+import numpy as np
+
+from speaches.audio import decode_audio
+
+logger = logging.getLogger(__name__)
+
+type DecodeResult = tuple[Literal["empty", "shm", "file"], str, int]
+
+
+class DecodePool:
+    """Decodes compressed audio in a pool of worker processes.
+
+    Decoding and resampling hold the GIL for a meaningful part of their runtime, so doing it in the request thread makes it compete with everything else the server does. Workers hand the decoded samples back through shared memory rather than pickling them through a pipe.
+    """
+
+    def __init__(self, num_workers: int) -> None:
+        # `fork` isn't safe in a process that already runs threads (uvicorn, onnxruntime, ...)
+        self._executor = ProcessPoolExecutor(max_workers=num_workers, mp_context=get_context("spawn"))
+        logger.info(f"Started an audio decode pool with {num_workers} worker processes")
+
+    def decode(
+        self,
+        data: bytes,
+        sample_rate: int = 16000,
+        max_in_memory_samples: int | None = None,
+        *,
+        offset: float = 0.0,
+        duration: float | None = None,
+        channel: int | None = None,
+    ) -> np.typing.NDArray[np.float32]:
+        """Same as `decode_audio`, but runs in a worker process. Blocks until the worker is done."""
+        future = self._executor.submit(
+            _decode_in_worker, data, sample_rate, max_in_memory_samples, offset, duration, channel
+        )
+        return _attach(*future.result())
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+
+def _decode_in_worker(
+    data: bytes,
+    sample_rate: int,
+    max_in_memory_samples: int | None,
+    offset: float,
+    duration: float | None,
+    channel: int | None,
+) -> DecodeResult:
+    audio = decode_audio(
+        io.BytesIO(data),
+        sample_rate,
+        max_in_memory_samples,
+        offset=offset,
+        duration=duration,
+        channel=channel,
+    )
+    if len(audio) == 0:
+        return "empty", "", 0
+    if isinstance(audio, np.memmap):
+        # too long to be kept in memory, hand it over as a file instead so that it can be memory-mapped again
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".f32") as f:
+            audio.tofile(f)
+        return "file", f.name, len(audio)
+    shm = SharedMemory(create=True, size=audio.nbytes)
+    np.ndarray(audio.shape, dtype=np.float32, buffer=shm.buf)[:] = audio
+    shm.close()
+    return "shm", shm.name, len(audio)
+
+
+def _attach(kind: Literal["empty", "shm", "file"], name: str, num_samples: int) -> np.typing.NDArray[np.float32]:
+    if kind == "empty":
+        return np.empty(0, dtype=np.float32)
+    if kind == "file":
+        audio = np.memmap(name, dtype=np.float32, mode="c", shape=(num_samples,))
+        # the mapping stays valid after the file is unlinked
+        Path(name).unlink()
+        return audio
+    shm = SharedMemory(name=name)
+    # unlinking right away means the segment can't leak if this process dies, the mapping stays valid until it's closed
+    shm.unlink()
+    audio = np.ndarray((num_samples,), dtype=np.float32, buffer=shm.buf)
+    # `shm` can only be closed once nothing references its buffer anymore
+    weakref.finalize(audio, shm.close)
+    return audio
@@ -1,29 +1,41 @@
+from collections.abc import Callable, Coroutine
 from functools import lru_cache
 import logging
 from pathlib import Path
 import time
-from typing import Annotated, cast
+from typing import Annotated, Any
 
 import av.error
 from fastapi import (
     Depends,
     Form,
     HTTPException,
+    Request,
+    Response,
     UploadFile,
     status,
 )
+from fastapi.routing import APIRoute
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from faster_whisper.audio import decode_audio
-from httpx import ASGITransport, AsyncClient
 import numpy as np
-from numpy import float32
 from openai import AsyncOpenAI
-from openai.resources.audio import AsyncSpeech, AsyncTranscriptions
 from openai.resources.chat.completions import AsyncCompletions
 
-from speaches.audio import Audio
+from speaches.audio import (
+    Audio,
+    AudioChannelError,
+    decode_audio,
+    decode_audio_channels,
+    int16_to_float32,
+    spool_to_memmap,
+)
 from speaches.config import Config
+from speaches.decode_pool import DecodePool
 from speaches.executors.shared.registry import ExecutorRegistry
+from speaches.inprocess_clients import SpeechClient, TranscriptionClient
+from speaches.state_store import StateStore, create_state_store
+from speaches.streaming_upload import RAW_PCM_CONTENT_TYPES, AudioUploadFile, AudioUploadRequest
+from speaches.tts_cache import TtsCache
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +69,45 @@ async def get_executor_registry_async() -> ExecutorRegistry:
 ExecutorRegistryDependency = Annotated[ExecutorRegistry, Depends(get_executor_registry_async)]
 
 
+@lru_cache
+def get_decode_pool() -> DecodePool | None:
+    config = get_config()
+    if config.decode_workers == 0:
+        return None
+    return DecodePool(config.decode_workers)
+
+
+@lru_cache
+def get_tts_cache() -> TtsCache | None:
+    config = get_config()
+    if not config.tts_cache.enabled:
+        return None
+    return TtsCache(config.tts_cache)
+
+
+async def get_tts_cache_async() -> TtsCache | None:
+    return get_tts_cache()
+
+
+TtsCacheDependency = Annotated[TtsCache | None, Depends(get_tts_cache_async)]
+
+
+@lru_cache
+def get_state_store() -> StateStore:
+    config = get_config()
+    return create_state_store(config.state_store)
+
+
+async def get_state_store_async() -> StateStore:
+    return get_state_store()
+
+
+StateStoreDependency = Annotated[StateStore, Depends(get_state_store_async)]
+
+
+WAV_CONTENT_TYPES = ("audio/wav", "audio/x-wav", "audio/wave", "audio/vnd.wave")
+
+
 security = HTTPBearer(auto_error=False)
 
 
@@ -81,27 +132,104 @@ async def verify_api_key(
 ApiKeyDependency = Depends(verify_api_key)
 
 
-# TODO: test async vs sync performance
-def audio_file_dependency(
-    file: Annotated[UploadFile, Form()],
-) -> Audio:
+def _max_in_memory_samples(config: Config) -> int | None:
+    if config.memmap_audio_threshold_seconds is None:
+        return None
+    return int(config.memmap_audio_threshold_seconds * 16000)
+
+
+class AudioUploadRoute(APIRoute):
+    """Route class for endpoints taking an audio file upload. Unless disabled by `decode_uploads_while_receiving`, the upload is decoded while it's being received, see `AudioUploadRequest`."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        route_handler = super().get_route_handler()
+
+        async def audio_upload_route_handler(request: Request) -> Response:
+            config = get_config()
+            if config.decode_uploads_while_receiving:
+                request = AudioUploadRequest(
+                    request.scope,
+                    request.receive,
+                    sample_rate=16000,
+                    max_in_memory_samples=_max_in_memory_samples(config),
+                )
+            return await route_handler(request)
+
+        return audio_upload_route_handler
+
+
+def _decode_audio_file(
+    file: UploadFile, *, offset: float, duration: float | None, channel: int | None, split_channels: bool
+) -> list[Audio]:
     try:
         logger.debug(
             f"Decoding audio file: {file.filename}, content_type: {file.content_type}, header: {file.headers}, size: {file.size}"
         )
         start = time.perf_counter()
+        max_in_memory_samples = _max_in_memory_samples(get_config())
 
-        if file.content_type in ("audio/pcm", "audio/raw"):
+        audio_data: np.typing.NDArray[np.float32] | np.typing.NDArray[np.int16]
+        if file.content_type in RAW_PCM_CONTENT_TYPES:
             logger.debug(f"Detected {file.content_type}, parsing as s16le monochannel")
-            raw_bytes = file.file.read()
-            audio_int16 = np.frombuffer(raw_bytes, dtype=np.int16)
-            audio_data = cast("np.typing.NDArray[float32]", audio_int16.astype(np.float32) / 32768.0)
+            if channel is not None and channel > 0:
+                raise AudioChannelError(
+                    f"Channel {channel} was requested, but raw PCM audio only has a single channel."
+                )
+            num_samples = (file.size or 0) // 2
+            start_sample = min(round(offset * 16000), num_samples)
+            end_sample = num_samples if duration is None else min(start_sample + round(duration * 16000), num_samples)
+            if max_in_memory_samples is not None and end_sample - start_sample > max_in_memory_samples:
+                # Starlette has already spooled the upload to disk, map it and convert it a chunk at a time
+                pcm = np.memmap(file.file, dtype=np.int16, mode="r", shape=(num_samples,))[start_sample:end_sample]
+                chunk_size = 16000 * 60
+                audio_data = spool_to_memmap(
+                    int16_to_float32(pcm[i : i + chunk_size]) for i in range(0, len(pcm), chunk_size)
+                )
+            else:
+                # kept as int16, converted to float32 only if/when a model reads `Audio.data`
+                file.file.seek(start_sample * 2)
+                audio_data = np.frombuffer(file.file.read((end_sample - start_sample) * 2), dtype=np.int16)
+            channels = [audio_data]
+        elif (
+            not split_channels
+            and isinstance(file, AudioUploadFile)
+            and (decoded := file.decoder.decoded_audio(offset=offset, duration=duration, channel=channel)) is not None
+        ):
+            logger.debug("Decoded the upload while receiving it")
+            channels = [decoded]
+        elif split_channels:
+            channels = decode_audio_channels(file.file, sample_rate=16000, offset=offset, duration=duration)
+        elif (decode_pool := get_decode_pool()) is not None and file.content_type not in WAV_CONTENT_TYPES:
+            channels = [
+                decode_pool.decode(
+                    file.file.read(),
+                    sample_rate=16000,
+                    max_in_memory_samples=max_in_memory_samples,
+                    offset=offset,
+                    duration=duration,
+                    channel=channel,
+                )
+            ]
         else:
-            audio_data = cast("np.typing.NDArray[float32]", decode_audio(file.file, sampling_rate=16000))
+            channels = [
+                decode_audio(
+                    file.file,
+                    sample_rate=16000,
+                    max_in_memory_samples=max_in_memory_samples,
+                    offset=offset,
+                    duration=duration,
+                    channel=channel,
+                )
+            ]
         elapsed = time.perf_counter() - start
-        audio = Audio(audio_data, sample_rate=16000, name=Path(file.filename).stem if file.filename else None)
-        logger.debug(f"Decoded {audio.duration}s of audio in {elapsed:.5f}s (RTF: {elapsed / audio.duration})")
-        return audio
+        name = Path(file.filename).stem if file.filename else None
+        audios = [Audio(data, sample_rate=16000, name=name) for data in channels]
+        logger.debug(
+            f"Decoded {len(audios)} channel(s) of {audios[0].duration}s of audio in {elapsed:.5f}s (RTF: {elapsed / audios[0].duration})"
+        )
+        return audios
+    except AudioChannelError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
     except av.error.InvalidDataError as e:
         raise HTTPException(
             status_code=415,
@@ -120,7 +248,48 @@ def audio_file_dependency(
         raise HTTPException(status_code=500, detail="Failed to decode audio.") from e
 
 
+OffsetForm = Annotated[float, Form(ge=0, description="Start of the audio range to process, in seconds.")]
+DurationForm = Annotated[
+    float | None,
+    Form(gt=0, description="Length of the audio range to process, in seconds. Defaults to the rest of the file."),
+]
+ChannelForm = Annotated[
+    int | None,
+    Form(ge=0, description="Zero-based channel to process. By default all channels are downmixed to mono."),
+]
+
+
+# TODO: test async vs sync performance
+def audio_file_dependency(
+    file: Annotated[UploadFile, Form()],
+    offset: OffsetForm = 0.0,
+    duration: DurationForm = None,
+    channel: ChannelForm = None,
+) -> Audio:
+    [audio] = _decode_audio_file(file, offset=offset, duration=duration, channel=channel, split_channels=False)
+    return audio
+
+
+def audio_channels_dependency(
+    file: Annotated[UploadFile, Form()],
+    offset: OffsetForm = 0.0,
+    duration: DurationForm = None,
+    channel: ChannelForm = None,
+    split_channels: Annotated[
+        bool,
+        Form(
+            description="Transcribe each channel of the audio independently (in parallel) and merge the segments by their timestamps. Useful for call recordings where each speaker is on their own channel."
+        ),
+    ] = False,
+) -> list[Audio]:
+    """Like `audio_file_dependency`, but decodes every channel into an `Audio` of its own when `split_channels` is set."""
+    if split_channels and channel is not None:
+        raise HTTPException(status_code=400, detail="`split_channels` can't be used together with `channel`.")
+    return _decode_audio_file(file, offset=offset, duration=duration, channel=channel, split_channels=split_channels)
+
+
 AudioFileDependency = Annotated[Audio, Depends(audio_file_dependency)]
+AudioChannelsDependency = Annotated[list[Audio], Depends(audio_channels_dependency)]
 
 
 @lru_cache
@@ -142,66 +311,24 @@ CompletionClientDependency = Annotated[AsyncCompletions, Depends(get_completion_
 
 
 @lru_cache
-def get_speech_client() -> AsyncSpeech:
-    config = get_config()
-    if config.loopback_host_url is None:
-        # this might not work as expected if `speech_router` won't have shared state (access to the same `model_manager`) with the main FastAPI `app`. TODO: verify
-        from speaches.routers.speech import (
-            router as speech_router,
-        )
-
-        http_client = AsyncClient(
-            transport=ASGITransport(speech_router),
-            base_url="http://test/v1",
-        )  # NOTE: "test" can be replaced with any other value
-    else:
-        http_client = AsyncClient(
-            base_url=f"{config.loopback_host_url}/v1",
-        )
-    oai_client = AsyncOpenAI(
-        http_client=http_client,
-        api_key=config.api_key.get_secret_value() if config.api_key else "cant-be-empty",
-        max_retries=0,
-        base_url=f"{config.loopback_host_url}/v1" if config.loopback_host_url else None,
-    )
-    return oai_client.audio.speech
+def get_speech_client() -> SpeechClient:
+    return SpeechClient(get_executor_registry(), get_tts_cache())
 
 
-def get_speech_client_async() -> AsyncSpeech:
+def get_speech_client_async() -> SpeechClient:
     return get_speech_client()
 
 
-SpeechClientDependency = Annotated[AsyncSpeech, Depends(get_speech_client_async)]
+SpeechClientDependency = Annotated[SpeechClient, Depends(get_speech_client_async)]
 
 
 @lru_cache
-def get_transcription_client() -> AsyncTranscriptions:
-    config = get_config()
-    if config.loopback_host_url is None:
-        # this might not work as expected if `stt_router` won't have shared state (access to the same `model_manager`) with the main FastAPI `app`. TODO: verify
-        from speaches.routers.stt import (
-            router as stt_router,
-        )
-
-        http_client = AsyncClient(
-            transport=ASGITransport(stt_router),
-            base_url="http://test/v1",
-        )  # NOTE: "test" can be replaced with any other value
-    else:
-        http_client = AsyncClient(
-            base_url=f"{config.loopback_host_url}/v1",
-        )
-    oai_client = AsyncOpenAI(
-        http_client=http_client,
-        api_key=config.api_key.get_secret_value() if config.api_key else "cant-be-empty",
-        max_retries=0,
-        base_url=f"{config.loopback_host_url}/v1" if config.loopback_host_url else None,
-    )
-    return oai_client.audio.transcriptions
+def get_transcription_client() -> TranscriptionClient:
+    return TranscriptionClient(get_executor_registry())
 
 
-async def get_transcription_client_async() -> AsyncTranscriptions:
+async def get_transcription_client_async() -> TranscriptionClient:
     return get_transcription_client()
 
 
-TranscriptionClientDependency = Annotated[AsyncTranscriptions, Depends(get_transcription_client_async)]
+TranscriptionClientDependency = Annotated[TranscriptionClient, Depends(get_transcription_client_async)]
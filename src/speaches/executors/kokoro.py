@@ -1,11 +1,17 @@
-from collections.abc import Generator
+from collections import deque
+from collections.abc import Callable, Generator
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 import logging
 from pathlib import Path
 import time
 from typing import Literal
+import weakref
 
 import huggingface_hub
 from kokoro_onnx import Kokoro
+from kokoro_onnx.trim import trim as trim_audio
+import numpy as np
 from onnxruntime import InferenceSession
 from pydantic import BaseModel, computed_field
 
@@ -27,10 +33,13 @@ from speaches.hf_utils import (
 from speaches.model_registry import (
     ModelRegistry,
 )
+from speaches.text_utils import split_sentences
 from speaches.tracing import traced_generator
-from speaches.utils import async_to_sync_generator
 
 SAMPLE_RATE = 24000  # the default sample rate for Kokoro
+PHONEMIZE_CACHE_SIZE = 4096
+# number of sentences phonemized ahead of the one being synthesized
+PHONEMIZE_LOOKAHEAD = 2
 LIBRARY_NAME = "onnx"
 TASK_NAME_TAG = "text-to-speech"
 TAGS = {"speaches", "kokoro"}
@@ -186,16 +195,65 @@ class KokoroModelRegistry(ModelRegistry):
 kokoro_model_registry = KokoroModelRegistry(hf_model_filter=hf_model_filter)
 
 
+# espeak-ng (used by the tokenizer) keeps global state and isn't safe to call from multiple threads at once, so all phonemization goes through a single worker thread. This also lets it overlap with ORT inference, which releases the GIL.
+phonemizer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kokoro-phonemizer")
+
+
+def create_stream(
+    tts: Kokoro,
+    phonemize: Callable[[str, str], str],
+    text: str,
+    voice: str,
+    speed: float,
+    lang: str,
+) -> Generator[np.typing.NDArray[np.float32]]:
+    """Synchronous equivalent of `Kokoro.create_stream`.
+
+    `Kokoro.create_stream` is an async generator which offloads each ORT run to the event loop's executor. Consuming it from a synchronous request handler meant driving an event loop (and, if one was already running, a new thread and loop per chunk) just to call blocking functions. This runs the same steps directly in the calling thread.
+
+    The text is synthesized a sentence at a time. Sentences are phonemized on the phonemizer thread `PHONEMIZE_LOOKAHEAD` sentences ahead of the one being synthesized, through `phonemize`, which caches phonemizations since the same phrases tend to come up over and over again.
+    """
+    voice_style = tts.get_voice_style(voice)
+    sentences = iter(split_sentences(text))
+    pending_phonemes: deque[Future[str]] = deque()
+
+    def phonemize_next_sentence() -> None:
+        sentence = next(sentences, None)
+        if sentence is not None:
+            pending_phonemes.append(phonemizer_executor.submit(phonemize, sentence, lang))
+
+    for _ in range(PHONEMIZE_LOOKAHEAD):
+        phonemize_next_sentence()
+    try:
+        while pending_phonemes:
+            phonemes = pending_phonemes.popleft().result()
+            phonemize_next_sentence()
+            for phoneme_batch in tts._split_phonemes(phonemes):  # noqa: SLF001
+                audio, _ = tts._create_audio(phoneme_batch, voice_style, speed)  # noqa: SLF001
+                # trim leading and trailing silence so that the chunks concatenate naturally
+                audio, _ = trim_audio(audio)
+                yield audio
+    finally:
+        # the request may have been cancelled part way through
+        for future in pending_phonemes:
+            future.cancel()
+
+
 class KokoroModelManager(BaseModelManager[Kokoro]):
     def __init__(self, ttl: int, ort_opts: OrtOptions) -> None:
         super().__init__(ttl)
         self.ort_opts = ort_opts
+        # keyed by the model instance so that a cache goes away together with its model when it's unloaded
+        self._phonemizers = weakref.WeakKeyDictionary[Kokoro, Callable[[str, str], str]]()
 
     def _load_fn(self, model_id: str) -> Kokoro:
         model_files = kokoro_model_registry.get_model_files(model_id)
         providers = get_ort_providers_with_options(self.ort_opts)
         inf_sess = InferenceSession(model_files.model, providers=providers)
-        return Kokoro.from_session(inf_sess, str(model_files.voices))
+        tts = Kokoro.from_session(inf_sess, str(model_files.voices))
+        # keyed on `(text, lang)`, references the tokenizer but not `tts` so that it doesn't keep the model alive
+        self._phonemizers[tts] = lru_cache(maxsize=PHONEMIZE_CACHE_SIZE)(tts.tokenizer.phonemize)
+        return tts
 
     @traced_generator()
     def handle_speech_request(
@@ -219,15 +277,14 @@ class KokoroModelManager(BaseModelManager[Kokoro]):
         voice_language = next(v.language for v in VOICES if v.name == request.voice)
         with self.load_model(request.model) as tts:
             start = time.perf_counter()
-            async_stream = tts.create_stream(
+            for audio_data in create_stream(
+                tts,
+                self._phonemizers[tts],
                 request.text,
                 request.voice,
-                lang=voice_language,
-                speed=request.speed,
-            )
-            # HACK: converting an async generator to a sync generator
-            sync_stream = async_to_sync_generator(async_stream)
-            for audio_data, _ in sync_stream:
+                request.speed,
+                voice_language,
+            ):
                 yield Audio(audio_data, sample_rate=SAMPLE_RATE)
 
         logger.info(f"Generated audio for {len(request.text)} characters in {time.perf_counter() - start}s")
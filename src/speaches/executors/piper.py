@@ -1,12 +1,18 @@
+from collections import deque
 from collections.abc import Generator
+from concurrent.futures import Future, ThreadPoolExecutor
 import json
 import logging
+import os
 from pathlib import Path
+from queue import SimpleQueue
 import time
 from typing import Literal
+import weakref
 
 import huggingface_hub
-from onnxruntime import InferenceSession
+import numpy as np
+from onnxruntime import InferenceSession, SessionOptions
 from opentelemetry import trace
 from piper.config import PiperConfig, SynthesisConfig
 from piper.voice import PiperVoice
@@ -15,6 +21,7 @@ from pydantic import BaseModel, computed_field
 from speaches.api_types import Model
 from speaches.audio import Audio
 from speaches.config import OrtOptions
+from speaches.config import PiperConfig as PiperExecutorConfig
 from speaches.executors.shared.base_model_manager import BaseModelManager, get_ort_providers_with_options
 from speaches.executors.shared.handler_protocol import SpeechRequest, SpeechResponse
 from speaches.hf_utils import (
@@ -25,6 +32,7 @@ from speaches.hf_utils import (
     list_model_files,
 )
 from speaches.model_registry import ModelRegistry
+from speaches.text_utils import split_sentences
 from speaches.tracing import traced_generator
 
 PiperVoiceQuality = Literal["x_low", "low", "medium", "high"]
@@ -171,17 +179,81 @@ class PiperModelRegistry(ModelRegistry):
 piper_model_registry = PiperModelRegistry(hf_model_filter=hf_model_filter)
 
 
-class PiperModelManager(BaseModelManager["PiperVoice"]):
-    def __init__(self, ttl: int, ort_opts: OrtOptions) -> None:
+class PiperVoicePool:
+    """Replicas of a Piper voice, each with its own ORT session, used to synthesize the sentences of a request concurrently.
+
+    A pool of a single replica synthesizes in the requesting thread instead, so that concurrent requests run their ORT sessions concurrently rather than queueing up behind one worker thread.
+    """
+
+    def __init__(self, voices: list[PiperVoice]) -> None:
+        self.voices = voices
+        self.config = voices[0].config
+        self._idle_voices = SimpleQueue[PiperVoice]()
+        for voice in voices:
+            self._idle_voices.put(voice)
+        self._executor = ThreadPoolExecutor(max_workers=len(voices), thread_name_prefix="piper")
+        weakref.finalize(self, self._executor.shutdown, wait=False, cancel_futures=True)
+
+    def _synthesize_sentence(self, text: str, syn_config: SynthesisConfig) -> list[np.typing.NDArray[np.int16]]:
+        voice = self._idle_voices.get()
+        try:
+            return [audio_chunk.audio_int16_array for audio_chunk in voice.synthesize(text, syn_config)]
+        finally:
+            self._idle_voices.put(voice)
+
+    def synthesize(self, text: str, syn_config: SynthesisConfig) -> Generator[np.typing.NDArray[np.int16]]:
+        """Synthesize `text` sentence by sentence, yielding the audio of each sentence in order as soon as it's ready.
+
+        At most one sentence per replica is synthesized ahead of the one being yielded, so a slow (or disconnected) client doesn't cause the whole input to be synthesized up front.
+        """
+        if len(self.voices) == 1:
+            for audio_chunk in self.voices[0].synthesize(text, syn_config):
+                yield audio_chunk.audio_int16_array
+            return
+        sentences = iter(split_sentences(text))
+        pending_sentences: deque[Future[list[np.typing.NDArray[np.int16]]]] = deque()
+
+        def submit_next_sentence() -> None:
+            sentence = next(sentences, None)
+            if sentence is not None:
+                pending_sentences.append(self._executor.submit(self._synthesize_sentence, sentence, syn_config))
+
+        for _ in range(len(self.voices)):
+            submit_next_sentence()
+        try:
+            while pending_sentences:
+                audio_chunks = pending_sentences.popleft().result()
+                submit_next_sentence()
+                yield from audio_chunks
+        finally:
+            for future in pending_sentences:
+                future.cancel()
+
+
+class PiperModelManager(BaseModelManager[PiperVoicePool]):
+    def __init__(self, ttl: int, ort_opts: OrtOptions, piper_config: PiperExecutorConfig) -> None:
         super().__init__(ttl)
         self.ort_opts = ort_opts
+        self.piper_config = piper_config
 
-    def _load_fn(self, model_id: str) -> PiperVoice:
+    def _load_fn(self, model_id: str) -> PiperVoicePool:
         model_files = piper_model_registry.get_model_files(model_id)
         providers = get_ort_providers_with_options(self.ort_opts)
-        inf_sess = InferenceSession(model_files.model, providers=providers)
+        sess_options = SessionOptions()
+        num_workers = self.piper_config.num_workers
+        if num_workers > 1:
+            # split the CPU threads between the replicas instead of each of them using all of them
+            sess_options.intra_op_num_threads = max(1, (os.cpu_count() or 1) // num_workers)
         conf = PiperConfig.from_dict(json.loads(model_files.config.read_text()))
-        return PiperVoice(session=inf_sess, config=conf)
+        return PiperVoicePool(
+            [
+                PiperVoice(
+                    session=InferenceSession(model_files.model, sess_options=sess_options, providers=providers),
+                    config=conf,
+                )
+                for _ in range(num_workers)
+            ]
+        )
 
     @traced_generator()
     def handle_speech_request(
@@ -195,6 +267,6 @@ class PiperModelManager(BaseModelManager["PiperVoice"]):
         # TODO: maybe check voice
         with self.load_model(request.model) as piper_tts:
             start = time.perf_counter()
-            for audio_chunk in piper_tts.synthesize(request.text, SynthesisConfig(length_scale=1.0 / request.speed)):
-                yield Audio(audio_chunk.audio_float_array, sample_rate=piper_tts.config.sample_rate)
+            for audio_data in piper_tts.synthesize(request.text, SynthesisConfig(length_scale=1.0 / request.speed)):
+                yield Audio(audio_data, sample_rate=piper_tts.config.sample_rate)
         logger.info(f"Generated audio for {len(request.text)} characters in {time.perf_counter() - start}s")
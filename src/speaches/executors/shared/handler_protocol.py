@@ -7,7 +7,7 @@ from pydantic import BaseModel, ConfigDict
 
 from speaches.api_types import TimestampGranularities
 from speaches.audio import Audio
-from speaches.executors.silero_vad_v5 import SpeechTimestamp, VadOptions
+from speaches.executors.silero_vad_v5 import SpeechTimestamp, VadOptions, VadStreamingEvent
 
 MimeType = str
 
@@ -54,6 +54,8 @@ class VadRequest(BaseModel):
 class VadHandler(Protocol):
     def handle_vad_request(self, request: VadRequest, **kwargs) -> list[SpeechTimestamp]: ...
 
+    def handle_streaming_vad_request(self, request: VadRequest, **kwargs) -> Generator[VadStreamingEvent]: ...
+
 
 class TranscriptionRequest(BaseModel):
     audio: Audio
@@ -45,7 +45,7 @@ class ExecutorRegistry:
         )
         self._piper_executor = Executor[PiperModelManager, PiperModelRegistry](
             name="piper",
-            model_manager=PiperModelManager(config.tts_model_ttl, config.unstable_ort_opts),
+            model_manager=PiperModelManager(config.tts_model_ttl, config.unstable_ort_opts, config.piper),
             model_registry=piper_model_registry,
             task="text-to-speech",
         )
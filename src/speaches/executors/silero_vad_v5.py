@@ -3,7 +3,7 @@ from __future__ import annotations
 import logging
 from pathlib import Path
 import time
-from typing import TYPE_CHECKING, TypedDict
+from typing import TYPE_CHECKING, Literal, TypedDict, cast
 
 from faster_whisper.utils import get_assets_path
 import numpy as np
@@ -17,7 +17,7 @@ from speaches.model_registry import ModelRegistry
 from speaches.tracing import traced
 
 if TYPE_CHECKING:
-    from collections.abc import Generator
+    from collections.abc import Generator, Iterable
 
     from numpy.typing import NDArray
 
@@ -28,6 +28,12 @@ if TYPE_CHECKING:
 SAMPLE_RATE = 16000
 MODEL_ID = "silero_vad_v5"
 SAMPLE_RATE_MS = SAMPLE_RATE // 1000
+WINDOW_SIZE_SAMPLES = 512
+CONTEXT_SIZE_SAMPLES = 64
+ENCODER_BATCH_SIZE = 10000
+STREAMING_CHUNK_SIZE_WINDOWS = 250  # 8 seconds of audio per emitted `speech.probabilities` event
+ENERGY_GATE_MARGIN_WINDOWS = 8  # windows next to a loud window are never gated
+ENERGY_GATE_WARMUP_WINDOWS = 16  # windows the model runs over before a candidate region so that its state settles
 
 logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
@@ -54,6 +60,9 @@ class VadOptions(BaseModel):
       min_silence_duration_ms: In the end of each speech chunk wait for min_silence_duration_ms
         before separating it
       speech_pad_ms: Final speech chunks are padded by speech_pad_ms each side
+      min_energy_dbfs: Optional energy pre-gate. Windows whose RMS level (in dBFS) is below this value,
+        and that aren't next to a louder window, are considered silence without running the model.
+        Useful for audio containing long stretches of (digital) silence. `None` disables the pre-gate.
 
     """
 
@@ -63,6 +72,11 @@ class VadOptions(BaseModel):
     max_speech_duration_s: float = float("inf")
     min_silence_duration_ms: int = 2000
     speech_pad_ms: int = 400
+    min_energy_dbfs: float | None = None
+
+
+# NOTE: copied from `faster_whisper.transcribe`
+DEFAULT_VAD_OPTIONS = VadOptions(min_silence_duration_ms=160, max_speech_duration_s=30)
 
 
 class SpeechTimestamp(BaseModel):
@@ -70,6 +84,36 @@ class SpeechTimestamp(BaseModel):
     end: int
 
 
+class SpeechProbabilitiesEvent(BaseModel):
+    """Emitted for each chunk of audio processed by the VAD model."""
+
+    type: Literal["speech.probabilities"] = "speech.probabilities"
+    offset_ms: int
+    """Start of the first window in this chunk, in milliseconds from the beginning of the audio."""
+    window_ms: int
+    """Duration of a single VAD window in milliseconds."""
+    probabilities: list[float]
+    """Speech probability of each consecutive window."""
+
+
+class SpeechSegmentEvent(BaseModel):
+    """Emitted as soon as the end of a speech segment is known. Timestamps are in milliseconds and do not have `speech_pad_ms` applied, as padding depends on the following segment."""
+
+    type: Literal["speech.segment"] = "speech.segment"
+    start: int
+    end: int
+
+
+class SpeechTimestampsDoneEvent(BaseModel):
+    """Emitted once the whole audio has been processed. `timestamps` are identical to the ones returned by the non-streaming endpoint."""
+
+    type: Literal["speech.timestamps.done"] = "speech.timestamps.done"
+    timestamps: list[SpeechTimestamp]
+
+
+type VadStreamingEvent = SpeechProbabilitiesEvent | SpeechSegmentEvent | SpeechTimestampsDoneEvent
+
+
 class SileroVADModelFiles(BaseModel):
     encoder: Path
     decoder: Path
@@ -138,6 +182,57 @@ class SileroVADModel:
         logger.debug(f"VAD model inference took {time.perf_counter() - timelog_start_1:.4f}s")
         return out
 
+    def stream(
+        self,
+        audio: np.ndarray,
+        num_samples: int = WINDOW_SIZE_SAMPLES,
+        context_size_samples: int = CONTEXT_SIZE_SAMPLES,
+        chunk_size_windows: int = ENCODER_BATCH_SIZE,
+    ) -> Generator[NDArray[np.float32]]:
+        """Yield speech probabilities of a one dimensional `audio` array, `chunk_size_windows` windows at a time.
+
+        The decoder state and the window context are carried across chunks, so concatenating the yielded arrays gives the same result as calling the model on the whole (padded) audio at once. Like `get_speech_timestamps` always did, the audio is zero padded with `num_samples - len(audio) % num_samples` samples.
+        """
+        assert audio.ndim == 1, "Input should be a 1D array"
+        num_windows = audio.shape[0] // num_samples + 1
+        state = np.zeros((2, 1, 128), dtype=np.float32)
+        context = np.zeros((1, context_size_samples), dtype=np.float32)
+
+        for window_offset in range(0, num_windows, chunk_size_windows):
+            timelog_start = time.perf_counter()
+            chunk_num_windows = min(chunk_size_windows, num_windows - window_offset)
+            chunk = audio[window_offset * num_samples : (window_offset + chunk_num_windows) * num_samples]
+            if chunk.shape[0] < chunk_num_windows * num_samples:
+                chunk = np.pad(chunk, (0, chunk_num_windows * num_samples - chunk.shape[0]))
+            windows = chunk.reshape(chunk_num_windows, num_samples).astype(np.float32, copy=False)
+
+            windows_with_context = np.empty((chunk_num_windows, context_size_samples + num_samples), dtype=np.float32)
+            windows_with_context[0, :context_size_samples] = context
+            windows_with_context[1:, :context_size_samples] = windows[:-1, -context_size_samples:]
+            windows_with_context[:, context_size_samples:] = windows
+            context = windows[-1:, -context_size_samples:]
+
+            encoder_outputs = [
+                cast(
+                    "NDArray[np.float32]",
+                    self.encoder_session.run(None, {"input": windows_with_context[i : i + ENCODER_BATCH_SIZE]})[0],
+                )
+                for i in range(0, chunk_num_windows, ENCODER_BATCH_SIZE)
+            ]
+            encoder_output = np.concatenate(encoder_outputs, axis=0).reshape(chunk_num_windows, 1, 128)
+
+            probs = np.empty(chunk_num_windows, dtype=np.float32)
+            for i in range(chunk_num_windows):
+                out, state = cast(
+                    "list[NDArray[np.float32]]",
+                    self.decoder_session.run(None, {"input": encoder_output[i], "state": state}),
+                )
+                probs[i] = out.reshape(-1)[0]
+            logger.debug(
+                f"VAD model inference took {time.perf_counter() - timelog_start:.4f}s for {chunk_num_windows} windows"
+            )
+            yield probs
+
 
 class SileroVADModelRegistry(ModelRegistry):
     def list_remote_models(self) -> Generator[Model]:
@@ -186,60 +281,158 @@ class SileroVADModelManager(BaseModelManager[SileroVADModel]):
             sampling_rate=request.sampling_rate,
         )
 
+    def handle_streaming_vad_request(self, request: VadRequest, **_kwargs) -> Generator[VadStreamingEvent]:
+        return stream_speech_timestamps(
+            request.audio.data,
+            model_manager=self,
+            model_id=request.model_id,
+            vad_options=request.vad_options,
+            sampling_rate=request.sampling_rate,
+        )
 
-def get_speech_timestamps(
-    audio: np.ndarray,
-    vad_options: VadOptions,
-    model_manager: SileroVADModelManager,
-    model_id: str = MODEL_ID,
-    sampling_rate: int = SAMPLE_RATE,
-) -> list[SpeechTimestamp]:
-    """This method is used for splitting long audios into speech chunks using silero VAD.
-
-    Args:
-      audio: One dimensional float array.
-      model_manager: The model manager instance for loading the VAD model.
-      model_id: The model ID to use for VAD.
-      vad_options: Options for VAD processing.
-      sampling rate: Sampling rate of the audio.
 
-    Returns:
-      List of dicts containing begin and end samples of each speech chunk.
+def find_candidate_regions(
+    audio: np.ndarray,
+    min_energy_dbfs: float,
+    num_samples: int = WINDOW_SIZE_SAMPLES,
+    chunk_size_windows: int = ENCODER_BATCH_SIZE,
+) -> list[tuple[int, int]]:
+    """Return `[start, end)` window ranges that may contain speech according to a cheap RMS energy gate.
 
+    The windows follow the same layout as `SileroVADModel.stream`. Regions are dilated by `ENERGY_GATE_MARGIN_WINDOWS` and regions separated by fewer windows than it takes to warm up the model are merged.
     """
-    _perf_start = time.perf_counter()
+    num_windows = audio.shape[0] // num_samples + 1
+    # dBFS of the mean square is compared against the threshold in the linear domain to avoid the `log10`
+    min_mean_square = 10 ** (min_energy_dbfs / 10)
+    loud = np.empty(num_windows, dtype=bool)
+    for window_offset in range(0, num_windows, chunk_size_windows):
+        chunk_num_windows = min(chunk_size_windows, num_windows - window_offset)
+        chunk = audio[window_offset * num_samples : (window_offset + chunk_num_windows) * num_samples]
+        if chunk.shape[0] < chunk_num_windows * num_samples:
+            chunk = np.pad(chunk, (0, chunk_num_windows * num_samples - chunk.shape[0]))
+        windows = chunk.reshape(chunk_num_windows, num_samples).astype(np.float32, copy=False)
+        mean_square = np.einsum("ij,ij->i", windows, windows) / num_samples
+        loud[window_offset : window_offset + chunk_num_windows] = mean_square >= min_mean_square
+
+    loud_indices = np.flatnonzero(loud)
+    if len(loud_indices) == 0:
+        return []
+    # split wherever two loud windows are far enough apart that the gap in between can be skipped
+    max_gap = 2 * ENERGY_GATE_MARGIN_WINDOWS + ENERGY_GATE_WARMUP_WINDOWS
+    split_points = np.flatnonzero(np.diff(loud_indices) > max_gap)
+    starts = np.concatenate([loud_indices[:1], loud_indices[split_points + 1]])
+    ends = np.concatenate([loud_indices[split_points], loud_indices[-1:]]) + 1
+    return [
+        (max(0, int(start) - ENERGY_GATE_MARGIN_WINDOWS), min(num_windows, int(end) + ENERGY_GATE_MARGIN_WINDOWS))
+        for start, end in zip(starts, ends, strict=True)
+    ]
+
+
+def stream_speech_probabilities(
+    model: SileroVADModel,
+    audio: np.ndarray,
+    min_energy_dbfs: float | None = None,
+    num_samples: int = WINDOW_SIZE_SAMPLES,
+    chunk_size_windows: int = ENCODER_BATCH_SIZE,
+) -> Generator[NDArray[np.float32]]:
+    """Same as `SileroVADModel.stream`, but with an optional energy pre-gate.
 
-    threshold = vad_options.threshold
-    neg_threshold = vad_options.neg_threshold
-    min_speech_duration_ms = vad_options.min_speech_duration_ms
-    max_speech_duration_s = vad_options.max_speech_duration_s
-    min_silence_duration_ms = vad_options.min_silence_duration_ms
-    window_size_samples = 512
-    speech_pad_ms = vad_options.speech_pad_ms
-    min_speech_samples = sampling_rate * min_speech_duration_ms / 1000
-    speech_pad_samples = sampling_rate * speech_pad_ms / 1000
-    max_speech_samples = sampling_rate * max_speech_duration_s - window_size_samples - 2 * speech_pad_samples
-    min_silence_samples = sampling_rate * min_silence_duration_ms / 1000
-    min_silence_samples_at_max_speech = sampling_rate * 98 / 1000
+    When `min_energy_dbfs` is set, the model only runs over the candidate regions found by `find_candidate_regions` (plus `ENERGY_GATE_WARMUP_WINDOWS` windows before each region, whose probabilities are discarded, so that the decoder state and context settle). Every other window gets a speech probability of 0.
+    """
+    if min_energy_dbfs is None:
+        yield from model.stream(audio, num_samples=num_samples, chunk_size_windows=chunk_size_windows)
+        return
 
-    audio_length_samples = len(audio)
+    num_windows = audio.shape[0] // num_samples + 1
+    regions = find_candidate_regions(audio, min_energy_dbfs, num_samples=num_samples)
+    logger.debug(
+        f"Energy pre-gate kept {sum(end - start for start, end in regions)}/{num_windows} windows in {len(regions)} regions"
+    )
 
-    with model_manager.load_model(model_id) as model:
-        padded_audio = np.pad(audio, (0, window_size_samples - audio.shape[0] % window_size_samples))
-        speech_probs = model(padded_audio.reshape(1, -1)).squeeze(0)
+    def pieces() -> Generator[NDArray[np.float32]]:
+        window_index = 0
+        for start, end in regions:
+            if start > window_index:
+                yield np.zeros(start - window_index, dtype=np.float32)
+            warmup_start = max(0, start - ENERGY_GATE_WARMUP_WINDOWS)
+            # `stream` always adds a trailing window, which is only wanted when the region reaches the end of the audio
+            region_audio = audio[warmup_start * num_samples : end * num_samples]
+            to_skip, to_take = start - warmup_start, end - start
+            for probs in model.stream(region_audio, num_samples=num_samples, chunk_size_windows=chunk_size_windows):
+                skipped = min(to_skip, len(probs))
+                taken = probs[skipped : skipped + to_take]
+                to_skip -= skipped
+                to_take -= len(taken)
+                if len(taken) > 0:
+                    yield taken
+            window_index = end
+        if window_index < num_windows:
+            yield np.zeros(num_windows - window_index, dtype=np.float32)
+
+    # re-chunk so that consumers see the same chunk boundaries as without the pre-gate
+    buffered: list[NDArray[np.float32]] = []
+    buffered_size = 0
+    for piece in pieces():
+        buffered.append(piece)
+        buffered_size += len(piece)
+        while buffered_size >= chunk_size_windows:
+            merged = np.concatenate(buffered)
+            yield merged[:chunk_size_windows]
+            buffered = [merged[chunk_size_windows:]]
+            buffered_size -= chunk_size_windows
+    if buffered_size > 0:
+        yield np.concatenate(buffered)
+
+
+class SpeechSegmenter:
+    """Incremental version of the Silero VAD segmentation logic.
+
+    Speech probabilities can be fed in chunks via `process`. Speech segments (in samples, without `speech_pad_ms` applied) are returned as soon as their end is known.
+    """
 
-        triggered = False
-        speeches = []
-        current_speech = {}
-        if neg_threshold is None:
-            neg_threshold = max(threshold - 0.15, 0.01)
+    def __init__(
+        self,
+        vad_options: VadOptions,
+        sampling_rate: int = SAMPLE_RATE,
+        window_size_samples: int = WINDOW_SIZE_SAMPLES,
+    ) -> None:
+        self.threshold = vad_options.threshold
+        self.neg_threshold = (
+            vad_options.neg_threshold
+            if vad_options.neg_threshold is not None
+            else max(vad_options.threshold - 0.15, 0.01)
+        )
+        self.window_size_samples = window_size_samples
+        speech_pad_samples = sampling_rate * vad_options.speech_pad_ms / 1000
+        self.min_speech_samples = sampling_rate * vad_options.min_speech_duration_ms / 1000
+        self.max_speech_samples = (
+            sampling_rate * vad_options.max_speech_duration_s - window_size_samples - 2 * speech_pad_samples
+        )
+        self.min_silence_samples = sampling_rate * vad_options.min_silence_duration_ms / 1000
+        self.min_silence_samples_at_max_speech = sampling_rate * 98 / 1000
 
+        self.window_index = 0
+        self.triggered = False
+        self.current_speech: dict[str, int] = {}
         # to save potential segment end (and tolerate some silence)
-        temp_end = 0
+        self.temp_end = 0
         # to save potential segment limits in case of maximum segment size reached
-        prev_end = next_start = 0
-
-        for i, speech_prob in enumerate(speech_probs):
+        self.prev_end = 0
+        self.next_start = 0
+
+    def process(self, speech_probs: Iterable[float]) -> list[dict[str, int]]:
+        # NOTE: the state is copied into local variables as this loop runs once per 32ms window
+        threshold, neg_threshold = self.threshold, self.neg_threshold
+        window_size_samples = self.window_size_samples
+        min_speech_samples, max_speech_samples = self.min_speech_samples, self.max_speech_samples
+        min_silence_samples = self.min_silence_samples
+        min_silence_samples_at_max_speech = self.min_silence_samples_at_max_speech
+        triggered, current_speech = self.triggered, self.current_speech
+        temp_end, prev_end, next_start = self.temp_end, self.prev_end, self.next_start
+
+        speeches: list[dict[str, int]] = []
+        i = self.window_index - 1
+        for i, speech_prob in enumerate(speech_probs, start=self.window_index):
             if (speech_prob >= threshold) and temp_end:
                 temp_end = 0
                 if next_start < prev_end:
@@ -285,27 +478,122 @@ def get_speech_timestamps(
                 triggered = False
                 continue
 
-        if current_speech and (audio_length_samples - current_speech["start"]) > min_speech_samples:
+        self.window_index = i + 1
+        self.triggered, self.current_speech = triggered, current_speech
+        self.temp_end, self.prev_end, self.next_start = temp_end, prev_end, next_start
+        return speeches
+
+    def finish(self, audio_length_samples: int) -> list[dict[str, int]]:
+        """Close the speech segment that is still open at the end of the audio (if any)."""
+        current_speech = self.current_speech
+        self.current_speech = {}
+        if current_speech and (audio_length_samples - current_speech["start"]) > self.min_speech_samples:
             current_speech["end"] = audio_length_samples
-            speeches.append(current_speech)
-
-        for i, speech in enumerate(speeches):
-            if i == 0:
-                speech["start"] = int(max(0, speech["start"] - speech_pad_samples))
-            if i != len(speeches) - 1:
-                silence_duration = speeches[i + 1]["start"] - speech["end"]
-                if silence_duration < 2 * speech_pad_samples:
-                    speech["end"] += int(silence_duration // 2)
-                    speeches[i + 1]["start"] = int(max(0, speeches[i + 1]["start"] - silence_duration // 2))
-                else:
-                    speech["end"] = int(min(audio_length_samples, speech["end"] + speech_pad_samples))
-                    speeches[i + 1]["start"] = int(max(0, speeches[i + 1]["start"] - speech_pad_samples))
+            return [current_speech]
+        return []
+
+
+def pad_speech_timestamps(
+    speeches: list[dict[str, int]], speech_pad_samples: float, audio_length_samples: int
+) -> list[SpeechTimestamp]:
+    for i, speech in enumerate(speeches):
+        if i == 0:
+            speech["start"] = int(max(0, speech["start"] - speech_pad_samples))
+        if i != len(speeches) - 1:
+            silence_duration = speeches[i + 1]["start"] - speech["end"]
+            if silence_duration < 2 * speech_pad_samples:
+                speech["end"] += int(silence_duration // 2)
+                speeches[i + 1]["start"] = int(max(0, speeches[i + 1]["start"] - silence_duration // 2))
             else:
                 speech["end"] = int(min(audio_length_samples, speech["end"] + speech_pad_samples))
+                speeches[i + 1]["start"] = int(max(0, speeches[i + 1]["start"] - speech_pad_samples))
+        else:
+            speech["end"] = int(min(audio_length_samples, speech["end"] + speech_pad_samples))
+    return [SpeechTimestamp(**speech) for speech in speeches]
+
+
+def get_speech_timestamps(
+    audio: np.ndarray,
+    vad_options: VadOptions,
+    model_manager: SileroVADModelManager,
+    model_id: str = MODEL_ID,
+    sampling_rate: int = SAMPLE_RATE,
+) -> list[SpeechTimestamp]:
+    """This method is used for splitting long audios into speech chunks using silero VAD.
+
+    Args:
+      audio: One dimensional float array.
+      model_manager: The model manager instance for loading the VAD model.
+      model_id: The model ID to use for VAD.
+      vad_options: Options for VAD processing.
+      sampling rate: Sampling rate of the audio.
+
+    Returns:
+      List of dicts containing begin and end samples of each speech chunk.
+
+    """
+    _perf_start = time.perf_counter()
+
+    audio_length_samples = len(audio)
+    segmenter = SpeechSegmenter(vad_options, sampling_rate)
+    speeches: list[dict[str, int]] = []
+
+    with model_manager.load_model(model_id) as model:
+        for speech_probs in stream_speech_probabilities(model, audio, min_energy_dbfs=vad_options.min_energy_dbfs):
+            speeches.extend(segmenter.process(speech_probs))
+    speeches.extend(segmenter.finish(audio_length_samples))
+
+    speech_pad_samples = sampling_rate * vad_options.speech_pad_ms / 1000
+    speech_timestamps = pad_speech_timestamps(speeches, speech_pad_samples, audio_length_samples)
 
     elapsed = time.perf_counter() - _perf_start
     logger.debug(f"VAD processing took {elapsed:.4f}s for {audio_length_samples / sampling_rate:.2f}s audio")
-    return [SpeechTimestamp(**speech) for speech in speeches]
+    return speech_timestamps
+
+
+def stream_speech_timestamps(
+    audio: np.ndarray,
+    vad_options: VadOptions,
+    model_manager: SileroVADModelManager,
+    model_id: str = MODEL_ID,
+    sampling_rate: int = SAMPLE_RATE,
+    chunk_size_windows: int = STREAMING_CHUNK_SIZE_WINDOWS,
+) -> Generator[VadStreamingEvent]:
+    """Same as `get_speech_timestamps` but emits the speech probabilities and the (unpadded) speech segments while the VAD advances through the audio. All of the timestamps are in milliseconds."""
+    sampling_rate_ms = sampling_rate // 1000
+    window_ms = WINDOW_SIZE_SAMPLES // sampling_rate_ms
+    audio_length_samples = len(audio)
+    segmenter = SpeechSegmenter(vad_options, sampling_rate)
+    speeches: list[dict[str, int]] = []
+
+    with model_manager.load_model(model_id) as model:
+        window_offset = 0
+        for speech_probs in stream_speech_probabilities(
+            model, audio, min_energy_dbfs=vad_options.min_energy_dbfs, chunk_size_windows=chunk_size_windows
+        ):
+            yield SpeechProbabilitiesEvent(
+                offset_ms=window_offset * window_ms, window_ms=window_ms, probabilities=speech_probs.tolist()
+            )
+            window_offset += len(speech_probs)
+            for speech in segmenter.process(speech_probs):
+                speeches.append(speech)
+                yield SpeechSegmentEvent(
+                    start=speech["start"] // sampling_rate_ms, end=speech["end"] // sampling_rate_ms
+                )
+    for speech in segmenter.finish(audio_length_samples):
+        speeches.append(speech)
+        yield SpeechSegmentEvent(start=speech["start"] // sampling_rate_ms, end=speech["end"] // sampling_rate_ms)
+
+    speech_pad_samples = sampling_rate * vad_options.speech_pad_ms / 1000
+    speech_timestamps = pad_speech_timestamps(
+        [speech.copy() for speech in speeches], speech_pad_samples, audio_length_samples
+    )
+    yield SpeechTimestampsDoneEvent(
+        timestamps=[
+            SpeechTimestamp(start=ts.start // sampling_rate_ms, end=ts.end // sampling_rate_ms)
+            for ts in speech_timestamps
+        ]
+    )
 
 
 def to_ms_speech_timestamps(speech_timestamps: list[SpeechTimestamp]) -> list[SpeechTimestamp]:
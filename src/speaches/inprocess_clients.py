@@ -0,0 +1,118 @@
+import asyncio
+from collections.abc import AsyncGenerator, Generator
+from contextlib import contextmanager
+import logging
+
+from fastapi import HTTPException
+from starlette.concurrency import iterate_in_threadpool
+
+from speaches.audio import Audio
+from speaches.executors.shared.handler_protocol import SpeechRequest, TranscriptionRequest, VadRequest
+from speaches.executors.shared.registry import ExecutorRegistry
+from speaches.executors.silero_vad_v5 import DEFAULT_VAD_OPTIONS
+from speaches.model_aliases import resolve_model_id_alias
+from speaches.resample import StreamingResampler
+from speaches.routers.utils import find_executor_for_model_or_raise, get_model_card_data_or_raise
+from speaches.tts_cache import TtsCache
+
+logger = logging.getLogger(__name__)
+
+# Internal callers (the voice chat endpoint and the realtime API) used to reach the speech and transcription endpoints through the OpenAI client and an ASGI transport. That meant encoding audio to WAV, sending it as multipart form data and decoding it again on the other side for every request. The clients below call the executors directly and work with `Audio` objects instead.
+
+
+class InProcessClientError(Exception):
+    """Raised by the in-process clients where the OpenAI client used to raise an `openai.APIStatusError` for the endpoint's error response."""
+
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@contextmanager
+def _raise_client_errors() -> Generator[None]:
+    try:
+        yield
+    except HTTPException as e:  # e.g. the model isn't installed
+        raise InProcessClientError(str(e.detail), e.status_code) from e
+    except ValueError as e:  # e.g. an unsupported voice or speed
+        raise InProcessClientError(str(e), 400) from e
+    except Exception as e:  # e.g. an ORT error, which the endpoint would have responded to with a 500
+        logger.exception("In-process request failed")
+        raise InProcessClientError(f"{type(e).__name__}: {e}", 500) from e
+
+
+class SpeechClient:
+    def __init__(self, executor_registry: ExecutorRegistry, tts_cache: TtsCache | None = None) -> None:
+        self.executor_registry = executor_registry
+        self.tts_cache = tts_cache
+
+    async def synthesize(
+        self, text: str, *, model: str, voice: str, speed: float = 1.0, sample_rate: int | None = None
+    ) -> AsyncGenerator[Audio]:
+        """Synthesize `text`, yielding the audio as it's generated.
+
+        If `sample_rate` is provided, the audio is resampled to it. Otherwise, it's at the model's sample rate. Errors are raised as `InProcessClientError`s.
+        """
+        with _raise_client_errors():
+            async for audio in self._synthesize(text, model=model, voice=voice, speed=speed, sample_rate=sample_rate):
+                yield audio
+
+    async def _synthesize(
+        self, text: str, *, model: str, voice: str, speed: float, sample_rate: int | None
+    ) -> AsyncGenerator[Audio]:
+        model = resolve_model_id_alias(model)
+        model_card_data = get_model_card_data_or_raise(model)
+        executor = find_executor_for_model_or_raise(model, model_card_data, self.executor_registry.text_to_speech)
+        speech_request = SpeechRequest(model=model, voice=voice, text=text, speed=speed)
+        audio_generator = executor.model_manager.handle_speech_request(speech_request)
+        if self.tts_cache is not None:
+            audio_generator = self.tts_cache.cached(speech_request, audio_generator)
+
+        if sample_rate is None:
+            async for audio in iterate_in_threadpool(audio_generator):
+                yield audio
+            return
+        resampler: StreamingResampler | None = None
+        async for audio in iterate_in_threadpool(audio_generator):
+            if audio.sample_rate == sample_rate:
+                yield audio
+                continue
+            if resampler is None:
+                resampler = StreamingResampler(audio.sample_rate, sample_rate)
+            yield Audio(resampler.process(audio.data), sample_rate)
+        if resampler is not None:
+            yield Audio(resampler.flush(), sample_rate)
+
+
+class TranscriptionClient:
+    def __init__(self, executor_registry: ExecutorRegistry) -> None:
+        self.executor_registry = executor_registry
+
+    async def transcribe(
+        self, audio: Audio, *, model: str, language: str | None = None, prompt: str | None = None
+    ) -> str:
+        """Transcribe 16kHz `audio` into plain text. Errors are raised as `InProcessClientError`s."""
+        with _raise_client_errors():
+            return await asyncio.to_thread(self._transcribe, audio, model, language, prompt)
+
+    def _transcribe(self, audio: Audio, model: str, language: str | None, prompt: str | None) -> str:
+        model = resolve_model_id_alias(model)
+        model_card_data = get_model_card_data_or_raise(model)
+        executor = find_executor_for_model_or_raise(model, model_card_data, self.executor_registry.transcription)
+        vad_request = VadRequest(audio=audio, vad_options=DEFAULT_VAD_OPTIONS)
+        speech_segments = self.executor_registry.vad.model_manager.handle_vad_request(vad_request)
+        transcription_request = TranscriptionRequest(
+            audio=audio,
+            model=model,
+            language=language,
+            prompt=prompt,
+            response_format="text",
+            timestamp_granularities=["segment"],
+            speech_segments=speech_segments,
+            vad_options=DEFAULT_VAD_OPTIONS,
+        )
+        res = executor.model_manager.handle_transcription_request(transcription_request)
+        assert isinstance(res, tuple), res
+        text, _ = res
+        return text
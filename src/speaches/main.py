@@ -21,7 +21,13 @@ from fastapi.staticfiles import StaticFiles
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.responses import RedirectResponse
 
-from speaches.dependencies import ApiKeyDependency, get_config, get_executor_registry
+from speaches.dependencies import (
+    ApiKeyDependency,
+    get_config,
+    get_decode_pool,
+    get_executor_registry,
+    get_state_store,
+)
 from speaches.logger import setup_logger
 from speaches.routers.chat import (
     router as chat_router,
@@ -50,6 +56,9 @@ from speaches.routers.speech import (
 from speaches.routers.speech_embedding import (
     router as speech_embedding_router,
 )
+from speaches.routers.speech_ws import (
+    router as speech_ws_router,
+)
 from speaches.routers.stt import (
     router as stt_router,
 )
@@ -91,7 +100,12 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
             executor_registry.download_model_by_id(model_id)
             logger.info(f"Successfully downloaded model: {model_id}")
 
+    decode_pool = get_decode_pool()
+    state_store = get_state_store()
     yield
+    if decode_pool is not None:
+        decode_pool.shutdown()
+    state_store.close()
 
 
 def create_app() -> FastAPI:
@@ -172,8 +186,9 @@ def create_app() -> FastAPI:
     app.include_router(vad_router, dependencies=http_dependencies)
     app.include_router(diarization_router, dependencies=http_dependencies)
 
-    # WebSocket router WITHOUT authentication (handles its own)
+    # WebSocket routers WITHOUT authentication (handle their own)
     app.include_router(realtime_ws_router)
+    app.include_router(speech_ws_router)
 
     # HACK: move this elsewhere
     app.get("/v1/realtime", include_in_schema=False)(lambda: RedirectResponse(url="/v1/realtime/"))
@@ -1,3 +1,4 @@
+from collections.abc import Iterable
 import logging
 
 from openai.types.chat import (
@@ -21,6 +22,11 @@ from speaches.types.realtime import ConversationItem, Response
 
 logger = logging.getLogger(__name__)
 
+# a rough estimate for English text. Good enough for budgeting the history, without depending on the model's tokenizer
+CHARACTERS_PER_TOKEN = 4
+# the role and the message delimiters
+MESSAGE_TOKEN_OVERHEAD = 4
+
 
 def create_completion_params(
     model_id: str, messages: list[ChatCompletionMessageParam], response: Response
@@ -123,3 +129,83 @@ def items_to_chat_messages(items: list[ConversationItem]) -> list[ChatCompletion
         for chat_message in (conversation_item_to_chat_message(item) for item in items)
         if chat_message is not None
     ]
+
+
+class ChatMessageCache:
+    """Chat messages converted from the items of a conversation, so that each item is only converted once rather than on every response.
+
+    Only completed items, and the ones whose generation was stopped (see `add_incomplete_item`), are cached. Items that are still being generated, or whose transcript isn't available yet, are converted again the next time.
+    """
+
+    def __init__(self) -> None:
+        # `None` for the items that are left out of the chat messages
+        self._messages: dict[str, ChatCompletionMessageParam | None] = {}
+
+    def items_to_chat_messages(self, items: list[ConversationItem]) -> list[ChatCompletionMessageParam]:
+        chat_messages: list[ChatCompletionMessageParam] = []
+        for item in items:
+            if item.id in self._messages:
+                chat_message = self._messages[item.id]
+            else:
+                chat_message = conversation_item_to_chat_message(item)
+                if chat_message is not None and item.status == "completed":
+                    self._messages[item.id] = chat_message
+            if chat_message is not None:
+                chat_messages.append(chat_message)
+        return chat_messages
+
+    def add_incomplete_item(self, item: ConversationItem) -> None:
+        """Cache the partial content of an item whose generation stopped early, e.g. because the response was cancelled.
+
+        Like with OpenAI's API, the item stays `incomplete` and the text (or transcript) generated before the response stopped is part of the following responses. A function call without all of its arguments, or a message without any text, is left out of them instead.
+        """
+        text = ""
+        if item.type == "message" and item.role == "assistant" and len(item.content) == 1:
+            content = item.content[0]
+            if content.type == "text":
+                text = content.text
+            elif content.type == "audio":
+                text = content.transcript
+        self._messages[item.id] = ChatCompletionAssistantMessageParam(role="assistant", content=text) if text else None
+
+    def discard(self, item_id: str) -> None:
+        self._messages.pop(item_id, None)
+
+
+def estimate_message_tokens(message: ChatCompletionMessageParam) -> int:
+    length = 0
+    content = message.get("content")
+    if isinstance(content, str):
+        length += len(content)
+    elif isinstance(content, Iterable):
+        length += sum(len(part["text"]) for part in content if part["type"] == "text")
+    if message["role"] == "assistant":
+        for tool_call in message.get("tool_calls", []):
+            if tool_call["type"] == "function":
+                length += len(tool_call["function"]["name"]) + len(tool_call["function"]["arguments"])
+    return MESSAGE_TOKEN_OVERHEAD + length // CHARACTERS_PER_TOKEN
+
+
+def limit_chat_history(
+    messages: list[ChatCompletionMessageParam], max_turns: int | None, max_tokens: int | None
+) -> list[ChatCompletionMessageParam]:
+    """Keep the most recent messages that fit within `max_turns` user turns and `max_tokens` estimated tokens.
+
+    The history is only cut right before a user message, so that e.g. a tool call is never separated from its output. The latest turn is kept even if it doesn't fit within `max_tokens`. Only the kept messages are looked at, so the cost doesn't grow with the length of the conversation.
+    """
+    if max_turns is None and max_tokens is None:
+        return messages
+    start = len(messages)
+    turns = 0
+    tokens = 0
+    for i in reversed(range(len(messages))):
+        tokens += estimate_message_tokens(messages[i])
+        if max_tokens is not None and tokens > max_tokens and start < len(messages):
+            break
+        is_user_message = messages[i]["role"] == "user"
+        if is_user_message or i == 0:
+            start = i
+            turns += is_user_message
+            if max_turns is not None and turns >= max_turns:
+                break
+    return messages[start:]
@@ -1,32 +1,39 @@
+import asyncio
 from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+import functools
 from typing import TYPE_CHECKING
 
-from openai.resources.audio import AsyncTranscriptions
-from openai.resources.chat.completions import AsyncCompletions
-
+from speaches.config import RealtimeHistoryConfig
 from speaches.executors.silero_vad_v5 import SileroVADModelManager
+from speaches.inprocess_clients import TranscriptionClient
 from speaches.realtime.conversation_event_router import Conversation
 from speaches.realtime.input_audio_buffer import InputAudioBuffer
 from speaches.realtime.pubsub import EventPubSub
+from speaches.resample import StreamingResampler
 from speaches.types.realtime import Session
 
 if TYPE_CHECKING:
     from speaches.realtime.response_event_router import ResponseHandler
+    from speaches.routers.chat import InProcessChatCompletions
 
 
 class SessionContext:
     def __init__(
         self,
-        transcription_client: AsyncTranscriptions,
-        completion_client: AsyncCompletions,
+        transcription_client: TranscriptionClient,
+        completion_client: "InProcessChatCompletions",
         vad_model_manager: SileroVADModelManager,
         session: Session,
+        history_config: RealtimeHistoryConfig,
     ) -> None:
         self.transcription_client = transcription_client
         self.completion_client = completion_client
         self.vad_model_manager = vad_model_manager
 
         self.session = session
+        self.history_config = history_config
 
         self.pubsub = EventPubSub()
         self.conversation = Conversation(self.pubsub)
@@ -34,3 +41,14 @@ class SessionContext:
 
         input_audio_buffer = InputAudioBuffer(self.pubsub)
         self.input_audio_buffers = OrderedDict[str, InputAudioBuffer]({input_audio_buffer.id: input_audio_buffer})
+        # appended audio is one continuous stream, so resampling state is carried across `input_audio_buffer.append` events
+        self.input_audio_resampler = StreamingResampler(24000, 16000)
+        # resampling and running the VAD over appended audio is CPU bound. It runs on a thread of the session's own, rather than on the event loop shared by all sessions. A single thread keeps the `input_audio_buffer.*` events in the order they were received, and it's the only one modifying `input_audio_buffers` and `input_audio_resampler`
+        self.audio_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"audio-{session.id}")
+
+    def run_in_audio_worker[**P, R](self, func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> asyncio.Future[R]:
+        """Queue `func` on the audio worker. It's queued when this is called, not when the returned future is awaited."""
+        return asyncio.get_running_loop().run_in_executor(self.audio_worker, functools.partial(func, *args, **kwargs))
+
+    def close(self) -> None:
+        self.audio_worker.shutdown(wait=False, cancel_futures=True)
@@ -6,8 +6,9 @@ from typing import TYPE_CHECKING
 
 from openai.types.beta.realtime.error_event import Error
 
+from speaches.realtime.chat_utils import ChatMessageCache
 from speaches.realtime.event_router import EventRouter
-from speaches.realtime.response_event_router import ResponseHandler
+from speaches.realtime.response_event_router import run_response
 from speaches.realtime.utils import generate_conversation_id
 from speaches.types.realtime import (
     ConversationItem,
@@ -18,7 +19,6 @@ from speaches.types.realtime import (
     ConversationItemInputAudioTranscriptionCompletedEvent,
     ErrorEvent,
     Response,
-    ResponseCreatedEvent,
     create_server_error,
 )
 
@@ -39,6 +39,7 @@ class Conversation:
         self.id = generate_conversation_id()
         self.items = OrderedDict[str, ConversationItem]()
         self.pubsub = pubsub
+        self.chat_message_cache = ChatMessageCache()
 
     def create_item(self, item: ConversationItem, previous_item_id: str | None = None) -> None:
         # TODO: handle `previous_item_id == "root"`. See https://platform.openai.com/docs/api-reference/realtime-client-events/conversation/item/create#realtime-client-events/conversation/item/create-previous_item_id
@@ -83,6 +84,7 @@ class Conversation:
         else:
             # TODO: What should be done if this a conversation that's being currently genererated?
             del self.items[item_id]
+            self.chat_message_cache.discard(item_id)
             self.pubsub.publish_nowait(ConversationItemDeletedEvent(item_id=item_id))
 
 
@@ -115,20 +117,6 @@ async def handle_conversation_item_input_audio_transcription_completed_event(
     if ctx.session.turn_detection is None or not ctx.session.turn_detection.create_response:
         return
 
-    if ctx.response is not None:
-        ctx.response.stop()
-
-    ctx.response = ResponseHandler(
-        completion_client=ctx.completion_client,
-        model=ctx.session.model,
-        configuration=Response(
-            conversation="auto", input=list(ctx.conversation.items.values()), **ctx.session.model_dump()
-        ),
-        conversation=ctx.conversation,
-        pubsub=ctx.pubsub,
+    await run_response(
+        ctx, Response(conversation="auto", input=list(ctx.conversation.items.values()), **ctx.session.model_dump())
     )
-    ctx.pubsub.publish_nowait(ResponseCreatedEvent(response=ctx.response.response))
-    ctx.response.start()
-    assert ctx.response.task is not None
-    await ctx.response.task
-    ctx.response = None
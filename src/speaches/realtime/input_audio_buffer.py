@@ -1,19 +1,17 @@
 from __future__ import annotations
 
 import asyncio
-from io import BytesIO
 import logging
 import time
 from typing import TYPE_CHECKING
 
 import numpy as np
-from openai import omit
 from openai.types.beta.realtime.conversation_item_input_audio_transcription_completed_event import (
     UsageTranscriptTextUsageDuration,
 )
 from pydantic import BaseModel
-import soundfile as sf
 
+from speaches.audio import Audio, AudioBuffer, ensure_int16
 from speaches.realtime.utils import generate_item_id, task_done_callback
 from speaches.types.realtime import (
     ConversationItemContentInputAudio,
@@ -25,8 +23,8 @@ from speaches.types.realtime import (
 
 if TYPE_CHECKING:
     from numpy.typing import NDArray
-    from openai.resources.audio import AsyncTranscriptions
 
+    from speaches.inprocess_clients import TranscriptionClient
     from speaches.realtime.conversation_event_router import Conversation
     from speaches.realtime.pubsub import EventPubSub
 
@@ -44,32 +42,36 @@ class VadState(BaseModel):
     # TODO: consider keeping track of what was the last audio timestamp that was processed. This value could be used to control how often the VAD is run.
 
 
-# TODO: use `np.int16` instead of `np.float32` for audio data
 class InputAudioBuffer:
     def __init__(self, pubsub: EventPubSub) -> None:
         self.id = generate_item_id()
-        self.data: NDArray[np.float32] = np.array([], dtype=np.float32)
+        # stored as PCM16, the audio is only converted to float32 for the (short) VAD window
+        self.buffer = AudioBuffer(np.int16)
         self.vad_state = VadState()
         self.pubsub = pubsub
 
+    @property
+    def data(self) -> NDArray[np.int16]:
+        return self.buffer.data
+
     @property
     def size(self) -> int:
         """Number of samples in the buffer."""
-        return len(self.data)
+        return len(self.buffer)
 
     @property
     def duration(self) -> float:
         """Duration of the audio in seconds."""
-        return len(self.data) / SAMPLE_RATE
+        return len(self.buffer) / SAMPLE_RATE
 
     @property
     def duration_ms(self) -> int:
         """Duration of the audio in milliseconds."""
-        return len(self.data) // MS_SAMPLE_RATE
+        return len(self.buffer) // MS_SAMPLE_RATE
 
-    def append(self, audio_chunk: NDArray[np.float32]) -> None:
+    def append(self, audio_chunk: NDArray[np.float32] | NDArray[np.int16]) -> None:
         """Append an audio chunk to the buffer."""
-        self.data = np.append(self.data, audio_chunk)
+        self.buffer.append(ensure_int16(audio_chunk))
 
     # def commit(self) -> None:
     #     """Publish an event to indicate that the buffer is ready for processing."""
@@ -77,14 +79,14 @@ class InputAudioBuffer:
 
     # TODO: come up with a better name
     @property
-    def data_w_vad_applied(self) -> NDArray[np.float32]:
+    def data_w_vad_applied(self) -> NDArray[np.int16]:
         if self.vad_state.audio_start_ms is None:
             return self.data
         else:
             assert self.vad_state.audio_end_ms is not None
-            return self.data[
-                self.vad_state.audio_start_ms * MS_SAMPLE_RATE : self.vad_state.audio_end_ms * MS_SAMPLE_RATE
-            ]
+            return self.buffer.slice(
+                self.vad_state.audio_start_ms * MS_SAMPLE_RATE, self.vad_state.audio_end_ms * MS_SAMPLE_RATE
+            )
 
 
 class InputAudioBufferTranscriber:
@@ -92,7 +94,7 @@ class InputAudioBufferTranscriber:
         self,
         *,
         pubsub: EventPubSub,
-        transcription_client: AsyncTranscriptions,
+        transcription_client: TranscriptionClient,
         input_audio_buffer: InputAudioBuffer,
         session: Session,
         conversation: Conversation,
@@ -116,21 +118,11 @@ class InputAudioBufferTranscriber:
         )
         self.conversation.create_item(item)
 
-        file = BytesIO()
-        sf.write(
-            file,
-            self.input_audio_buffer.data_w_vad_applied,
-            samplerate=16000,
-            subtype="PCM_16",
-            endian="LITTLE",
-            format="wav",
-        )
         start = time.perf_counter()
-        transcript = await self.transcription_client.create(
-            file=file,
+        transcript = await self.transcription_client.transcribe(
+            Audio(self.input_audio_buffer.data_w_vad_applied, sample_rate=SAMPLE_RATE),
             model=self.session.input_audio_transcription.model,
-            response_format="text",
-            language=self.session.input_audio_transcription.language or omit,
+            language=self.session.input_audio_transcription.language,
         )
         logger.info(f"Transcription generation took {time.perf_counter() - start:.2f} seconds")
         content_item.transcript = transcript
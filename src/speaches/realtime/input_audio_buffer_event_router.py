@@ -1,13 +1,19 @@
+import asyncio
 import base64
-from io import BytesIO
+import binascii
+from collections.abc import Callable
+import json
 import logging
 from typing import Literal
 
+import numpy as np
+from numpy.typing import NDArray
 import openai
 from openai.types.beta.realtime.error_event import Error
 
-from speaches.audio import audio_samples_from_file, resample_audio_data
+from speaches.audio import int16_to_float32
 from speaches.executors.silero_vad_v5 import VadOptions, get_speech_timestamps, to_ms_speech_timestamps
+from speaches.inprocess_clients import InProcessClientError
 from speaches.realtime.context import SessionContext
 from speaches.realtime.event_router import EventRouter
 from speaches.realtime.input_audio_buffer import (
@@ -46,7 +52,7 @@ type SpeechTimestamp = dict[Literal["start", "end"], int]
 def vad_detection_flow(
     input_audio_buffer: InputAudioBuffer, turn_detection: TurnDetection, ctx: SessionContext
 ) -> InputAudioBufferSpeechStartedEvent | InputAudioBufferSpeechStoppedEvent | None:
-    audio_window = input_audio_buffer.data[-MAX_VAD_WINDOW_SIZE_SAMPLES:]
+    audio_window = int16_to_float32(input_audio_buffer.buffer.tail(MAX_VAD_WINDOW_SIZE_SAMPLES))
 
     speech_timestamps = to_ms_speech_timestamps(
         get_speech_timestamps(
@@ -100,51 +106,160 @@ def vad_detection_flow(
     return None
 
 
-# Client Events
+# The functions below run on the session's audio worker (see `SessionContext.audio_worker`). They return the events to publish instead of publishing them, since the pubsub's queues may only be used from the event loop.
 
 
-@event_router.register("input_audio_buffer.append")
-def handle_input_audio_buffer_append(ctx: SessionContext, event: InputAudioBufferAppendEvent) -> None:
-    audio_chunk = audio_samples_from_file(BytesIO(base64.b64decode(event.audio)), 24000)
+def process_input_audio(
+    ctx: SessionContext, audio: NDArray[np.int16]
+) -> InputAudioBufferSpeechStartedEvent | InputAudioBufferSpeechStoppedEvent | None:
     # convert the audio data from 24kHz (sample rate defined in the API spec) to 16kHz (sample rate used by the VAD and for transcription)
-    audio_chunk = resample_audio_data(audio_chunk, 24000, 16000)
+    audio_chunk = ctx.input_audio_resampler.process(int16_to_float32(audio))
     input_audio_buffer_id = next(reversed(ctx.input_audio_buffers))
     input_audio_buffer = ctx.input_audio_buffers[input_audio_buffer_id]
     input_audio_buffer.append(audio_chunk)
-    if ctx.session.turn_detection is not None:
-        vad_event = vad_detection_flow(input_audio_buffer, ctx.session.turn_detection, ctx)
+    if ctx.session.turn_detection is None:
+        return None
+    vad_event = vad_detection_flow(input_audio_buffer, ctx.session.turn_detection, ctx)
+    if isinstance(vad_event, InputAudioBufferSpeechStoppedEvent):
+        # the audio appended after the speech stopped belongs to the next buffer. Starting it here, rather than once the event has been handled, ensures none of it ends up in the buffer being committed
+        start_new_input_audio_buffer(ctx)
+    return vad_event
+
+
+def try_commit_input_audio_buffer(ctx: SessionContext) -> tuple[InputAudioBuffer, bool]:
+    """Return the current input audio buffer and whether it was committed, which it isn't if it has too little audio."""
+    input_audio_buffer = ctx.input_audio_buffers[next(reversed(ctx.input_audio_buffers))]
+    if input_audio_buffer.duration_ms < MIN_AUDIO_BUFFER_DURATION_MS:
+        return input_audio_buffer, False
+    start_new_input_audio_buffer(ctx)
+    return input_audio_buffer, True
+
+
+def reset_input_audio_buffer(ctx: SessionContext) -> None:
+    ctx.input_audio_buffers.popitem()
+    ctx.input_audio_resampler.reset()
+    start_new_input_audio_buffer(ctx)
+
+
+def start_new_input_audio_buffer(ctx: SessionContext) -> None:
+    input_audio_buffer = InputAudioBuffer(ctx.pubsub)
+    ctx.input_audio_buffers[input_audio_buffer.id] = input_audio_buffer
+
+
+# The functions below are called from the event loop. They queue the work on the audio worker right away and publish the resulting events once it's done, so the buffer operations happen in the order the functions were called in.
+
+
+def on_audio_worker_done[R](future: asyncio.Future[R], callback: Callable[[R], None]) -> None:
+    def done(future: asyncio.Future[R]) -> None:
+        if future.cancelled():  # the session has ended
+            return
+        exception = future.exception()
+        if exception is not None:
+            logger.error("Failed to process the input audio", exc_info=exception)
+            return
+        callback(future.result())
+
+    future.add_done_callback(done)
+
+
+def append_input_audio(ctx: SessionContext, audio: NDArray[np.int16]) -> None:
+    """Append 24kHz `audio` to the current input audio buffer."""
+
+    def publish_vad_event(
+        vad_event: InputAudioBufferSpeechStartedEvent | InputAudioBufferSpeechStoppedEvent | None,
+    ) -> None:
         if vad_event is not None:
             ctx.pubsub.publish_nowait(vad_event)
 
+    on_audio_worker_done(ctx.run_in_audio_worker(process_input_audio, ctx, audio), publish_vad_event)
 
-@event_router.register("input_audio_buffer.commit")
-def handle_input_audio_buffer_commit(ctx: SessionContext, _event: InputAudioBufferCommitEvent) -> None:
-    input_audio_buffer_id = next(reversed(ctx.input_audio_buffers))
-    input_audio_buffer = ctx.input_audio_buffers[input_audio_buffer_id]
-    if input_audio_buffer.duration_ms < MIN_AUDIO_BUFFER_DURATION_MS:
-        ctx.pubsub.publish_nowait(
-            create_invalid_request_error(
-                message=f"Error committing input audio buffer: buffer too small. Expected at least {MIN_AUDIO_BUFFER_DURATION_MS}ms of audio, but buffer only has {input_audio_buffer.duration_ms}.00ms of audio."
+
+def commit_input_audio_buffer(ctx: SessionContext) -> None:
+    def publish_commit_result(result: tuple[InputAudioBuffer, bool]) -> None:
+        input_audio_buffer, committed = result
+        if not committed:
+            ctx.pubsub.publish_nowait(
+                create_invalid_request_error(
+                    message=f"Error committing input audio buffer: buffer too small. Expected at least {MIN_AUDIO_BUFFER_DURATION_MS}ms of audio, but buffer only has {input_audio_buffer.duration_ms}.00ms of audio."
+                )
             )
-        )
-    else:
-        ctx.pubsub.publish_nowait(
-            InputAudioBufferCommittedEvent(
-                previous_item_id=next(reversed(ctx.conversation.items), None),  # FIXME
-                item_id=input_audio_buffer_id,
+        else:
+            ctx.pubsub.publish_nowait(
+                InputAudioBufferCommittedEvent(
+                    previous_item_id=next(reversed(ctx.conversation.items), None),  # FIXME
+                    item_id=input_audio_buffer.id,
+                )
             )
-        )
-        input_audio_buffer = InputAudioBuffer(ctx.pubsub)
-        ctx.input_audio_buffers[input_audio_buffer.id] = input_audio_buffer
+
+    on_audio_worker_done(ctx.run_in_audio_worker(try_commit_input_audio_buffer, ctx), publish_commit_result)
+
+
+def clear_input_audio_buffer(ctx: SessionContext) -> None:
+    # OpenAI's doesn't send an error if the buffer is already empty.
+    on_audio_worker_done(
+        ctx.run_in_audio_worker(reset_input_audio_buffer, ctx),
+        lambda _: ctx.pubsub.publish_nowait(InputAudioBufferClearedEvent()),
+    )
+
+
+def audio_samples_from_base64(audio: str) -> NDArray[np.int16]:
+    """Decode base64 encoded 16-bit little-endian PCM (the `pcm16` audio format) without copying the samples."""
+    return np.frombuffer(base64.b64decode(audio), dtype="<i2")
+
+
+def handle_input_audio_buffer_message(ctx: SessionContext, message: str) -> bool:
+    """Handle `message` if it's an `input_audio_buffer.*` client event, returning whether it was.
+
+    Appends make up the vast majority of the messages a client sends, each carrying kilobytes of base64 encoded audio. Rather than validating them into pydantic models and passing them through the pubsub, the receivers hand the raw messages to this function first. Commits and clears are handled here as well, so that they stay ordered with the appends received around them.
+    """
+    if '"input_audio_buffer.' not in message:
+        return False
+    try:
+        data = json.loads(message)
+    except json.JSONDecodeError:
+        return False
+    if not isinstance(data, dict):
+        return False
+    match data.get("type"):
+        case "input_audio_buffer.append":
+            audio = data.get("audio")
+            if not isinstance(audio, str):
+                return False
+            try:
+                audio_samples = audio_samples_from_base64(audio)
+            except (binascii.Error, ValueError):
+                ctx.pubsub.publish_nowait(
+                    create_invalid_request_error(
+                        message="Invalid 'audio'. Expected base64 encoded 16-bit PCM audio.", param="audio"
+                    )
+                )
+                return True
+            append_input_audio(ctx, audio_samples)
+        case "input_audio_buffer.commit":
+            commit_input_audio_buffer(ctx)
+        case "input_audio_buffer.clear":
+            clear_input_audio_buffer(ctx)
+        case _:
+            return False
+    return True
+
+
+# Client Events
+
+
+@event_router.register("input_audio_buffer.append")
+def handle_input_audio_buffer_append(ctx: SessionContext, event: InputAudioBufferAppendEvent) -> None:
+    append_input_audio(ctx, audio_samples_from_base64(event.audio))
+
+
+@event_router.register("input_audio_buffer.commit")
+def handle_input_audio_buffer_commit(ctx: SessionContext, _event: InputAudioBufferCommitEvent) -> None:
+    commit_input_audio_buffer(ctx)
 
 
 @event_router.register("input_audio_buffer.clear")
 def handle_input_audio_buffer_clear(ctx: SessionContext, _event: InputAudioBufferClearEvent) -> None:
-    ctx.input_audio_buffers.popitem()
-    # OpenAI's doesn't send an error if the buffer is already empty.
-    ctx.pubsub.publish_nowait(InputAudioBufferClearedEvent())
-    input_audio_buffer = InputAudioBuffer(ctx.pubsub)
-    ctx.input_audio_buffers[input_audio_buffer.id] = input_audio_buffer
+    clear_input_audio_buffer(ctx)
 
 
 # Server Events
@@ -152,8 +267,7 @@ def handle_input_audio_buffer_clear(ctx: SessionContext, _event: InputAudioBuffe
 
 @event_router.register("input_audio_buffer.speech_stopped")
 def handle_input_audio_buffer_speech_stopped(ctx: SessionContext, event: InputAudioBufferSpeechStoppedEvent) -> None:
-    input_audio_buffer = InputAudioBuffer(ctx.pubsub)
-    ctx.input_audio_buffers[input_audio_buffer.id] = input_audio_buffer
+    # the next input audio buffer has already been started by `append_input_audio`
     ctx.pubsub.publish_nowait(
         InputAudioBufferCommittedEvent(
             previous_item_id=next(reversed(ctx.conversation.items), None),  # FIXME
@@ -185,4 +299,12 @@ async def handle_input_audio_buffer_committed(ctx: SessionContext, event: InputA
                 message=e.message,
             )
         )
+    except InProcessClientError as e:  # e.g. the transcription model isn't installed
+        ctx.pubsub.publish_nowait(
+            create_invalid_request_error(message=e.message)
+            if e.status_code < 500
+            else create_server_error(
+                message=e.message,
+            )
+        )
     await transcriber.task
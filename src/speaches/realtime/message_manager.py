@@ -1,5 +1,6 @@
 import abc
 import asyncio
+from collections.abc import Callable
 import json
 import logging
 from pathlib import Path
@@ -104,6 +105,11 @@ class WsClientMessageManager(BaseMessageManager):
 
 
 class WsServerMessageManager(BaseMessageManager):
+    def __init__(self, event_pubsub: EventPubSub | None = None, fast_path: Callable[[str], bool] | None = None) -> None:
+        super().__init__(event_pubsub)
+        # gets the raw messages first, and returns whether it handled them. Used for the high volume `input_audio_buffer.*` events, which then skip validation and the pubsub
+        self.fast_path = fast_path
+
     async def receiver(self, ws: fastapi.WebSocket) -> None:
         logger.info("Receiver task started")
         while True:
@@ -113,6 +119,8 @@ class WsServerMessageManager(BaseMessageManager):
             except fastapi.WebSocketDisconnect:
                 logger.info("Failed to receive message due to disconnect")
                 break
+            if self.fast_path is not None and self.fast_path(data):
+                continue
             try:
                 event = client_event_type_adapter.validate_json(data)
             except ValidationError as e:
@@ -1,5 +1,5 @@
 from asyncio import Queue
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Callable
 import json
 import logging
 from pathlib import Path
@@ -26,6 +26,14 @@ class PubSub[T: BaseModel]:
         for subscriber in self.subscribers:
             subscriber.put_nowait(event)
 
+    def discard_pending(self, predicate: Callable[[T], bool]) -> None:
+        """Remove the events matching `predicate` that have been published but not yet received by the subscribers."""
+        for subscriber in self.subscribers:
+            events = [subscriber.get_nowait() for _ in range(subscriber.qsize())]
+            for event in events:
+                if not predicate(event):
+                    subscriber.put_nowait(event)
+
     def subscribe(self) -> Queue[T]:
         subscriber = Queue[T]()
         self.subscribers.add(subscriber)
@@ -44,19 +52,20 @@ class PubSub[T: BaseModel]:
 
 
 class EventPubSub(PubSub[Event]):
-    async def subscribe_to(self, event_type: str) -> AsyncGenerator[Event]:
-        if event_type not in SERVER_EVENT_TYPES | CLIENT_EVENT_TYPES:
-            raise ValueError(f"Invalid event type: {event_type}")
+    async def subscribe_to(self, *event_types: str) -> AsyncGenerator[Event]:
+        for event_type in event_types:
+            if event_type not in SERVER_EVENT_TYPES | CLIENT_EVENT_TYPES:
+                raise ValueError(f"Invalid event type: {event_type}")
         subscriber = Queue[Event]()
         self.subscribers.add(subscriber)
         try:
             while True:
                 event = await subscriber.get()
-                if event.type == event_type:  # Only yield events matching the requested type
+                if event.type in event_types:  # Only yield events matching the requested types
                     yield event.model_copy()
         finally:
             self.subscribers.remove(subscriber)
-            logger.info(f"Subscriber for event type {event_type} removed")
+            logger.info(f"Subscriber for event types {event_types} removed")
 
     def dump_to_file(self, file_path: Path) -> None:
         with file_path.open("w") as f:
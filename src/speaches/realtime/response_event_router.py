@@ -3,15 +3,17 @@ from __future__ import annotations
 import asyncio
 from contextlib import contextmanager
 import logging
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Literal
 
 import openai
 from openai.types.beta.realtime.error_event import Error
+from openai.types.chat import ChatCompletion
 from pydantic import BaseModel
 
+from speaches.inprocess_clients import InProcessClientError
 from speaches.realtime.chat_utils import (
     create_completion_params,
-    items_to_chat_messages,
+    limit_chat_history,
 )
 from speaches.realtime.event_router import EventRouter
 from speaches.realtime.session_event_router import unsupported_field_error, update_dict
@@ -22,7 +24,9 @@ from speaches.types.realtime import (
     ConversationItemFunctionCall,
     ConversationItemMessage,
     ErrorEvent,
+    InputAudioBufferSpeechStartedEvent,
     RealtimeResponse,
+    RealtimeResponseStatus,
     Response,
     # TODO: RealtimeResponseStatus,
     ResponseAudioDeltaEvent,
@@ -42,18 +46,19 @@ from speaches.types.realtime import (
     ResponseTextDeltaEvent,
     ResponseTextDoneEvent,
     ServerConversationItem,
-    create_server_error,
+    create_invalid_request_error,
 )
 
 if TYPE_CHECKING:
-    from collections.abc import AsyncGenerator, Generator
+    from collections.abc import AsyncGenerator, AsyncIterator, Generator
 
-    from openai.resources.chat import AsyncCompletions
     from openai.types.chat import ChatCompletionChunk
 
+    from speaches.config import RealtimeHistoryConfig
     from speaches.realtime.context import SessionContext
     from speaches.realtime.conversation_event_router import Conversation
     from speaches.realtime.pubsub import EventPubSub
+    from speaches.routers.chat import InProcessChatCompletions
 
 logger = logging.getLogger(__name__)
 
@@ -77,9 +82,10 @@ class ResponseHandler:
     def __init__(
         self,
         *,
-        completion_client: AsyncCompletions,
+        completion_client: InProcessChatCompletions,
         model: str,
         configuration: Response,
+        history_config: RealtimeHistoryConfig,
         conversation: Conversation,
         pubsub: EventPubSub,
     ) -> None:
@@ -87,6 +93,7 @@ class ResponseHandler:
         self.completion_client = completion_client
         self.model = model  # NOTE: unfortunatly `Response` doesn't have a `model` field
         self.configuration = configuration
+        self.history_config = history_config
         self.conversation = conversation
         self.pubsub = pubsub
         self.response = RealtimeResponse(
@@ -101,12 +108,15 @@ class ResponseHandler:
     def add_output_item[T: ServerConversationItem](self, item: T) -> Generator[T]:
         self.response.output.append(item)
         self.pubsub.publish_nowait(ResponseOutputItemAddedEvent(response_id=self.id, item=item))
-        yield item
-        assert item.status == "incomplete", item
-        item.status = "completed"  # TODO: do not update the status if the response was cancelled
-        self.pubsub.publish_nowait(ResponseOutputItemDoneEvent(response_id=self.id, item=item))
-        self.response.status = "completed"  # TODO: set to "cancelled" if the response was cancelled. Additionally, populate the `respones.status_details`
-        self.pubsub.publish_nowait(ResponseDoneEvent(response=self.response))
+        try:
+            yield item
+            assert item.status == "incomplete", item
+            item.status = "completed"
+        finally:
+            if item.status == "incomplete":
+                # the response was cancelled or failed. The item stays "incomplete", but what was generated of it is kept
+                self.conversation.chat_message_cache.add_incomplete_item(item)
+            self.pubsub.publish_nowait(ResponseOutputItemDoneEvent(response_id=self.id, item=item))
 
     @contextmanager
     def add_item_content[T: ConversationItemContentText | ConversationItemContentAudio](
@@ -225,13 +235,14 @@ class ResponseHandler:
             )
 
     async def generate_response(self) -> None:
+        chunk_stream: AsyncGenerator[ChatCompletionChunk] | None = None
         try:
-            completion_params = create_completion_params(
-                self.model,
-                list(items_to_chat_messages(self.configuration.input)),
-                self.configuration,
-            )
-            chunk_stream = await self.completion_client.create(**completion_params)
+            messages = self.conversation.chat_message_cache.items_to_chat_messages(self.configuration.input)
+            messages = limit_chat_history(messages, self.history_config.max_turns, self.history_config.max_tokens)
+            completion_params = create_completion_params(self.model, messages, self.configuration)
+            completion = await self.completion_client.create(**completion_params)
+            assert not isinstance(completion, ChatCompletion)
+            chunk_stream = completion
             chunk = await anext(chunk_stream)
             if chunk.choices[0].delta.tool_calls is not None:
                 handler = self.conversation_item_function_call_handler
@@ -241,7 +252,7 @@ class ResponseHandler:
                 handler = self.conversation_item_message_audio_handler
 
             async def merge_chunks_and_chunk_stream(
-                *chunks: ChatCompletionChunk, chunk_stream: openai.AsyncStream[ChatCompletionChunk]
+                *chunks: ChatCompletionChunk, chunk_stream: AsyncIterator[ChatCompletionChunk]
             ) -> AsyncGenerator[ChatCompletionChunk]:
                 for chunk in chunks:
                     yield chunk
@@ -249,28 +260,70 @@ class ResponseHandler:
                     yield chunk
 
             await handler(merge_chunks_and_chunk_stream(chunk, chunk_stream=chunk_stream))
-        except openai.APIError as e:
+            self.response.status = "completed"
+        except asyncio.CancelledError:
+            self.response.status = "cancelled"
+            raise
+        except (openai.APIError, InProcessClientError) as e:
             logger.exception("Error while generating response")
+            self.response.status = "failed"
             self.pubsub.publish_nowait(
                 ErrorEvent(error=Error(type="server_error", message=f"{type(e).__name__}: {e.message}"))
             )
             raise
+        except BaseException:
+            self.response.status = "failed"
+            raise
+        finally:
+            if chunk_stream is not None:
+                # stops the language model and speech synthesis right away, rather than when the generator gets garbage collected
+                await chunk_stream.aclose()
+            self.pubsub.publish_nowait(ResponseDoneEvent(response=self.response))
 
     def start(self) -> None:
         assert self.task is None
         self.task = asyncio.create_task(self.generate_response())
         self.task.add_done_callback(task_done_callback)
 
-    def stop(self) -> None:
+    def cancel(self, reason: Literal["turn_detected", "client_cancelled"]) -> None:
+        """Stop generating the response and drop the audio that hasn't been sent to the client yet."""
         assert self.task is not None
+        if self.task.done():
+            return
+        self.response.status_details = RealtimeResponseStatus(type="cancelled", reason=reason)
         self.task.cancel()
+        self.pubsub.discard_pending(
+            lambda event: isinstance(event, ResponseAudioDeltaEvent) and event.response_id == self.id
+        )
 
 
-@event_router.register("response.create")
-async def handle_response_create_event(ctx: SessionContext, event: ResponseCreateEvent) -> None:
+async def run_response(ctx: SessionContext, configuration: Response) -> None:
+    """Generate a response, cancelling the one that's currently being generated (if any)."""
     if ctx.response is not None:
-        ctx.response.stop()
+        ctx.response.cancel("turn_detected")
 
+    response = ResponseHandler(
+        completion_client=ctx.completion_client,
+        model=ctx.session.model,
+        configuration=configuration,
+        history_config=ctx.history_config,
+        conversation=ctx.conversation,
+        pubsub=ctx.pubsub,
+    )
+    ctx.response = response
+    ctx.pubsub.publish_nowait(ResponseCreatedEvent(response=response.response))
+    response.start()
+    assert response.task is not None
+    try:
+        # the outcome is reported through `response.done` (and the task's done callback), so a cancelled or failed response doesn't propagate here
+        await asyncio.wait([response.task])
+    finally:
+        if ctx.response is response:
+            ctx.response = None
+
+
+@event_router.register("response.create")
+async def handle_response_create_event(ctx: SessionContext, event: ResponseCreateEvent) -> None:
     configuration = Response(
         conversation="auto", input=list(ctx.conversation.items.values()), **ctx.session.model_dump()
     )
@@ -294,22 +347,25 @@ async def handle_response_create_event(ctx: SessionContext, event: ResponseCreat
         logger.debug(f"Response configuration after update: {updated_configuration}")
         configuration = Response(**updated_configuration)
 
-    ctx.response = ResponseHandler(
-        completion_client=ctx.completion_client,
-        model=ctx.session.model,
-        configuration=configuration,
-        conversation=ctx.conversation,
-        pubsub=ctx.pubsub,
-    )
-    ctx.pubsub.publish_nowait(ResponseCreatedEvent(response=ctx.response.response))
-    ctx.response.start()
-    assert ctx.response.task is not None
-    await ctx.response.task
-    ctx.response = None
+    await run_response(ctx, configuration)
 
 
 @event_router.register("response.cancel")
 def handle_response_cancel_event(ctx: SessionContext, event: ResponseCancelEvent) -> None:
-    ctx.pubsub.publish_nowait(
-        create_server_error(f"Handling of the '{event.type}' event is not implemented.", event_id=event.event_id)
-    )
+    if ctx.response is None or (event.response_id is not None and event.response_id != ctx.response.id):
+        ctx.pubsub.publish_nowait(
+            create_invalid_request_error("Cancellation failed: no active response found", event_id=event.event_id)
+        )
+        return
+    ctx.response.cancel("client_cancelled")
+
+
+@event_router.register("input_audio_buffer.speech_started")
+def handle_input_audio_buffer_speech_started(ctx: SessionContext, _event: InputAudioBufferSpeechStartedEvent) -> None:
+    # barge-in: there's no point in generating (and playing) a response that the user is talking over
+    if (
+        ctx.response is not None
+        and ctx.session.turn_detection is not None
+        and ctx.session.turn_detection.interrupt_response
+    ):
+        ctx.response.cancel("turn_detected")
@@ -8,8 +8,10 @@ from av.audio.frame import AudioFrame
 import numpy as np
 from openai.types.beta.realtime import ResponseAudioDeltaEvent
 
-from speaches.audio import audio_samples_from_file, resample_audio_data
+from speaches.audio import audio_samples_from_file, float32_to_int16
 from speaches.realtime.context import SessionContext
+from speaches.resample import StreamingResampler
+from speaches.types.realtime import ResponseDoneEvent
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +31,7 @@ class AudioStreamTrack(MediaStreamTrack):
         self._sample_rate = 48000
         self._frame_duration = 0.01  # in seconds
         self._samples_per_frame = int(self._sample_rate * self._frame_duration)
+        self._resampler = StreamingResampler(24000, self._sample_rate)
         self._running = True
 
         # Start the frame processing task
@@ -50,19 +53,31 @@ class AudioStreamTrack(MediaStreamTrack):
     async def _audio_frame_generator(self) -> None:
         """Process incoming numpy arrays and split them into AudioFrames."""
         try:
-            async for event in self.ctx.pubsub.subscribe_to("response.audio.delta"):
-                assert isinstance(event, ResponseAudioDeltaEvent)
-
+            async for event in self.ctx.pubsub.subscribe_to(
+                "response.audio.delta", "response.audio.done", "response.done"
+            ):
                 if not self._running:
                     return
 
-                # copied from `input_audio_buffer.append` handler
-                audio_array = audio_samples_from_file(io.BytesIO(base64.b64decode(event.delta)), sample_rate=24000)
-                audio_array = resample_audio_data(audio_array, 24000, 48000)
+                if isinstance(event, ResponseDoneEvent):
+                    if event.response.status == "cancelled":
+                        # stop playing the cancelled response. Its pending `response.audio.delta` events have already been discarded
+                        self.clear()
+                    continue
+                if event.type == "response.audio.done":
+                    # emit the samples held back by the resampler so that the response isn't cut short
+                    audio_array = self._resampler.flush()
+                    if len(audio_array) == 0:
+                        continue
+                else:
+                    assert isinstance(event, ResponseAudioDeltaEvent)
+                    # copied from `input_audio_buffer.append` handler
+                    audio_array = audio_samples_from_file(io.BytesIO(base64.b64decode(event.delta)), sample_rate=24000)
+                    audio_array = self._resampler.process(audio_array)
 
                 # Convert to int16 if not already
                 if audio_array.dtype != np.int16:
-                    audio_array = (audio_array * 32767).astype(np.int16)
+                    audio_array = float32_to_int16(audio_array)
 
                 # Split the array into frame-sized chunks
                 frames = self._split_into_frames(audio_array)
@@ -77,6 +92,12 @@ class AudioStreamTrack(MediaStreamTrack):
         except asyncio.CancelledError:
             logger.warning("Audio frame generator task cancelled")
 
+    def clear(self) -> None:
+        """Drop the audio that has been queued but not played yet."""
+        while not self.frame_queue.empty():
+            self.frame_queue.get_nowait()
+        self._resampler.reset()
+
     def _split_into_frames(self, audio_array: np.ndarray) -> list[np.ndarray]:
         # Ensure the array is 1D
         if len(audio_array.shape) > 1:
@@ -0,0 +1,152 @@
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Number of input samples each output sample is computed from. Higher values give a sharper anti-aliasing filter at a proportional CPU cost.
+TAPS_PER_PHASE = 32
+# Kaiser window shape parameter, ~80dB of stopband attenuation
+KAISER_BETA = 8.0
+# Fraction of the lower of the two Nyquist frequencies at which the low-pass filter cutoff (-6dB point) is placed
+CUTOFF = 0.92
+
+
+@lru_cache
+def design_polyphase_filter(up: int, down: int) -> np.typing.NDArray[np.float32]:
+    """Design a Kaiser-windowed sinc low-pass filter for resampling by `up / down` and split it into `up` phases.
+
+    Returns an array of shape `(up, TAPS_PER_PHASE)`. Each phase's taps are reversed so that they can be applied to an input window with a plain dot product.
+    """
+    num_taps = TAPS_PER_PHASE * up
+    delay = num_taps // 2
+    n = np.arange(num_taps, dtype=np.float64) - delay
+    cutoff = CUTOFF / max(up, down)
+    prototype = cutoff * np.sinc(cutoff * n) * np.kaiser(2 * delay + 1, KAISER_BETA)[:num_taps]
+    # a gain of `up` compensates for the zeros inserted by upsampling
+    prototype *= up / prototype.sum()
+    # `phases[p, j] = prototype[p + up * j]`
+    phases = prototype.reshape(TAPS_PER_PHASE, up).T
+    return np.ascontiguousarray(phases[:, ::-1], dtype=np.float32)
+
+
+class StreamingResampler:
+    """Polyphase resampler for mono float32 audio that keeps state between chunks.
+
+    Chunks can be of any size and the concatenated output is the same as resampling the concatenated input in one go. The output is aligned with the input (the filter delay is compensated for), so the last few output samples are only produced once more input arrives or `flush` is called.
+    """
+
+    def __init__(self, sample_rate: int, target_sample_rate: int) -> None:
+        self.sample_rate = sample_rate
+        self.target_sample_rate = target_sample_rate
+        divisor = gcd(sample_rate, target_sample_rate)
+        self.up = target_sample_rate // divisor
+        self.down = sample_rate // divisor
+        self._phases = design_polyphase_filter(self.up, self.down)
+        # position of the filter's center in the upsampled signal
+        self._delay = TAPS_PER_PHASE * self.up // 2
+        self._scratch = np.zeros(2 * TAPS_PER_PHASE, dtype=np.float32)
+        self.reset()
+
+    def reset(self) -> None:
+        # the last `TAPS_PER_PHASE - 1` input samples, needed to compute outputs that straddle chunk boundaries
+        self._history = np.zeros(TAPS_PER_PHASE - 1, dtype=np.float32)
+        self._num_input_samples = 0
+        self._num_output_samples = 0
+
+    def _num_ready_output_samples(self, num_input_samples: int) -> int:
+        # output sample `m` depends on input samples up to `(m * down + delay) // up`
+        return max(0, (num_input_samples * self.up - 1 - self._delay) // self.down + 1)
+
+    def output_size(self, input_size: int) -> int:
+        """Number of samples `process` will produce if given `input_size` more samples."""
+        if self.up == self.down:
+            return input_size
+        return self._num_ready_output_samples(self._num_input_samples + input_size) - self._num_output_samples
+
+    def flush_size(self) -> int:
+        """Number of samples `flush` will produce."""
+        if self.up == self.down:
+            return 0
+        return self._num_input_samples * self.up // self.down - self._num_output_samples
+
+    def process(
+        self, data: np.typing.NDArray[np.float32], out: np.typing.NDArray[np.float32] | None = None
+    ) -> np.typing.NDArray[np.float32]:
+        """Resample the next chunk of audio.
+
+        If `out` is provided, it must have `output_size(len(data))` elements and is written to (and returned) instead of allocating a new array.
+        """
+        if self.up == self.down:
+            if out is None:
+                return data
+            out[:] = data
+            return out
+        num_output_samples = self.output_size(len(data))
+        out = self._check_out(out, num_output_samples)
+        self._run(data, self._num_input_samples + len(data), num_output_samples, out)
+        return out
+
+    def flush(self, out: np.typing.NDArray[np.float32] | None = None) -> np.typing.NDArray[np.float32]:
+        """Produce the remaining output samples (treating the input as followed by silence) and reset the state."""
+        num_output_samples = self.flush_size()
+        out = self._check_out(out, num_output_samples)
+        if num_output_samples > 0:
+            padding = np.zeros(TAPS_PER_PHASE, dtype=np.float32)
+            self._run(padding, self._num_input_samples, num_output_samples, out)
+        self.reset()
+        return out
+
+    def _check_out(
+        self, out: np.typing.NDArray[np.float32] | None, num_output_samples: int
+    ) -> np.typing.NDArray[np.float32]:
+        if out is None:
+            return np.empty(num_output_samples, dtype=np.float32)
+        if out.shape != (num_output_samples,):
+            raise ValueError(f"Expected an output buffer of shape ({num_output_samples},), got {out.shape}")
+        return out
+
+    def _run(
+        self,
+        data: np.typing.NDArray[np.float32],
+        num_input_samples: int,
+        num_output_samples: int,
+        out: np.typing.NDArray[np.float32],
+    ) -> None:
+        num_history_samples = len(self._history)
+        size = num_history_samples + len(data)
+        if len(self._scratch) < size:
+            self._scratch = np.empty(max(size, 2 * len(self._scratch)), dtype=np.float32)
+        # `signal[k]` is input sample `base + k`
+        signal = self._scratch[:size]
+        signal[:num_history_samples] = self._history
+        signal[num_history_samples:] = data
+        base = self._num_input_samples - num_history_samples
+
+        if num_output_samples > 0:
+            windows = sliding_window_view(signal, TAPS_PER_PHASE)
+            # output samples `m` and `m + up` use the same phase and input positions `down` samples apart
+            for offset in range(min(self.up, num_output_samples)):
+                t = (self._num_output_samples + offset) * self.down + self._delay
+                phase, last_input_index = t % self.up, t // self.up
+                start = last_input_index - base - TAPS_PER_PHASE + 1
+                phase_out = out[offset :: self.up]
+                np.matmul(windows[start :: self.down][: len(phase_out)], self._phases[phase], out=phase_out)
+
+        self._num_output_samples += num_output_samples
+        self._num_input_samples = num_input_samples
+        self._history[:] = signal[size - num_history_samples :]
+
+
+def resample(
+    data: np.typing.NDArray[np.float32], sample_rate: int, target_sample_rate: int
+) -> np.typing.NDArray[np.float32]:
+    """Resample mono float32 audio in one go. The output has `len(data) * target_sample_rate // sample_rate` samples."""
+    if sample_rate == target_sample_rate:
+        return data
+    resampler = StreamingResampler(sample_rate, target_sample_rate)
+    out = np.empty(len(data) * resampler.up // resampler.down, dtype=np.float32)
+    num_processed = resampler.output_size(len(data))
+    resampler.process(data, out=out[:num_processed])
+    resampler.flush(out=out[num_processed:])
+    return out
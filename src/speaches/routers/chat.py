@@ -1,19 +1,20 @@
+import asyncio
 import base64
 from collections.abc import AsyncGenerator
 from datetime import UTC, datetime, timedelta
+import hashlib
 from io import BytesIO
 import logging
 import time
-from typing import Annotated, Self
+from typing import Annotated, Any, Self
 from uuid import uuid4
 
 import aiostream
-from cachetools import TTLCache
-from fastapi import APIRouter, Body, Response
+from fastapi import APIRouter, Body, HTTPException, Response, status
 from fastapi.responses import StreamingResponse
 import openai
 from openai import AsyncStream
-from openai.resources.audio import AsyncSpeech
+from openai.resources.chat.completions import AsyncCompletions
 from openai.types.chat import (
     ChatCompletion,
     ChatCompletionAudio,
@@ -25,12 +26,16 @@ from openai.types.chat.chat_completion_chunk import ChoiceDelta
 from pydantic import Field, model_validator
 
 from speaches import text_utils
+from speaches.audio import Audio, decode_audio, stream_audio_as_formatted_bytes
 from speaches.dependencies import (
     CompletionClientDependency,
     SpeechClientDependency,
+    StateStoreDependency,
     TranscriptionClientDependency,
 )
-from speaches.text_utils import SentenceChunker, format_as_sse
+from speaches.inprocess_clients import InProcessClientError, SpeechClient, TranscriptionClient
+from speaches.state_store import StateStore
+from speaches.text_utils import ClauseChunker, TextChunker, format_as_sse
 from speaches.types.chat import (
     ChatCompletionAssistantMessageParam,
     ChatCompletionContentPartTextParam,
@@ -47,12 +52,17 @@ from speaches.utils import APIProxyError
 DEFAULT_SPEECH_MODEL = "tts-1"  # or "tts-1-hd"
 # https://platform.openai.com/docs/api-reference/audio/createTranscription#audio-createtranscription-model
 DEFAULT_TRANSCRIPTION_MODEL = "whisper-1"
-AUDIO_TRANSCRIPTION_CACHE_SIZE = 4096
 AUDIO_TRANSCRIPTION_TTL_SECONDS = 60 * 60
+# `message.audio.id` of generated audio -> its transcript
+AUDIO_TRANSCRIPTS_NAMESPACE = "chat.audio_transcripts"
+# sha256 of the input audio (and the transcription model) -> transcript
+INPUT_AUDIO_TRANSCRIPTS_NAMESPACE = "chat.input_audio_transcripts"
+# number of sentences synthesized ahead of the one whose audio is being streamed
+SPEECH_LOOKAHEAD_SENTENCES = 2
+MAX_CONCURRENT_INPUT_AUDIO_TRANSCRIPTIONS = 4
 
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["voice-chat"])
-cache: TTLCache[str, str] = TTLCache(maxsize=AUDIO_TRANSCRIPTION_CACHE_SIZE, ttl=AUDIO_TRANSCRIPTION_TTL_SECONDS)
 
 
 # NOTE: OpenAI doesn't use UUIDs
@@ -96,23 +106,36 @@ def transform_choice_delta(choice_delta: ChoiceDelta) -> ChoiceDelta:
     return choice_delta
 
 
+def save_audio_transcript(state_store: StateStore, audio_id: str, transcript: str) -> None:
+    state_store.set(AUDIO_TRANSCRIPTS_NAMESPACE, audio_id, transcript, ttl=AUDIO_TRANSCRIPTION_TTL_SECONDS)
+    # the next request of the conversation, which references the audio by its id, may be served by another worker
+    state_store.flush()
+
+
 # FIXME: do not pass in `body`
-async def transform_choice(speech_client: AsyncSpeech, choice: Choice, body: CompletionCreateParamsBase) -> Choice:
+async def transform_choice(
+    speech_client: SpeechClient, state_store: StateStore, choice: Choice, body: CompletionCreateParamsBase
+) -> Choice:
     assert body.audio is not None
     # HACK: because OpenAI alternates between `pcm16`(/v1/chat/completions) and `pcm`(/v1/audio/speech)
     audio_format = "pcm" if body.audio.format == "pcm16" else body.audio.format
 
     if choice.message.content is None:
         return choice
-    res = await speech_client.create(
-        input=choice.message.content,
-        model=body.speech_model,
-        voice=body.audio.voice,  # pyright: ignore[reportArgumentType]
-        response_format=audio_format,
+    text = text_utils.strip_markdown_emphasis(text_utils.strip_emojis(choice.message.content))
+    audios = [
+        audio
+        async for audio in speech_client.synthesize(
+            text,
+            model=body.speech_model,
+            voice=body.audio.voice,  # pyright: ignore[reportArgumentType]
+        )
+    ]
+    audio_bytes = await asyncio.to_thread(
+        lambda: b"".join(stream_audio_as_formatted_bytes((audio for audio in audios), audio_format))
     )
-    audio_bytes = res.read()
     audio_id = generate_audio_id()
-    cache[audio_id] = choice.message.content
+    await asyncio.to_thread(save_audio_transcript, state_store, audio_id, choice.message.content)
     choice.message.audio = ChatCompletionAudio(
         id=audio_id,
         data=base64.b64encode(audio_bytes).decode("utf-8"),
@@ -129,12 +152,14 @@ class AudioChatStream:
     def __init__(
         self,
         chat_completion_chunk_stream: AsyncStream[ChatCompletionChunk],
-        speech_client: AsyncSpeech,
-        sentence_chunker: SentenceChunker,
+        speech_client: SpeechClient,
+        state_store: StateStore,
+        sentence_chunker: TextChunker,
         body: CompletionCreateParamsBase,  # FIXME: do not pass in `body`
     ) -> None:
         self.chat_completion_chunk_stream = chat_completion_chunk_stream
         self.speech_client = speech_client
+        self.state_store = state_store
         self.sentence_chunker = sentence_chunker  # NOTE: this should be for every choice is I want to support n > 1
         self.body = body
         self.audio_id = generate_audio_id()
@@ -144,63 +169,113 @@ class AudioChatStream:
 
     async def text_chat_completion_chunk_stream(self) -> AsyncGenerator[ChatCompletionChunk]:
         start = time.perf_counter()
-        async for chunk in self.chat_completion_chunk_stream:
-            if len(chunk.choices) == 0:
-                logger.warning(f"Received a chunk with no choices: {chunk}")
-                continue
-            self.chat_completion_id = chunk.id
-            self.created = chunk.created
-            choice = chunk.choices[0]
-            assert self.body.modalities is not None
-            if "audio" not in self.body.modalities:  # do not transform the choice if audio is not in the modalities
+        transcript_parts: list[str] = []
+        try:
+            async for chunk in self.chat_completion_chunk_stream:
+                if len(chunk.choices) == 0:
+                    logger.warning(f"Received a chunk with no choices: {chunk}")
+                    continue
+                self.chat_completion_id = chunk.id
+                self.created = chunk.created
+                choice = chunk.choices[0]
+                assert self.body.modalities is not None
+                if "audio" not in self.body.modalities:  # do not transform the choice if audio is not in the modalities
+                    yield chunk
+                    continue
+                if choice.delta.content is not None:
+                    transcript_parts.append(choice.delta.content)
+                    self.sentence_chunker.add_token(choice.delta.content)
+                    choice.delta = transform_choice_delta(choice.delta)
+                    choice.delta.audio["id"] = self.audio_id  # pyrefly: ignore[missing-attribute]
+                    choice.delta.audio["expires_at"] = self.expires_at  # pyrefly: ignore[missing-attribute]
+                # TODO: consider not sending the chunk if there's a finish_reason
+                # if choice.finish_reason is None:
                 yield chunk
-                continue
-            if choice.delta.content is not None:
-                self.sentence_chunker.add_token(choice.delta.content)
-                choice.delta = transform_choice_delta(choice.delta)
-                choice.delta.audio["id"] = self.audio_id  # pyrefly: ignore[missing-attribute]
-                choice.delta.audio["expires_at"] = self.expires_at  # pyrefly: ignore[missing-attribute]
-            # TODO: consider not sending the chunk if there's a finish_reason
-            # if choice.finish_reason is None:
-            yield chunk
+        finally:
+            # aborts the upstream request, so that the language model stops generating if this generator is closed early (e.g. the client disconnected or the response was cancelled)
+            await self.chat_completion_chunk_stream.close()
         self.sentence_chunker.close()
+        if transcript_parts:
+            # so that the audio can be referenced by its id in the following requests of the conversation
+            await asyncio.to_thread(save_audio_transcript, self.state_store, self.audio_id, "".join(transcript_parts))
         logger.info(f"Text generation took {time.perf_counter() - start:.2f} seconds")
 
+    async def _synthesize_sentence(self, sentence: str, audio_queue: asyncio.Queue[bytes | None]) -> None:
+        assert self.body.audio is not None
+        try:
+            async for audio in self.speech_client.synthesize(
+                sentence,
+                model=self.body.speech_model,
+                voice=self.body.audio.voice,  # pyright: ignore[reportArgumentType]
+                sample_rate=24000,
+            ):
+                if len(audio.samples) > 0:
+                    audio_queue.put_nowait(audio.as_bytes())
+        finally:
+            audio_queue.put_nowait(None)
+
+    async def _schedule_sentences(
+        self,
+        sentence_queue: asyncio.Queue[tuple[asyncio.Task[None], asyncio.Queue[bytes | None]] | None],
+        slots: asyncio.Semaphore,
+    ) -> None:
+        try:
+            async for sentence in self.sentence_chunker:
+                sentence_clean = sentence.strip()
+                sentence_clean = text_utils.strip_markdown_emphasis(sentence_clean)
+                sentence_clean = text_utils.strip_emojis(sentence_clean)
+                sentence_clean = sentence_clean.strip()
+                if len(sentence_clean) == 0:
+                    logger.warning(f"Skipping empty sentence. ORIGINAL: {sentence}")
+                    continue  # skip empty sentences
+                # wait until the sentence fits within the look-ahead window
+                await slots.acquire()
+                audio_queue: asyncio.Queue[bytes | None] = asyncio.Queue()
+                task = asyncio.create_task(self._synthesize_sentence(sentence_clean, audio_queue))
+                sentence_queue.put_nowait((task, audio_queue))
+        finally:
+            sentence_queue.put_nowait(None)
+
     async def audio_chat_completion_chunk_stream(self) -> AsyncGenerator[ChatCompletionChunk]:
+        """Synthesize sentences as they're produced and yield their audio in order.
+
+        Up to `SPEECH_LOOKAHEAD_SENTENCES` sentences are synthesized ahead of the one whose audio is currently being yielded, so that the audio doesn't fall further and further behind the text.
+        """
         assert self.body.audio is not None
 
         start = time.perf_counter()
-        # TODO: parallelize
-        async for sentence in self.sentence_chunker:
-            sentence_clean = sentence.strip()
-            sentence_clean = text_utils.strip_markdown_emphasis(sentence_clean)
-            sentence_clean = text_utils.strip_emojis(sentence_clean)
-            sentence_clean = sentence_clean.strip()
-            if len(sentence_clean) == 0:
-                logger.warning(f"Skipping empty sentence. ORIGINAL: {sentence}")
-                continue  # skip empty sentences
-            res = await self.speech_client.create(
-                input=sentence_clean,
-                model=self.body.speech_model,
-                voice=self.body.audio.voice,  # pyright: ignore[reportArgumentType]
-                response_format="pcm",
-                extra_body={"sample_rate": 24000},
-            )
-            audio_bytes = res.read()
-            audio_data = base64.b64encode(audio_bytes).decode("utf-8")
-            delta = ChoiceDelta()
-            delta.audio = {  # pyrefly: ignore[missing-attribute]
-                "id": self.audio_id,
-                "data": audio_data,
-                "expires_at": self.expires_at,
-            }
-            yield ChatCompletionChunk(
-                id=self.chat_completion_id,
-                choices=[ChunkChoice(delta=delta, index=0)],
-                created=self.created,
-                model=self.body.speech_model,
-                object="chat.completion.chunk",
-            )
+        sentence_queue: asyncio.Queue[tuple[asyncio.Task[None], asyncio.Queue[bytes | None]] | None] = asyncio.Queue()
+        slots = asyncio.Semaphore(1 + SPEECH_LOOKAHEAD_SENTENCES)
+        scheduler_task = asyncio.create_task(self._schedule_sentences(sentence_queue, slots))
+        tasks: list[asyncio.Task[None]] = [scheduler_task]
+        try:
+            while (item := await sentence_queue.get()) is not None:
+                task, audio_queue = item
+                tasks.append(task)
+                while (audio_bytes := await audio_queue.get()) is not None:
+                    delta = ChoiceDelta()
+                    delta.audio = {  # pyrefly: ignore[missing-attribute]
+                        "id": self.audio_id,
+                        "data": base64.b64encode(audio_bytes).decode("utf-8"),
+                        "expires_at": self.expires_at,
+                    }
+                    yield ChatCompletionChunk(
+                        id=self.chat_completion_id,
+                        choices=[ChunkChoice(delta=delta, index=0)],
+                        created=self.created,
+                        model=self.body.speech_model,
+                        object="chat.completion.chunk",
+                    )
+                await task  # raises if the synthesis failed
+                slots.release()
+            await scheduler_task
+        finally:
+            # the generator may be closed early, e.g. when the client disconnects
+            while not sentence_queue.empty():
+                if (item := sentence_queue.get_nowait()) is not None:
+                    tasks.append(item[0])
+            for task in tasks:
+                task.cancel()
         logger.info(f"Audio generation took {time.perf_counter() - start:.2f} seconds")
 
     async def __aiter__(self) -> AsyncGenerator[ChatCompletionChunk]:
@@ -215,26 +290,47 @@ class AudioChatStream:
                 try:
                     async for chunk in stream:
                         yield chunk
-                except openai.APIStatusError:
+                except (openai.APIStatusError, InProcessClientError):
                     logger.exception("Audio chat generation failed")
         else:
             async for chunk in self.text_chat_completion_chunk_stream():
                 yield chunk
 
 
-# TODO: maybe propagate 400 errors
+def input_audio_cache_key(data: str, model: str) -> str:
+    return hashlib.sha256(f"{model}:{data}".encode()).hexdigest()
+
+
+async def transcribe_input_audio(
+    data: str,
+    model: str,
+    transcription_client: TranscriptionClient,
+    state_store: StateStore,
+    semaphore: asyncio.Semaphore,
+) -> str:
+    key = input_audio_cache_key(data, model)
+    transcript = await asyncio.to_thread(state_store.get, INPUT_AUDIO_TRANSCRIPTS_NAMESPACE, key)
+    if transcript is not None:
+        return transcript
+    async with semaphore:
+        audio_bytes = base64.b64decode(data)
+        # the format is detected by the decoder
+        audio_data = await asyncio.to_thread(decode_audio, BytesIO(audio_bytes), 16000)
+        transcript = await transcription_client.transcribe(Audio(audio_data, sample_rate=16000), model=model)
+    await asyncio.to_thread(
+        state_store.set, INPUT_AUDIO_TRANSCRIPTS_NAMESPACE, key, transcript, ttl=AUDIO_TRANSCRIPTION_TTL_SECONDS
+    )
+    return transcript
 
 
-# https://platform.openai.com/docs/api-reference/chat/create
-@router.post("/v1/chat/completions", response_model=ChatCompletion | ChatCompletionChunk)
-async def handle_completions(
-    chat_completion_client: CompletionClientDependency,
-    transcription_client: TranscriptionClientDependency,
-    speech_client: SpeechClientDependency,
-    body: Annotated[CompletionCreateParamsBase, Body()],
-) -> Response | StreamingResponse:
-    assert body.n is None or body.n == 1, "Multiple choices (`n` > 1) are not supported"
+async def prepare_messages(
+    body: CompletionCreateParamsBase, transcription_client: TranscriptionClient, state_store: StateStore
+) -> None:
+    """Replace the audio in `body.messages` with its transcript, as the language model only receives text.
 
+    All of the `input_audio` content parts are transcribed concurrently. Since clients usually resend the whole conversation history, transcripts are cached by the content of the audio.
+    """
+    input_audio_parts: list[tuple[int, int, str]] = []
     for i, message in enumerate(body.messages):
         if message.role == "user":
             content = message.content
@@ -242,22 +338,17 @@ async def handle_completions(
             if not isinstance(content, list):
                 continue
 
-            # TODO: parallelize
-            for j in range(len(content)):
-                content_part = content[j]
+            for j, content_part in enumerate(content):
                 if content_part.type == "input_audio":
-                    audio_bytes = base64.b64decode(content_part.input_audio.data)
-                    # TODO: how does the endpoint know the format lol?
-                    transcript = await transcription_client.create(
-                        file=BytesIO(audio_bytes),
-                        model=body.transcription_model,
-                        response_format="text",
-                    )
-                    content[j] = ChatCompletionContentPartTextParam(text=transcript, type="text")
-                    logger.info(f"Transcript for message {i} content part {j}: {transcript}")
+                    input_audio_parts.append((i, j, content_part.input_audio.data))
 
         elif message.role == "assistant" and message.audio is not None:
-            transcript = cache[message.audio.id]
+            transcript = await asyncio.to_thread(state_store.get, AUDIO_TRANSCRIPTS_NAMESPACE, message.audio.id)
+            if transcript is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Audio '{message.audio.id}' of message {i} doesn't exist or has expired.",
+                )
             body.messages[i] = ChatCompletionAssistantMessageParam(
                 role="assistant",
                 content=transcript,
@@ -268,18 +359,87 @@ async def handle_completions(
                 function_call=message.function_call,
             )
 
+    # limits the number of `input_audio` content parts of this request being transcribed at once
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_INPUT_AUDIO_TRANSCRIPTIONS)
+    transcripts = await asyncio.gather(
+        *(
+            transcribe_input_audio(data, body.transcription_model, transcription_client, state_store, semaphore)
+            for _, _, data in input_audio_parts
+        )
+    )
+    for (i, j, _), transcript in zip(input_audio_parts, transcripts, strict=True):
+        content = body.messages[i].content
+        assert isinstance(content, list)
+        content[j] = ChatCompletionContentPartTextParam(text=transcript, type="text")
+        logger.info(f"Transcript for message {i} content part {j}: {transcript}")
+
+
+def proxied_completion_params(body: CompletionCreateParamsBase) -> dict:
     # NOTE: rather than doing a `model_copy` it might be better to override the fields when doing the `model_dump` and destructuring
     proxied_body = body.model_copy(deep=True)
     proxied_body.modalities = ["text"]
     proxied_body.audio = None
     # NOTE: Adding --use-one-literal-as-default breaks the `exclude_defaults=True` behavior
+    return proxied_body.model_dump(
+        exclude_defaults=True,
+        exclude={"transcription_model", "transcription_extra_body", "speech_model", "speech_extra_body"},
+    )
+
+
+class InProcessChatCompletions:
+    """Serves chat completions the same way `POST /v1/chat/completions` does, without going through HTTP.
+
+    Used by the realtime API, which needs audio output (and hence this endpoint) rather than the upstream chat completion API.
+    """
+
+    def __init__(
+        self,
+        chat_completion_client: AsyncCompletions,
+        transcription_client: TranscriptionClient,
+        speech_client: SpeechClient,
+        state_store: StateStore,
+    ) -> None:
+        self.chat_completion_client = chat_completion_client
+        self.transcription_client = transcription_client
+        self.speech_client = speech_client
+        self.state_store = state_store
+
+    async def create(self, **params: Any) -> ChatCompletion | AsyncGenerator[ChatCompletionChunk]:
+        body = CompletionCreateParamsBase.model_validate(params)
+        assert body.n is None or body.n == 1, "Multiple choices (`n` > 1) are not supported"
+        await prepare_messages(body, self.transcription_client, self.state_store)
+        chat_completion = await self.chat_completion_client.create(**proxied_completion_params(body))
+        if isinstance(chat_completion, AsyncStream):
+            return aiter(AudioChatStream(chat_completion, self.speech_client, self.state_store, ClauseChunker(), body))
+        if body.modalities is not None and "audio" in body.modalities:
+            for i in range(len(chat_completion.choices)):
+                chat_completion.choices[i] = await transform_choice(
+                    self.speech_client, self.state_store, chat_completion.choices[i], body
+                )
+        return chat_completion
+
+
+# TODO: maybe propagate 400 errors
+
+
+# https://platform.openai.com/docs/api-reference/chat/create
+@router.post("/v1/chat/completions", response_model=ChatCompletion | ChatCompletionChunk)
+async def handle_completions(
+    chat_completion_client: CompletionClientDependency,
+    transcription_client: TranscriptionClientDependency,
+    speech_client: SpeechClientDependency,
+    state_store: StateStoreDependency,
+    body: Annotated[CompletionCreateParamsBase, Body()],
+) -> Response | StreamingResponse:
+    assert body.n is None or body.n == 1, "Multiple choices (`n` > 1) are not supported"
+
     try:
-        chat_completion = await chat_completion_client.create(
-            **proxied_body.model_dump(
-                exclude_defaults=True,
-                exclude={"transcription_model", "transcription_extra_body", "speech_model", "speech_extra_body"},
-            )
-        )
+        await prepare_messages(body, transcription_client, state_store)
+    except InProcessClientError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message) from e
+
+    try:
+        chat_completion = await chat_completion_client.create(**proxied_completion_params(body))
     except openai.APIStatusError as e:
         error_message = (
             "Failed to communicate with the language model API. "
@@ -339,7 +499,7 @@ async def handle_completions(
     if isinstance(chat_completion, AsyncStream):
 
         async def inner() -> AsyncGenerator[str]:
-            audio_chat_stream = AudioChatStream(chat_completion, speech_client, SentenceChunker(), body)
+            audio_chat_stream = AudioChatStream(chat_completion, speech_client, state_store, ClauseChunker(), body)
             async for chunk in audio_chat_stream:
                 yield format_as_sse(chunk.model_dump_json())
 
@@ -348,7 +508,12 @@ async def handle_completions(
         for i in range(len(chat_completion.choices)):
             if body.modalities is None or "audio" not in body.modalities:
                 continue
-            chat_completion.choices[i] = await transform_choice(speech_client, chat_completion.choices[i], body)
+            try:
+                chat_completion.choices[i] = await transform_choice(
+                    speech_client, state_store, chat_completion.choices[i], body
+                )
+            except InProcessClientError as e:
+                raise HTTPException(status_code=e.status_code, detail=e.message) from e
         return Response(content=chat_completion.model_dump_json(), media_type="application/json")
 
     raise ValueError(f"Unexpected chat completion type: {type(chat_completion)}")
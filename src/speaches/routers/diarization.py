@@ -11,7 +11,7 @@ from pydantic import BaseModel
 import torch
 
 from speaches.audio import Audio
-from speaches.dependencies import AudioFileDependency, ExecutorRegistryDependency
+from speaches.dependencies import AudioFileDependency, AudioUploadRoute, ExecutorRegistryDependency
 from speaches.diarization import KnownSpeaker
 from speaches.model_aliases import ModelId
 from speaches.routers.utils import find_executor_for_model_or_raise, get_model_card_data_or_raise
@@ -22,7 +22,7 @@ if TYPE_CHECKING:
     from pyannote.core.utils.types import TrackName
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(route_class=AudioUploadRoute)
 
 
 class DiarizationSegment(BaseModel):
@@ -2,7 +2,7 @@ import asyncio
 import base64
 import logging
 import time
-from typing import Annotated
+from typing import Annotated, cast
 
 from aiortc import (
     RTCConfiguration,
@@ -22,18 +22,25 @@ from fastapi import (
     Response,
 )
 import numpy as np
-from openai import AsyncOpenAI
 from openai.types.beta.realtime.error_event import Error
 from pydantic import ValidationError
 
+from speaches.audio import AudioBuffer
 from speaches.dependencies import (
+    CompletionClientDependency,
     ConfigDependency,
     ExecutorRegistryDependency,
+    SpeechClientDependency,
+    StateStoreDependency,
     TranscriptionClientDependency,
 )
 from speaches.realtime.context import SessionContext
 from speaches.realtime.conversation_event_router import event_router as conversation_event_router
 from speaches.realtime.event_router import EventRouter
+from speaches.realtime.input_audio_buffer_event_router import (
+    append_input_audio,
+    handle_input_audio_buffer_message,
+)
 from speaches.realtime.input_audio_buffer_event_router import (
     event_router as input_audio_buffer_event_router,
 )
@@ -42,19 +49,19 @@ from speaches.realtime.rtc.audio_stream_track import AudioStreamTrack
 from speaches.realtime.session import create_session_object_configuration
 from speaches.realtime.session_event_router import event_router as session_event_router
 from speaches.realtime.utils import generate_event_id
+from speaches.routers.chat import InProcessChatCompletions
 from speaches.routers.realtime_ws import event_listener
 from speaches.types.realtime import (
     SERVER_EVENT_TYPES,
     ErrorEvent,
     FullMessageEvent,
-    InputAudioBufferAppendEvent,
     PartialMessageEvent,
     SessionCreatedEvent,
     client_event_type_adapter,
     server_event_type_adapter,
 )
 
-# NOTE: IMPORTANT! 24Khz because that's what the `input_audio_buffer.append` handler expects
+# NOTE: IMPORTANT! 24Khz because that's what `append_input_audio` expects
 SAMPLE_RATE = 24000
 MIN_BUFFER_DURATION_MS = 200
 MIN_BUFFER_SIZE = int(SAMPLE_RATE * MIN_BUFFER_DURATION_MS / 1000)
@@ -155,6 +162,8 @@ async def rtc_datachannel_sender(ctx: SessionContext, channel: RTCDataChannel) -
 
 
 def message_handler(ctx: SessionContext, message: str) -> None:
+    if handle_input_audio_buffer_message(ctx, message):
+        return
     logger.info(f"Message received: {message}")
     try:
         event = client_event_type_adapter.validate_json(message)
@@ -170,7 +179,9 @@ def message_handler(ctx: SessionContext, message: str) -> None:
 
 async def audio_receiver(ctx: SessionContext, track: RemoteStreamTrack) -> None:
     # Initialize buffer to store audio data
-    buffer = np.array([], dtype=np.int16)
+    buffer = AudioBuffer(np.int16, initial_capacity=2 * MIN_BUFFER_SIZE)
+    # reused across frames so that the resampler's filter state carries over frame boundaries
+    resampler = AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
 
     while True:
         frames = await track.recv()
@@ -180,27 +191,18 @@ async def audio_receiver(ctx: SessionContext, track: RemoteStreamTrack) -> None:
         assert frames.layout.name == "stereo"  # pyrefly: ignore[missing-attribute]
         assert frames.format.name == "s16"  # pyrefly: ignore[missing-attribute]
 
-        resampler = AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE)
         frames = resampler.resample(frames)
 
         # Accumulate audio data
         for frame in frames:
-            arr = frame.to_ndarray()
-            buffer = np.append(buffer, arr.flatten())  # Flatten and append to buffer
+            # the resampler outputs packed s16 frames
+            buffer.append(cast("np.typing.NDArray[np.int16]", frame.to_ndarray()).reshape(-1))
 
-            # When buffer reaches or exceeds target size, emit event
+            # When buffer reaches or exceeds target size, append it to the input audio buffer
             if len(buffer) >= MIN_BUFFER_SIZE:
-                # Convert to bytes and emit event
-                audio_bytes = buffer.tobytes()
-                assert len(audio_bytes) == len(buffer) * 2, "Audio sample width is not 2 bytes"
-                ctx.pubsub.publish_nowait(
-                    InputAudioBufferAppendEvent(
-                        type="input_audio_buffer.append",
-                        audio=base64.b64encode(audio_bytes).decode(),
-                    )
-                )
-
-                buffer = np.array([], dtype=np.int16)
+                # `clear` doesn't modify the samples in place, so the view can be handed over without copying it
+                append_input_audio(ctx, buffer.data)
+                buffer.clear()
 
 
 def datachannel_handler(ctx: SessionContext, channel: RTCDataChannel) -> None:
@@ -242,10 +244,11 @@ def datachannel_handler(ctx: SessionContext, channel: RTCDataChannel) -> None:
         logger.info(f"Data channel buffered amount low: {channel.id} (args={args}, kwargs={kwargs})")
 
 
-def iceconnectionstatechange_handler(_ctx: SessionContext, pc: RTCPeerConnection) -> None:
+def iceconnectionstatechange_handler(ctx: SessionContext, pc: RTCPeerConnection) -> None:
     logger.info(f"ICE connection state changed to {pc.iceConnectionState}")
     if pc.iceConnectionState in ["failed", "closed"]:
         logger.info("Peer connection closed")
+        ctx.close()
 
 
 def track_handler(ctx: SessionContext, track: RemoteStreamTrack) -> None:
@@ -262,18 +265,20 @@ async def realtime_webrtc(
     model: Annotated[str, Query(...)],
     config: ConfigDependency,
     transcription_client: TranscriptionClientDependency,
+    speech_client: SpeechClientDependency,
+    state_store: StateStoreDependency,
+    chat_completion_client: CompletionClientDependency,
     executor_registry: ExecutorRegistryDependency,
 ) -> Response:
-    completion_client = AsyncOpenAI(
-        base_url=f"http://{config.host}:{config.port}/v1",
-        api_key=config.api_key.get_secret_value() if config.api_key else "cant-be-empty",
-        max_retries=0,
-    ).chat.completions
+    completion_client = InProcessChatCompletions(
+        chat_completion_client, transcription_client, speech_client, state_store
+    )
     ctx = SessionContext(
         transcription_client=transcription_client,
         completion_client=completion_client,
         vad_model_manager=executor_registry.vad.model_manager,
         session=create_session_object_configuration(model, "conversation", None, None),
+        history_config=config.realtime_history,
     )
     rtc_session_tasks[ctx.session.id] = set()
 
@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import logging
 
 from fastapi import (
@@ -7,11 +8,13 @@ from fastapi import (
     WebSocketException,
     status,
 )
-from openai import AsyncOpenAI
 
 from speaches.dependencies import (
+    CompletionClientDependency,
     ConfigDependency,
     ExecutorRegistryDependency,
+    SpeechClientDependency,
+    StateStoreDependency,
     TranscriptionClientDependency,
 )
 from speaches.realtime.context import SessionContext
@@ -20,11 +23,15 @@ from speaches.realtime.event_router import EventRouter
 from speaches.realtime.input_audio_buffer_event_router import (
     event_router as input_audio_buffer_event_router,
 )
+from speaches.realtime.input_audio_buffer_event_router import (
+    handle_input_audio_buffer_message,
+)
 from speaches.realtime.message_manager import WsServerMessageManager
 from speaches.realtime.response_event_router import event_router as response_event_router
 from speaches.realtime.session import OPENAI_REALTIME_SESSION_DURATION_SECONDS, create_session_object_configuration
 from speaches.realtime.session_event_router import event_router as session_event_router
 from speaches.realtime.utils import task_done_callback, verify_websocket_api_key
+from speaches.routers.chat import InProcessChatCompletions
 from speaches.types.realtime import SessionCreatedEvent
 
 logger = logging.getLogger(__name__)
@@ -59,6 +66,9 @@ async def realtime(
     model: str,
     config: ConfigDependency,
     transcription_client: TranscriptionClientDependency,
+    speech_client: SpeechClientDependency,
+    state_store: StateStoreDependency,
+    chat_completion_client: CompletionClientDependency,
     executor_registry: ExecutorRegistryDependency,
     intent: str = "conversation",
     language: str | None = None,
@@ -86,26 +96,30 @@ async def realtime(
     await ws.accept()
     logger.info(f"Accepted websocket connection with intent: {intent}")
 
-    completion_client = AsyncOpenAI(
-        base_url=f"http://{config.host}:{config.port}/v1",
-        api_key=config.api_key.get_secret_value() if config.api_key else "cant-be-empty",
-        max_retries=0,
-    ).chat.completions
+    completion_client = InProcessChatCompletions(
+        chat_completion_client, transcription_client, speech_client, state_store
+    )
     ctx = SessionContext(
         transcription_client=transcription_client,
         completion_client=completion_client,
         vad_model_manager=executor_registry.vad.model_manager,
         session=create_session_object_configuration(model, intent, language, transcription_model),
+        history_config=config.realtime_history,
+    )
+    message_manager = WsServerMessageManager(
+        ctx.pubsub, fast_path=functools.partial(handle_input_audio_buffer_message, ctx)
     )
-    message_manager = WsServerMessageManager(ctx.pubsub)
-    async with asyncio.TaskGroup() as tg:
-        event_listener_task = tg.create_task(event_listener(ctx), name="event_listener")
-        async with asyncio.timeout(OPENAI_REALTIME_SESSION_DURATION_SECONDS):
-            mm_task = asyncio.create_task(message_manager.run(ws))
-            # HACK: a tiny delay to ensure the message_manager.run() task is started. Otherwise, the `SessionCreatedEvent` will not be sent, as it's published before the `sender` task subscribes to the pubsub.
-            await asyncio.sleep(0.001)
-            ctx.pubsub.publish_nowait(SessionCreatedEvent(session=ctx.session))
-            await mm_task
-        event_listener_task.cancel()
+    try:
+        async with asyncio.TaskGroup() as tg:
+            event_listener_task = tg.create_task(event_listener(ctx), name="event_listener")
+            async with asyncio.timeout(OPENAI_REALTIME_SESSION_DURATION_SECONDS):
+                mm_task = asyncio.create_task(message_manager.run(ws))
+                # HACK: a tiny delay to ensure the message_manager.run() task is started. Otherwise, the `SessionCreatedEvent` will not be sent, as it's published before the `sender` task subscribes to the pubsub.
+                await asyncio.sleep(0.001)
+                ctx.pubsub.publish_nowait(SessionCreatedEvent(session=ctx.session))
+                await mm_task
+            event_listener_task.cancel()
+    finally:
+        ctx.close()
 
     logger.info(f"Finished handling '{ctx.session.id}' session")
@@ -16,7 +16,7 @@ from speaches.api_types import (
     SpeechResponseFormat,
 )
 from speaches.audio import Audio, stream_audio_as_formatted_bytes
-from speaches.dependencies import ExecutorRegistryDependency
+from speaches.dependencies import ExecutorRegistryDependency, TtsCacheDependency
 from speaches.executors.shared.handler_protocol import SpeechRequest
 from speaches.model_aliases import ModelId
 from speaches.routers.utils import find_executor_for_model_or_raise, get_model_card_data_or_raise
@@ -85,6 +85,7 @@ def speech_audio_events_to_sse(
 @router.post("/v1/audio/speech")
 def synthesize(
     executor_registry: ExecutorRegistryDependency,
+    tts_cache: TtsCacheDependency,
     body: CreateSpeechRequestBody,
 ) -> StreamingResponse:
     model_card_data = get_model_card_data_or_raise(body.model)
@@ -103,6 +104,9 @@ def synthesize(
         audio_generator = executor.model_manager.handle_speech_request(
             speech_request,
         )
+        if tts_cache is not None:
+            # cached audio is stored at the model's sample rate, so a single entry serves every requested `sample_rate`
+            audio_generator = tts_cache.cached(speech_request, audio_generator)
         if body.stream_format == "sse":
             return StreamingResponse(
                 speech_audio_events_to_sse(audio_gen_to_speech_audio_events(audio_generator)),
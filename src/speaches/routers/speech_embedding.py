@@ -13,6 +13,7 @@ from speaches.api_types import (
 )
 from speaches.dependencies import (
     AudioFileDependency,
+    AudioUploadRoute,
     ExecutorRegistryDependency,
 )
 from speaches.executors.shared.handler_protocol import SpeakerEmbeddingRequest
@@ -21,7 +22,7 @@ from speaches.routers.utils import find_executor_for_model_or_raise, get_model_c
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(tags=["speaker-embedding"])
+router = APIRouter(tags=["speaker-embedding"], route_class=AudioUploadRoute)
 
 
 @router.post(
@@ -0,0 +1,309 @@
+import asyncio
+from collections.abc import Callable, Generator
+import contextlib
+import logging
+from typing import Annotated, Literal
+
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status,
+)
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.websockets import WebSocketState
+
+from speaches import text_utils
+from speaches.api_types import (
+    MAX_SPEECH_SAMPLE_RATE,
+    MIN_SPEECH_SAMPLE_RATE,
+    SpeechResponseFormat,
+)
+from speaches.audio import Audio, AudioEncoder
+from speaches.dependencies import ConfigDependency, ExecutorRegistryDependency, TtsCacheDependency
+from speaches.executors.shared.handler_protocol import SpeechRequest
+from speaches.realtime.utils import verify_websocket_api_key
+from speaches.resample import StreamingResampler
+from speaches.routers.utils import find_executor_for_model_or_raise, get_model_card_data_or_raise
+from speaches.text_utils import ClauseChunker
+from speaches.tts_cache import TtsCache
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["text-to-speech"])
+
+
+class InputTextDeltaEvent(BaseModel):
+    type: Literal["input_text.delta"]
+    delta: str
+    """A piece of the text to synthesize, e.g. a token as it's produced by an LLM."""
+
+
+class InputTextFlushEvent(BaseModel):
+    """Synthesize all of the text received so far, even if it doesn't end with a complete sentence."""
+
+    type: Literal["input_text.flush"]
+
+
+class InputTextDoneEvent(BaseModel):
+    """Flush the remaining text and close the connection once all of the audio has been sent."""
+
+    type: Literal["input_text.done"]
+
+
+class CancelEvent(BaseModel):
+    """Discard the pending text and stop sending audio for it."""
+
+    type: Literal["cancel"]
+
+
+type SpeechStreamClientEvent = Annotated[
+    InputTextDeltaEvent | InputTextFlushEvent | InputTextDoneEvent | CancelEvent, Field(discriminator="type")
+]
+client_event_adapter: TypeAdapter[SpeechStreamClientEvent] = TypeAdapter(SpeechStreamClientEvent)
+
+type HandleSpeechRequest = Callable[[SpeechRequest], Generator[Audio]]
+
+
+class _SegmentEncoder:
+    """Encodes the audio of all sentences between two flushes as one continuous stream.
+
+    Sharing the resampler/encoder across sentences avoids discontinuities at the sentence boundaries and, for the containerized formats, makes each flushed segment a single playable file.
+    """
+
+    def __init__(self, response_format: SpeechResponseFormat, sample_rate: int | None) -> None:
+        self.response_format = response_format
+        self.sample_rate = sample_rate
+        self._resampler: StreamingResampler | None = None
+        self._encoder: AudioEncoder | None = None
+
+    def encode(self, audio: Audio) -> bytes:
+        if self.response_format == "pcm":
+            if self.sample_rate is None or audio.sample_rate == self.sample_rate:
+                return audio.as_bytes()
+            if self._resampler is None:
+                self._resampler = StreamingResampler(audio.sample_rate, self.sample_rate)
+            return Audio(self._resampler.process(audio.data), self.sample_rate).as_bytes()
+        if self._encoder is None:
+            self._encoder = AudioEncoder(
+                self.response_format,
+                sample_rate=audio.sample_rate,
+                target_sample_rate=self.sample_rate if self.sample_rate is not None else audio.sample_rate,
+            )
+        return self._encoder.encode(audio)
+
+    def close(self) -> bytes:
+        """Return the remaining bytes of the segment. Calling it again is a no-op."""
+        resampler, encoder = self._resampler, self._encoder
+        self._resampler = self._encoder = None
+        if resampler is not None:
+            return Audio(resampler.flush(), resampler.target_sample_rate).as_bytes()
+        if encoder is not None:
+            return encoder.close()
+        return b""
+
+    def discard(self) -> None:
+        """Release the encoder without flushing the rest of the segment, e.g. when it's cancelled part way through."""
+        encoder = self._encoder
+        self._resampler = self._encoder = None
+        if encoder is not None:
+            encoder.discard()
+
+
+class SpeechStream:
+    """Synthesizes text as it's streamed in over a WebSocket.
+
+    Incoming text is split into chunks by a `ClauseChunker`, each of which is synthesized as soon as it's complete. A flush closes the current chunker and starts a new one, so the segments are synthesized (and their audio sent) in the order they were received.
+    """
+
+    def __init__(
+        self,
+        ws: WebSocket,
+        handle_speech_request: HandleSpeechRequest,
+        tts_cache: TtsCache | None,
+        model: str,
+        voice: str,
+        speed: float,
+        response_format: SpeechResponseFormat,
+        sample_rate: int | None,
+    ) -> None:
+        self.ws = ws
+        self.handle_speech_request = handle_speech_request
+        self.tts_cache = tts_cache
+        self.model = model
+        self.voice = voice
+        self.speed = speed
+        self.response_format = response_format
+        self.sample_rate = sample_rate
+        self._send_lock = asyncio.Lock()
+        # `None` marks the end of the input
+        self._segments: asyncio.Queue[ClauseChunker | None] = asyncio.Queue()
+        self._chunker = self._new_segment()
+        self._synthesizer_task = asyncio.create_task(self._synthesizer(), name="speech_stream_synthesizer")
+
+    def _new_segment(self) -> ClauseChunker:
+        chunker = ClauseChunker()
+        self._segments.put_nowait(chunker)
+        return chunker
+
+    async def send_event(self, event: dict) -> None:
+        async with self._send_lock:
+            await self.ws.send_json(event)
+
+    async def _send_bytes(self, data: bytes) -> None:
+        if data:
+            async with self._send_lock:
+                await self.ws.send_bytes(data)
+
+    def add_text(self, text: str) -> None:
+        self._chunker.add_token(text)
+
+    def flush(self) -> None:
+        self._chunker.close()
+        self._chunker = self._new_segment()
+
+    async def done(self) -> None:
+        """Flush the remaining text and wait until all of the audio has been sent."""
+        self._chunker.close()
+        self._segments.put_nowait(None)
+        await self._synthesizer_task
+
+    async def cancel(self) -> None:
+        await self.close()
+        while not self._segments.empty():
+            self._segments.get_nowait()
+        self._chunker = self._new_segment()
+        self._synthesizer_task = asyncio.create_task(self._synthesizer(), name="speech_stream_synthesizer")
+
+    async def close(self) -> None:
+        self._synthesizer_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._synthesizer_task
+
+    async def _synthesizer(self) -> None:
+        while (chunker := await self._segments.get()) is not None:
+            encoder = _SegmentEncoder(self.response_format, self.sample_rate)
+            try:
+                async for sentence in chunker:
+                    text = text_utils.strip_emojis(text_utils.strip_markdown_emphasis(sentence.strip())).strip()
+                    if not text:
+                        continue
+                    # the model and the encoder run in a worker thread. If this task gets cancelled, the generator is closed once the chunk that's being generated is done
+                    async for data in iterate_in_threadpool(self._synthesize_encoded(text, encoder)):
+                        await self._send_bytes(data)
+                await self._send_bytes(await run_in_threadpool(encoder.close))
+            except WebSocketDisconnect:
+                logger.info("Speech stream client disconnected while audio was being sent")
+                return
+            except Exception as e:
+                if not self._is_connected():
+                    # sending failed because the connection was closed, there's no one left to report the error to
+                    logger.info(f"Stopped synthesizing speech for a closed connection: {e!r}")
+                    return
+                logger.exception("Speech synthesis failed")
+                await self.send_event({"type": "error", "message": str(e)})
+                continue
+            finally:
+                # releases the encoder if the segment was cancelled part way through
+                encoder.discard()
+            await self.send_event({"type": "audio.done"})
+
+    def _is_connected(self) -> bool:
+        return (
+            self.ws.client_state == WebSocketState.CONNECTED and self.ws.application_state == WebSocketState.CONNECTED
+        )
+
+    def _synthesize(self, text: str) -> Generator[Audio]:
+        speech_request = SpeechRequest(model=self.model, voice=self.voice, text=text, speed=self.speed)
+        audio_generator = self.handle_speech_request(speech_request)
+        if self.tts_cache is not None:
+            audio_generator = self.tts_cache.cached(speech_request, audio_generator)
+        return audio_generator
+
+    def _synthesize_encoded(self, text: str, encoder: _SegmentEncoder) -> Generator[bytes]:
+        for audio in self._synthesize(text):
+            yield encoder.encode(audio)
+
+
+@router.websocket("/v1/audio/speech/stream")
+async def speech_stream(
+    ws: WebSocket,
+    config: ConfigDependency,
+    executor_registry: ExecutorRegistryDependency,
+    tts_cache: TtsCacheDependency,
+    model: str,
+    voice: str,
+    speed: float = 1.0,
+    response_format: SpeechResponseFormat = "pcm",
+    sample_rate: Annotated[int | None, Query(ge=MIN_SPEECH_SAMPLE_RATE, le=MAX_SPEECH_SAMPLE_RATE)] = None,
+) -> None:
+    """Synthesize speech from text that's streamed in incrementally, e.g. the tokens of an LLM response.
+
+    Client messages are JSON objects:
+    - `{"type": "input_text.delta", "delta": "..."}` appends text. Each sentence is synthesized as soon as it's complete (the first one may be cut short at a clause boundary, to start sending audio sooner).
+    - `{"type": "input_text.flush"}` synthesizes the text received so far, even if it's not a complete sentence.
+    - `{"type": "input_text.done"}` flushes the remaining text and closes the connection after the last audio has been sent.
+    - `{"type": "cancel"}` discards the pending text and stops the synthesis of the current segment.
+
+    Audio is sent as binary messages in `response_format` (by default raw 16-bit little-endian mono PCM, at the model's sample rate unless `sample_rate` is set). After the audio of each flushed segment, a `{"type": "audio.done"}` message is sent. For containerized formats (e.g. `wav`, `mp3`) each segment is a separate file.
+    """
+    try:
+        await verify_websocket_api_key(ws, config)
+    except WebSocketException:
+        await ws.close(code=status.WS_1008_POLICY_VIOLATION, reason="Authentication failed")
+        return
+
+    try:
+        model_card_data = get_model_card_data_or_raise(model)
+        executor = find_executor_for_model_or_raise(model, model_card_data, executor_registry.text_to_speech)
+    except HTTPException as e:
+        await ws.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+
+    await ws.accept()
+    stream = SpeechStream(
+        ws,
+        executor.model_manager.handle_speech_request,
+        tts_cache,
+        model=model,
+        voice=voice,
+        speed=speed,
+        response_format=response_format,
+        sample_rate=sample_rate,
+    )
+    try:
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE), message.get("reason"))
+            if message.get("text") is None:
+                await stream.send_event(
+                    {"type": "error", "message": "Expected a JSON encoded event in a text message."}
+                )
+                continue
+            message = message["text"]
+            try:
+                event = client_event_adapter.validate_json(message)
+            except ValidationError as e:
+                await stream.send_event({"type": "error", "message": str(e)})
+                continue
+            match event:
+                case InputTextDeltaEvent():
+                    stream.add_text(event.delta)
+                case InputTextFlushEvent():
+                    stream.flush()
+                case CancelEvent():
+                    await stream.cancel()
+                    await stream.send_event({"type": "cancelled"})
+                case InputTextDoneEvent():
+                    await stream.done()
+                    await ws.close()
+                    return
+    except WebSocketDisconnect:
+        logger.info("Speech stream client disconnected")
+    finally:
+        await stream.close()
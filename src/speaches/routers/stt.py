@@ -1,11 +1,13 @@
 import asyncio
 from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from typing import Annotated, Literal
 
 from fastapi import (
     APIRouter,
     Form,
+    HTTPException,
     Request,
     Response,
 )
@@ -17,8 +19,11 @@ from speaches.api_types import (
     TIMESTAMP_GRANULARITIES_COMBINATIONS,
     TimestampGranularities,
 )
+from speaches.audio import Audio
 from speaches.dependencies import (
+    AudioChannelsDependency,
     AudioFileDependency,
+    AudioUploadRoute,
     ExecutorRegistryDependency,
 )
 from speaches.executors.shared.handler_protocol import (
@@ -29,14 +34,14 @@ from speaches.executors.shared.handler_protocol import (
     TranslationResponse,
     VadRequest,
 )
-from speaches.executors.silero_vad_v5 import VadOptions
+from speaches.executors.silero_vad_v5 import DEFAULT_VAD_OPTIONS
 from speaches.model_aliases import ModelId
 from speaches.routers.utils import find_executor_for_model_or_raise, get_model_card_data_or_raise
-from speaches.text_utils import format_as_sse
+from speaches.text_utils import format_as_srt, format_as_sse, format_as_vtt
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(tags=["automatic-speech-recognition"])
+router = APIRouter(tags=["automatic-speech-recognition"], route_class=AudioUploadRoute)
 
 type ResponseFormat = Literal["text", "json", "verbose_json", "srt", "vtt"]
 RESPONSE_FORMATS = ("text", "json", "verbose_json", "srt", "vtt")
@@ -44,9 +49,6 @@ RESPONSE_FORMATS = ("text", "json", "verbose_json", "srt", "vtt")
 # https://platform.openai.com/docs/api-reference/audio/createTranscription#audio-createtranscription-response_format
 DEFAULT_RESPONSE_FORMAT: ResponseFormat = "json"
 
-# NOTE: copied from `faster_whisper.transcribe`
-DEFAULT_VAD_OPTIONS = VadOptions(min_silence_duration_ms=160, max_speech_duration_s=30)
-
 
 def translation_response_to_http_response(res: TranslationResponse) -> Response:  # noqa: RET503  # pyrefly: ignore[bad-return]
     if isinstance(res, tuple):
@@ -115,6 +117,47 @@ def transcription_response_to_http_response(
         )
 
 
+def merge_channel_transcriptions(
+    transcriptions: list[openai.types.audio.TranscriptionVerbose], response_format: ResponseFormat
+) -> NonStreamingTranscriptionResponse:
+    """Interleave the segments (and words) of per channel transcriptions by their start time."""
+    segments = sorted(
+        (segment for transcription in transcriptions for segment in transcription.segments or []),
+        key=lambda segment: segment.start,
+    )
+    segments = [segment.model_copy(update={"id": i}) for i, segment in enumerate(segments)]
+    text = " ".join(segment.text.strip() for segment in segments)
+    match response_format:
+        case "text":
+            return text, "text/plain"
+        case "json":
+            return openai.types.audio.Transcription(text=text)
+        case "verbose_json":
+            words = (
+                sorted(
+                    (word for transcription in transcriptions for word in transcription.words or []),
+                    key=lambda word: word.start,
+                )
+                if any(transcription.words is not None for transcription in transcriptions)
+                else None
+            )
+            return openai.types.audio.TranscriptionVerbose(
+                language=transcriptions[0].language if transcriptions else "en",
+                duration=max((transcription.duration for transcription in transcriptions), default=0),
+                text=text,
+                segments=segments,
+                words=words,
+            )
+        case "vtt":
+            return "".join(
+                format_as_vtt(segment.text, segment.start, segment.end, i) for i, segment in enumerate(segments)
+            ), "text/vtt"
+        case "srt":
+            return "".join(
+                format_as_srt(segment.text, segment.start, segment.end, i) for i, segment in enumerate(segments)
+            ), "text/plain"
+
+
 # https://platform.openai.com/docs/api-reference/audio/createTranscription
 # https://github.com/openai/openai-openapi/blob/master/openapi.yaml#L8915
 @router.post(
@@ -124,7 +167,7 @@ def transcription_response_to_http_response(
 def transcribe_file(
     executor_registry: ExecutorRegistryDependency,
     request: Request,
-    audio: AudioFileDependency,
+    audio_channels: AudioChannelsDependency,
     model: Annotated[ModelId, Form()],
     language: Annotated[str | None, Form()] = None,
     prompt: Annotated[str | None, Form()] = None,
@@ -139,6 +182,8 @@ def transcribe_file(
     # non standard parameters
     hotwords: Annotated[str | None, Form()] = None,
     without_timestamps: Annotated[bool, Form()] = True,
+    # documented on, and also read by, `AudioChannelsDependency`
+    split_channels: Annotated[bool, Form()] = False,
 ) -> Response | StreamingResponse:
     timestamp_granularities = asyncio.run(get_timestamp_granularities(request))
     if timestamp_granularities != DEFAULT_TIMESTAMP_GRANULARITIES and response_format != "verbose_json":
@@ -151,6 +196,40 @@ def transcribe_file(
         model, transcription_model_card_data, executor_registry.transcription
     )
 
+    if split_channels:
+        if stream:
+            raise HTTPException(status_code=400, detail="`split_channels` can't be used together with `stream`.")
+
+        def transcribe_channel(channel_audio: Audio) -> openai.types.audio.TranscriptionVerbose:
+            vad_request = VadRequest(audio=channel_audio, vad_options=DEFAULT_VAD_OPTIONS)
+            speech_segments = executor_registry.vad.model_manager.handle_vad_request(vad_request)
+            transcription_request = TranscriptionRequest(
+                audio=channel_audio,
+                model=model,
+                language=language,
+                prompt=prompt,
+                response_format="verbose_json",
+                temperature=temperature,
+                timestamp_granularities=timestamp_granularities,
+                stream=False,
+                hotwords=hotwords,
+                speech_segments=speech_segments,
+                vad_options=DEFAULT_VAD_OPTIONS,
+                without_timestamps=without_timestamps,
+            )
+            res = transcription_executor.model_manager.handle_transcription_request(transcription_request)
+            if not isinstance(res, openai.types.audio.TranscriptionVerbose):
+                raise HTTPException(
+                    status_code=400, detail=f"Model '{model}' doesn't support timestamps required by `split_channels`."
+                )
+            return res
+
+        with ThreadPoolExecutor(max_workers=len(audio_channels)) as pool:
+            transcriptions = list(pool.map(transcribe_channel, audio_channels))
+        res = merge_channel_transcriptions(transcriptions, response_format)
+        return transcription_response_to_http_response(res)
+
+    [audio] = audio_channels
     vad_request = VadRequest(audio=audio, vad_options=DEFAULT_VAD_OPTIONS)
     speech_segments = executor_registry.vad.model_manager.handle_vad_request(vad_request)
 
@@ -9,19 +9,21 @@ from fastapi import (
     APIRouter,
     Form,
 )
+from fastapi.responses import StreamingResponse
 
-from speaches.dependencies import AudioFileDependency, ExecutorRegistryDependency
+from speaches.dependencies import AudioFileDependency, AudioUploadRoute, ExecutorRegistryDependency
 from speaches.executors.shared.handler_protocol import VadRequest
 from speaches.executors.silero_vad_v5 import MODEL_ID, SAMPLE_RATE, SpeechTimestamp, VadOptions, to_ms_speech_timestamps
 from speaches.model_aliases import ModelId
+from speaches.text_utils import format_as_sse
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(tags=["voice-activity-detection"])
+router = APIRouter(tags=["voice-activity-detection"], route_class=AudioUploadRoute)
 
 
 # TODO: adapt parameter names from here https://platform.openai.com/docs/api-reference/realtime-sessions/create#realtime-sessions-create-turn_detection
-@router.post("/v1/audio/speech/timestamps")
+@router.post("/v1/audio/speech/timestamps", response_model=list[SpeechTimestamp])
 def detect_speech_timestamps(
     audio: AudioFileDependency,
     executor_registry: ExecutorRegistryDependency,
@@ -69,7 +71,20 @@ def detect_speech_timestamps(
     speech_pad_ms: Annotated[
         int, Form(ge=0, description="""Final speech chunks are padded by speech_pad_ms each side""")
     ] = 0,
-) -> list[SpeechTimestamp]:
+    min_energy_dbfs: Annotated[
+        float | None,
+        Form(
+            le=0,
+            description="""Optional energy pre-gate in dBFS. Audio windows quieter than this value (and not adjacent to louder audio) are treated as silence without running the model, which speeds up processing of recordings with long silent stretches. A value around -60 only skips near-silence. Disabled by default.""",
+        ),
+    ] = None,
+    stream: Annotated[
+        bool,
+        Form(
+            description="""If set, the speech probability of every window and the speech segments are streamed back as server-sent events while the audio is being processed. The last event contains the same timestamps as the non-streaming response.""",
+        ),
+    ] = False,
+) -> list[SpeechTimestamp] | StreamingResponse:
     assert model == MODEL_ID, f"Only '{MODEL_ID}' model is supported"
 
     vad_options = VadOptions(
@@ -79,10 +94,20 @@ def detect_speech_timestamps(
         max_speech_duration_s=max_speech_duration_s,
         min_silence_duration_ms=min_silence_duration_ms,
         speech_pad_ms=speech_pad_ms,
+        min_energy_dbfs=min_energy_dbfs,
     )
 
     vad_request = VadRequest(audio=audio, model_id=model, vad_options=vad_options, sampling_rate=SAMPLE_RATE)
 
+    if stream:
+        return StreamingResponse(
+            (
+                format_as_sse(event.model_dump_json())
+                for event in executor_registry.vad.model_manager.handle_streaming_vad_request(vad_request)
+            ),
+            media_type="text/event-stream",
+        )
+
     speech_timestamps_raw = executor_registry.vad.model_manager.handle_vad_request(vad_request)
 
     speech_timestamps = to_ms_speech_timestamps(speech_timestamps_raw)
@@ -0,0 +1,226 @@
+from abc import ABC, abstractmethod
+import logging
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+from speaches.config import StateStoreConfig
+
+logger = logging.getLogger(__name__)
+
+# how often expired entries are removed. Expired entries are never returned, this only bounds how long they take up space
+EXPIRED_ENTRIES_SWEEP_INTERVAL_SECONDS = 60
+
+
+class StateStore(ABC):
+    """Key-value store for state that must outlive a single request, such as the transcripts of generated chat audio.
+
+    Values are strings (callers serialize anything else, e.g. as JSON) grouped by namespace, and may expire after a TTL. This is intentionally a subset of what network key-value stores (e.g. Redis' `GET`, `SET EX` and `DEL`) provide, so that one of them could back it in a multi-host deployment.
+
+    The methods are synchronous and may block (on a lock, or on disk I/O for the SQLite backend), so async callers should run them in a thread, e.g. with `asyncio.to_thread`.
+    """
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> str | None:
+        """Return the value of `key`, or `None` if it doesn't exist or has expired."""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: str, ttl: float | None = None) -> None:
+        """Set the value of `key`. It expires after `ttl` seconds, or never if `ttl` is `None`."""
+
+    @abstractmethod
+    def delete(self, namespace: str, key: str) -> None: ...
+
+    def flush(self) -> None:  # noqa: B027
+        """Make the writes made so far visible to the other workers, for a store that buffers them.
+
+        Callers should flush before responding to a request whose follow-up may be served by another worker and look up what was written.
+        """
+
+    def close(self) -> None:  # noqa: B027
+        """Release the resources of the store, writing out anything that's still pending."""
+
+
+def expiry_time(ttl: float | None) -> float | None:
+    # wall clock time, rather than a monotonic clock, since the expiry may be compared by other processes
+    return time.time() + ttl if ttl is not None else None
+
+
+class InMemoryStateStore(StateStore):
+    """Keeps the state in the memory of the process. It's not shared between workers."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        # (namespace, key) -> (value, expires_at). Kept in insertion order, so the first entry is the oldest one
+        self._entries: dict[tuple[str, str], tuple[str, float | None]] = {}
+        self._last_sweep = time.time()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[(namespace, key)]
+                return None
+            return value
+
+    def set(self, namespace: str, key: str, value: str, ttl: float | None = None) -> None:
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+            self._entries[(namespace, key)] = (value, expiry_time(ttl))
+            now = time.time()
+            if now - self._last_sweep >= EXPIRED_ENTRIES_SWEEP_INTERVAL_SECONDS:
+                self._remove_expired(now)
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+    def _remove_expired(self, now: float) -> None:
+        self._entries = {
+            k: (value, expires_at)
+            for k, (value, expires_at) in self._entries.items()
+            if expires_at is None or expires_at > now
+        }
+        self._last_sweep = now
+
+
+class SqliteStateStore(StateStore):
+    """Keeps the state in a SQLite database, so that it's shared by all of the workers on a host.
+
+    Writes are buffered and committed in batches by a background thread, either every `flush_interval_ms`, once `max_batch_size` writes are pending or when `flush` is called, which keeps the (fsync bound) commits off the request path. Until then, a write is only visible to the process that made it.
+
+    Reads and writes go through separate connections. Thanks to WAL mode, a read never waits for a commit, even when the commit itself waits for another worker's.
+    """
+
+    def __init__(self, path: Path, flush_interval_ms: int, max_batch_size: int) -> None:
+        self.path = path
+        self.flush_interval_ms = flush_interval_ms
+        self.max_batch_size = max_batch_size
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # only used by `flush`, guarded by `_write_lock`
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("PRAGMA busy_timeout=5000")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL, "
+            "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS state_expires_at ON state (expires_at)")
+        self._write_lock = threading.Lock()
+        # shared by the request threads, guarded by `_read_lock`
+        self._read_connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._read_connection.execute("PRAGMA busy_timeout=5000")
+        self._read_lock = threading.Lock()
+        # (namespace, key) -> (value, expires_at). A `None` value marks a pending delete
+        self._pending: dict[tuple[str, str], tuple[str | None, float | None]] = {}
+        # the writes of the commit in progress. They're kept readable until the commit is done, so that a `get` in between never misses them
+        self._committing: dict[tuple[str, str], tuple[str | None, float | None]] = {}
+        self._pending_lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._closed = threading.Event()
+        self._flush_requested = threading.Event()
+        self._flush_thread: threading.Thread | None = None
+        if flush_interval_ms > 0:
+            self._flush_thread = threading.Thread(target=self._flush_loop, name="state-store-flush", daemon=True)
+            self._flush_thread.start()
+
+    def get(self, namespace: str, key: str) -> str | None:
+        with self._pending_lock:
+            pending = self._pending.get((namespace, key)) or self._committing.get((namespace, key))
+        if pending is not None:
+            value, expires_at = pending
+            if value is None or (expires_at is not None and expires_at <= time.time()):
+                return None
+            return value
+        with self._read_lock:
+            row = self._read_connection.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (namespace, key, time.time()),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, namespace: str, key: str, value: str, ttl: float | None = None) -> None:
+        self._write(namespace, key, value, expiry_time(ttl))
+
+    def delete(self, namespace: str, key: str) -> None:
+        self._write(namespace, key, None, None)
+
+    def _write(self, namespace: str, key: str, value: str | None, expires_at: float | None) -> None:
+        with self._pending_lock:
+            self._pending[(namespace, key)] = (value, expires_at)
+            batch_full = len(self._pending) >= self.max_batch_size
+        if self._flush_thread is None:
+            self.flush()
+        elif batch_full:
+            self._flush_requested.set()
+
+    def flush(self) -> None:
+        """Commit the pending writes."""
+        with self._write_lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+                self._committing = pending
+            now = time.time()
+            sweep = now - self._last_sweep >= EXPIRED_ENTRIES_SWEEP_INTERVAL_SECONDS
+            if not pending and not sweep:
+                return
+            upserts = [(ns, k, v, expires_at) for (ns, k), (v, expires_at) in pending.items() if v is not None]
+            deletes = [(ns, k) for (ns, k), (v, _) in pending.items() if v is None]
+            try:
+                self._connection.execute("BEGIN IMMEDIATE")
+                self._connection.executemany("INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?)", upserts)
+                self._connection.executemany("DELETE FROM state WHERE namespace = ? AND key = ?", deletes)
+                if sweep:
+                    self._connection.execute("DELETE FROM state WHERE expires_at <= ?", (now,))
+                self._connection.execute("COMMIT")
+            except sqlite3.Error:
+                if self._connection.in_transaction:
+                    self._connection.execute("ROLLBACK")
+                # keep the writes pending so that they're retried on the next flush, unless they have been overwritten since
+                with self._pending_lock:
+                    self._pending = pending | self._pending
+                    self._committing = {}
+                raise
+            with self._pending_lock:
+                self._committing = {}
+            if sweep:
+                self._last_sweep = now
+
+    def _flush_loop(self) -> None:
+        while not self._closed.is_set():
+            self._flush_requested.wait(self.flush_interval_ms / 1000)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.exception("Failed to write the pending state to the database")
+
+    def close(self) -> None:
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._flush_thread is not None:
+            self._flush_requested.set()
+            self._flush_thread.join()
+        self.flush()
+        with self._write_lock:
+            self._connection.close()
+        with self._read_lock:
+            self._read_connection.close()
+
+
+def create_state_store(config: StateStoreConfig) -> StateStore:
+    match config.backend:
+        case "memory":
+            return InMemoryStateStore(config.max_entries)
+        case "sqlite":
+            return SqliteStateStore(config.sqlite_path, config.flush_interval_ms, config.max_batch_size)
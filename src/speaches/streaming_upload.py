@@ -0,0 +1,223 @@
+from collections.abc import AsyncGenerator, Buffer
+from concurrent.futures import Future
+import io
+import logging
+import threading
+from typing import BinaryIO, cast
+
+from fastapi import HTTPException
+import numpy as np
+from starlette.datastructures import FormData, Headers, UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.requests import Request
+from starlette.types import Receive, Scope
+
+from speaches.audio import decode_audio
+
+logger = logging.getLogger(__name__)
+
+RAW_PCM_CONTENT_TYPES = ("audio/pcm", "audio/raw")
+
+
+class _UploadPipe(io.RawIOBase):
+    """A non-seekable file-like object whose reads block until the bytes have been received."""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._closed_for_writing = False
+        self._aborted = False
+        self._condition = threading.Condition()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Buffer, /) -> int:
+        with self._condition:
+            self._condition.wait_for(lambda: len(self._buffer) > 0 or self._closed_for_writing)
+            if self._aborted:
+                raise OSError("The upload was aborted")
+            data = memoryview(b).cast("B")
+            size = min(len(data), len(self._buffer))
+            data[:size] = self._buffer[:size]
+            del self._buffer[:size]
+            return size
+
+    def write_chunk(self, data: bytes) -> None:
+        with self._condition:
+            self._buffer += data
+            self._condition.notify()
+
+    def close_for_writing(self, *, aborted: bool = False) -> None:
+        with self._condition:
+            self._closed_for_writing = True
+            self._aborted = aborted
+            self._condition.notify()
+
+
+class StreamingDecoder:
+    """Decodes an upload in a background thread while its bytes are still being received.
+
+    The decoder reads from a non-seekable pipe, so containers that can't be demuxed front to back (e.g. MP4 files with the `moov` atom at the end) don't produce any audio. `decoded_audio` returns `None` in that case, and whenever decoding failed or was started with different parameters than requested, so that the caller can decode the fully received upload instead.
+    """
+
+    def __init__(
+        self,
+        *,
+        sample_rate: int,
+        max_in_memory_samples: int | None,
+        offset: float,
+        duration: float | None,
+        channel: int | None,
+    ) -> None:
+        self.offset = offset
+        self.duration = duration
+        self.channel = channel
+        self._pipe = _UploadPipe()
+        self._future = Future[np.typing.NDArray[np.float32]]()
+        threading.Thread(
+            target=self._decode, args=(sample_rate, max_in_memory_samples), name="upload-decoder", daemon=True
+        ).start()
+
+    def _decode(self, sample_rate: int, max_in_memory_samples: int | None) -> None:
+        try:
+            audio = decode_audio(
+                cast("BinaryIO", self._pipe),
+                sample_rate=sample_rate,
+                max_in_memory_samples=max_in_memory_samples,
+                offset=self.offset,
+                duration=self.duration,
+                channel=self.channel,
+            )
+        except Exception as e:  # noqa: BLE001
+            self._future.set_exception(e)
+        else:
+            self._future.set_result(audio)
+
+    def feed(self, data: bytes) -> None:
+        self._pipe.write_chunk(data)
+
+    def finish(self) -> None:
+        self._pipe.close_for_writing()
+
+    def abort(self) -> None:
+        self._pipe.close_for_writing(aborted=True)
+
+    def decoded_audio(
+        self, *, offset: float, duration: float | None, channel: int | None
+    ) -> np.typing.NDArray[np.float32] | None:
+        """Wait for decoding to finish and return the audio, or `None` if the upload has to be decoded again."""
+        if (offset, duration, channel) != (self.offset, self.duration, self.channel):
+            # the form fields were sent after the file
+            self.abort()
+            return None
+        try:
+            audio = self._future.result()
+        except Exception:
+            logger.debug("Decoding the upload while receiving it failed", exc_info=True)
+            return None
+        if len(audio) == 0:
+            logger.debug("Decoding the upload while receiving it didn't produce any audio")
+            return None
+        return audio
+
+
+class AudioUploadFile(UploadFile):
+    """An `UploadFile` that is also being decoded while it's received."""
+
+    def __init__(self, upload_file: UploadFile, decoder: StreamingDecoder) -> None:
+        super().__init__(
+            upload_file.file, size=upload_file.size, filename=upload_file.filename, headers=upload_file.headers
+        )
+        self.decoder = decoder
+
+
+class _AudioUploadParser(MultiPartParser):
+    """Hands the bytes of the `file` part to a `StreamingDecoder` as they are parsed, in addition to spooling them like `MultiPartParser` does."""
+
+    def __init__(
+        self,
+        headers: Headers,
+        stream: AsyncGenerator[bytes],
+        *,
+        max_files: float,
+        max_fields: float,
+        max_part_size: int,
+        sample_rate: int,
+        max_in_memory_samples: int | None,
+    ) -> None:
+        super().__init__(headers, stream, max_files=max_files, max_fields=max_fields, max_part_size=max_part_size)
+        self._sample_rate = sample_rate
+        self._max_in_memory_samples = max_in_memory_samples
+        self._decoders: list[StreamingDecoder] = []
+
+    def on_headers_finished(self) -> None:
+        super().on_headers_finished()
+        part = self._current_part
+        if part.file is None or part.field_name != "file" or part.file.content_type in RAW_PCM_CONTENT_TYPES:
+            return
+        # only the fields sent before the file are known at this point
+        fields = {name: value for name, value in self.items if isinstance(value, str)}
+        try:
+            offset = float(fields.get("offset", 0.0))
+            duration = float(fields["duration"]) if "duration" in fields else None
+            channel = int(fields["channel"]) if "channel" in fields else None
+        except ValueError:
+            return  # rejected by the request validation later on
+        if fields.get("split_channels", "false").lower() not in ("false", "0"):
+            return
+        decoder = StreamingDecoder(
+            sample_rate=self._sample_rate,
+            max_in_memory_samples=self._max_in_memory_samples,
+            offset=offset,
+            duration=duration,
+            channel=channel,
+        )
+        self._decoders.append(decoder)
+        part.file = AudioUploadFile(part.file, decoder)
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        super().on_part_data(data, start, end)
+        if isinstance(self._current_part.file, AudioUploadFile):
+            self._current_part.file.decoder.feed(data[start:end])
+
+    def on_part_end(self) -> None:
+        super().on_part_end()
+        if isinstance(self._current_part.file, AudioUploadFile):
+            self._current_part.file.decoder.finish()
+
+    async def parse(self) -> FormData:
+        try:
+            return await super().parse()
+        except BaseException:
+            # e.g. the client disconnected, don't leave the decoders waiting for more bytes
+            for decoder in self._decoders:
+                decoder.abort()
+            raise
+
+
+class AudioUploadRequest(Request):
+    """A `Request` whose multipart form parsing starts decoding the uploaded audio file before the whole body has been received."""
+
+    def __init__(self, scope: Scope, receive: Receive, *, sample_rate: int, max_in_memory_samples: int | None) -> None:
+        super().__init__(scope, receive)
+        self._sample_rate = sample_rate
+        self._max_in_memory_samples = max_in_memory_samples
+
+    async def _get_form(
+        self, *, max_files: float = 1000, max_fields: float = 1000, max_part_size: int = 1024 * 1024
+    ) -> FormData:
+        if self._form is None and self.headers.get("Content-Type", "").startswith("multipart/form-data"):
+            parser = _AudioUploadParser(
+                self.headers,
+                self.stream(),
+                max_files=max_files,
+                max_fields=max_fields,
+                max_part_size=max_part_size,
+                sample_rate=self._sample_rate,
+                max_in_memory_samples=self._max_in_memory_samples,
+            )
+            try:
+                self._form = await parser.parse()
+            except MultiPartException as e:
+                raise HTTPException(status_code=400, detail=e.message) from e
+        return await super()._get_form(max_files=max_files, max_fields=max_fields, max_part_size=max_part_size)
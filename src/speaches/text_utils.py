@@ -58,6 +58,28 @@ def format_as_srt(text: str, start: float, end: float, i: int) -> str:
 
 MIN_SENTENCE_LENGTH = 20
 
+# a sentence ends at `.`, `!` or `?` (optionally followed by closing quotes/brackets) followed by whitespace, or at a line break
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?])\s+|(?<=[.!?][\"')\]])\s+|\s*\n\s*")
+
+
+def split_sentences(text: str, min_sentence_length: int = MIN_SENTENCE_LENGTH) -> list[str]:
+    """Split complete text into sentences, merging sentences shorter than `min_sentence_length` into the next one."""
+    sentences = []
+    accumulated_text = ""
+    for sentence in SENTENCE_BOUNDARY_PATTERN.split(text):
+        if not sentence.strip():
+            continue
+        accumulated_text = f"{accumulated_text} {sentence.strip()}" if accumulated_text else sentence.strip()
+        if len(accumulated_text) >= min_sentence_length:
+            sentences.append(accumulated_text)
+            accumulated_text = ""
+    if accumulated_text:
+        if sentences and len(accumulated_text) < min_sentence_length:
+            sentences[-1] = f"{sentences[-1]} {accumulated_text}"
+        else:
+            sentences.append(accumulated_text)
+    return sentences
+
 
 # TODO: Add tests
 # TODO: take into account various sentence endings like "..."
@@ -134,6 +156,155 @@ class SentenceChunker:
                 await self._new_token_event.wait()
 
 
+FIRST_CHUNK_MIN_WORDS = 4
+SENTENCE_ENDINGS = frozenset(".!?…")
+CLAUSE_ENDINGS = frozenset(",;:—")
+# characters that may follow a sentence ending and still belong to the sentence, e.g. `"Yes." He said.`
+CLOSING_CHARACTERS = frozenset("\"')]}”’»")  # noqa: RUF001
+# characters that may precede a word, e.g. `("Dr. Smith")`
+OPENING_CHARACTERS = "\"'([{“‘«"  # noqa: RUF001
+# lowercase and without the trailing period. `etc` isn't included as it usually ends the sentence
+ABBREVIATIONS = frozenset(
+    {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "vs", "e.g", "i.e", "cf", "approx", "fig", "vol"}
+)
+# abbreviations that are also common words, so they're only treated as such when followed by a number, as in "No. 5"
+NUMBER_ABBREVIATIONS = frozenset({"no"})
+
+
+def is_abbreviation_or_number(word: str, is_first_word_of_line: bool) -> bool:
+    """Whether a period directly after `word` is not the end of a sentence."""
+    word = word.lstrip(OPENING_CHARACTERS).lower()
+    if word in ABBREVIATIONS:
+        return True
+    # an initial, as in "J. R. R. Tolkien"
+    if len(word) == 1 and word.isalpha():
+        return True
+    # a numbered list item, as in "1. First"
+    return is_first_word_of_line and word.isdigit()
+
+
+class ClauseChunker:
+    """A text chunker that yields the first chunk as early as possible and then full sentences.
+
+    Intended for streaming the output of a language model into a speech model. The time until the first audio is dominated by how long it takes for the first chunk to be complete, so the first chunk ends at the first clause boundary (`,`, `;`, `:`) once it has at least `first_chunk_min_words` words, or at the end of the first sentence, whichever comes first. Later chunks end at sentence boundaries and are at least `min_sentence_length` characters long, as longer inputs result in more natural prosody.
+
+    Periods that are part of abbreviations ("Dr."), initials ("J. R. R. Tolkien"), numbers ("3.14") and numbered list items ("1.") don't end a sentence. Each character is scanned once, as tokens are added, rather than searching the accumulated text on every new token.
+
+    Implements the TextChunker protocol.
+    """
+
+    def __init__(
+        self, first_chunk_min_words: int = FIRST_CHUNK_MIN_WORDS, min_sentence_length: int = MIN_SENTENCE_LENGTH
+    ) -> None:
+        self._first_chunk_min_words = first_chunk_min_words
+        self._min_sentence_length = min_sentence_length
+        self._is_closed = False
+        self._new_token_event = asyncio.Event()
+        # the text that hasn't been yielded yet
+        self._buffer = ""
+        # everything before this index has been scanned
+        self._scan_index = 0
+        self._word_start: int | None = None
+        self._word_count = 0
+        self._is_first_word_of_line = True
+        self._is_first_chunk = True
+        self._chunks: list[str] = []
+
+    def add_token(self, token: str) -> None:
+        """Add a token (text chunk) to the chunker."""
+        if self._is_closed:
+            raise RuntimeError("Cannot add tokens to a closed ClauseChunker")
+
+        self._buffer += token
+        self._scan()
+        self._new_token_event.set()
+
+    def close(self) -> None:
+        """Close the chunker, preventing further token additions."""
+        self._is_closed = True
+        self._scan()
+        if self._buffer.strip():
+            self._chunks.append(self._buffer.strip())
+        self._buffer = ""
+        self._new_token_event.set()
+
+    def _scan(self) -> None:
+        buffer = self._buffer
+        i = self._scan_index
+        while i < len(buffer):
+            char = buffer[i]
+            if char.isspace():
+                if self._word_start is not None:
+                    self._word_start = None
+                    self._is_first_word_of_line = False
+                if char == "\n":
+                    self._is_first_word_of_line = True
+                    if self._emit(i, is_sentence_end=True):
+                        buffer, i = self._buffer, 0
+                        continue
+                i += 1
+                continue
+            if self._word_start is None:
+                self._word_start = i
+                self._word_count += 1
+
+            if char in SENTENCE_ENDINGS or char in CLAUSE_ENDINGS:
+                end = i + 1
+                while end < len(buffer) and buffer[end] in CLOSING_CHARACTERS:
+                    end += 1
+                if end == len(buffer) and not self._is_closed:
+                    # whether this is a boundary depends on the next character
+                    break
+                word = buffer[self._word_start : i]
+                is_abbreviation = char == "." and is_abbreviation_or_number(word, self._is_first_word_of_line)
+                if char == "." and word.lstrip(OPENING_CHARACTERS).lower() in NUMBER_ABBREVIATIONS:
+                    next_word_start = end
+                    while next_word_start < len(buffer) and buffer[next_word_start].isspace():
+                        next_word_start += 1
+                    if next_word_start == len(buffer) and not self._is_closed:
+                        # whether this is a boundary depends on the next word
+                        break
+                    is_abbreviation = next_word_start < len(buffer) and buffer[next_word_start].isdigit()
+                if (end == len(buffer) or buffer[end].isspace()) and not is_abbreviation:
+                    if self._emit(end, is_sentence_end=char in SENTENCE_ENDINGS):
+                        buffer, i = self._buffer, 0
+                        continue
+                i = end
+                continue
+            i += 1
+        self._scan_index = i
+
+    def _emit(self, end: int, *, is_sentence_end: bool) -> bool:
+        """Yield `self._buffer[:end]` if it should be a chunk of its own. Returns whether it was."""
+        chunk = self._buffer[:end].strip()
+        if not chunk:
+            return False
+        if self._is_first_chunk:
+            should_emit = is_sentence_end or self._word_count >= self._first_chunk_min_words
+        else:
+            should_emit = is_sentence_end and len(chunk) >= self._min_sentence_length
+        if not should_emit:
+            return False
+        self._chunks.append(chunk)
+        self._buffer = self._buffer[end:]
+        self._scan_index = 0
+        self._word_start = None
+        self._word_count = 0
+        self._is_first_chunk = False
+        return True
+
+    async def __aiter__(self) -> AsyncGenerator[str]:
+        while True:
+            while self._chunks:
+                yield self._chunks.pop(0)
+            if self._is_closed:
+                return
+
+            # Wait for more content
+            self._new_token_event.clear()
+            await self._new_token_event.wait()
+
+
 def strip_emojis(text: str) -> str:
     # Get all emoji unicode characters
     emoji_pattern = re.compile(
@@ -0,0 +1,203 @@
+from collections import OrderedDict
+from collections.abc import Generator
+import hashlib
+import json
+import logging
+from pathlib import Path
+import tempfile
+import threading
+import unicodedata
+
+import numpy as np
+from opentelemetry import metrics
+
+from speaches.audio import Audio
+from speaches.config import TtsCacheConfig
+from speaches.executors.shared.handler_protocol import SpeechRequest
+
+logger = logging.getLogger(__name__)
+
+meter = metrics.get_meter(__name__)
+hits_counter = meter.create_counter("tts_cache.hits", description="Speech requests served from the TTS cache")
+misses_counter = meter.create_counter("tts_cache.misses", description="Speech requests that had to be synthesized")
+evictions_counter = meter.create_counter("tts_cache.evictions", description="Entries evicted from the TTS cache")
+
+DISK_ENTRY_SUFFIX = ".npz"
+
+
+def normalize_text(text: str) -> str:
+    """Normalize the input text so that trivially different spellings of the same prompt share a cache entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(request: SpeechRequest) -> str:
+    data = {
+        "model": request.model,
+        "voice": request.voice,
+        "speed": request.speed,
+        "text": normalize_text(request.text),
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+class TtsCacheEntry:
+    """Synthesized audio, kept as the int16 chunks it was generated in so that a hit streams just like a miss would."""
+
+    def __init__(self, chunks: list[np.typing.NDArray[np.int16]], sample_rate: int) -> None:
+        self.chunks = chunks
+        self.sample_rate = sample_rate
+
+    @property
+    def size_in_bytes(self) -> int:
+        return sum(chunk.nbytes for chunk in self.chunks)
+
+    def to_audio(self) -> Generator[Audio]:
+        for chunk in self.chunks:
+            yield Audio(chunk, sample_rate=self.sample_rate)
+
+
+class TtsCache:
+    """Two tier (memory and disk) LRU cache of synthesized speech.
+
+    Both tiers are bounded by their total size in bytes. Disk hits are promoted to the memory tier, and entries evicted from the memory tier remain available on disk.
+    """
+
+    def __init__(self, config: TtsCacheConfig) -> None:
+        self.config = config
+        self._memory_max_size = int(config.memory_max_size_mb * 1024 * 1024)
+        self._disk_max_size = int(config.disk_max_size_mb * 1024 * 1024)
+        self._memory: OrderedDict[str, TtsCacheEntry] = OrderedDict()
+        self._memory_size = 0
+        # key -> file size, least recently used first
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        if config.disk_path is not None:
+            config.disk_path.mkdir(parents=True, exist_ok=True)
+            self._load_disk_index(config.disk_path)
+
+    def _load_disk_index(self, disk_path: Path) -> None:
+        stats = [(path, path.stat()) for path in disk_path.glob(f"*{DISK_ENTRY_SUFFIX}")]
+        for path, stat in sorted(stats, key=lambda x: x[1].st_mtime):
+            self._disk[path.stem] = stat.st_size
+            self._disk_size += stat.st_size
+        logger.info(
+            f"Loaded {len(self._disk)} TTS cache entries ({self._disk_size / 1024 / 1024:.1f}MB) from {disk_path}"
+        )
+        for evicted_key in self._evict_disk():
+            self._disk_entry_path(evicted_key).unlink(missing_ok=True)
+
+    def _disk_entry_path(self, key: str) -> Path:
+        assert self.config.disk_path is not None
+        return self.config.disk_path / f"{key}{DISK_ENTRY_SUFFIX}"
+
+    def get(self, key: str) -> TtsCacheEntry | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                hits_counter.add(1, {"tier": "memory"})
+                return entry
+            in_disk_tier = key in self._disk
+            if in_disk_tier:
+                self._disk.move_to_end(key)
+        if in_disk_tier:
+            entry = self._read_disk_entry(key)
+            if entry is not None:
+                hits_counter.add(1, {"tier": "disk"})
+                with self._lock:
+                    self._put_memory(key, entry)
+                return entry
+        misses_counter.add(1)
+        return None
+
+    def put(self, key: str, entry: TtsCacheEntry) -> None:
+        with self._lock:
+            self._put_memory(key, entry)
+        if self.config.disk_path is not None:
+            self._write_disk_entry(key, entry)
+
+    def cached(self, request: SpeechRequest, audio_generator: Generator[Audio]) -> Generator[Audio]:
+        """Serve `request` from the cache, or pass `audio_generator` through while storing its output.
+
+        `audio_generator` isn't started on a hit. On a miss, the output is only stored once it has been fully consumed, so requests that fail or get cancelled part way through don't leave truncated entries behind.
+        """
+        if len(request.text) > self.config.max_input_length:
+            yield from audio_generator
+            return
+        key = cache_key(request)
+        entry = self.get(key)
+        if entry is not None:
+            audio_generator.close()
+            yield from entry.to_audio()
+            return
+
+        chunks: list[np.typing.NDArray[np.int16]] = []
+        sample_rate = None
+        for audio in audio_generator:
+            if sample_rate is None:
+                sample_rate = audio.sample_rate
+            elif audio.sample_rate != sample_rate:
+                sample_rate = -1  # shouldn't happen, but if it does the output can't be stored as a single entry
+            chunks.append(audio.as_int16())
+            yield audio
+        if sample_rate is not None and sample_rate > 0:
+            self.put(key, TtsCacheEntry(chunks, sample_rate))
+
+    def _put_memory(self, key: str, entry: TtsCacheEntry) -> None:
+        if entry.size_in_bytes > self._memory_max_size:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= previous.size_in_bytes
+        self._memory[key] = entry
+        self._memory_size += entry.size_in_bytes
+        while self._memory_size > self._memory_max_size:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= evicted.size_in_bytes
+            evictions_counter.add(1, {"tier": "memory"})
+
+    def _read_disk_entry(self, key: str) -> TtsCacheEntry | None:
+        path = self._disk_entry_path(key)
+        try:
+            with np.load(path) as data:
+                sample_rate = int(data["sample_rate"])
+                samples = data["samples"]
+                chunks = np.split(samples, np.cumsum(data["chunk_sizes"])[:-1])
+            path.touch()  # keeps the LRU order across restarts
+        except (OSError, ValueError, KeyError):
+            logger.warning(f"Failed to read TTS cache entry {path}, removing it", exc_info=True)
+            with self._lock:
+                self._disk_size -= self._disk.pop(key, 0)
+            path.unlink(missing_ok=True)
+            return None
+        return TtsCacheEntry(chunks, sample_rate)
+
+    def _write_disk_entry(self, key: str, entry: TtsCacheEntry) -> None:
+        path = self._disk_entry_path(key)
+        assert self.config.disk_path is not None
+        # write to a temporary file first so that a crash (or a concurrent reader) never sees a partially written entry
+        with tempfile.NamedTemporaryFile(dir=self.config.disk_path, suffix=".tmp", delete=False) as f:
+            np.savez(
+                f,
+                sample_rate=entry.sample_rate,
+                chunk_sizes=np.array([len(chunk) for chunk in entry.chunks]),
+                samples=np.concatenate(entry.chunks) if entry.chunks else np.empty(0, dtype=np.int16),
+            )
+        Path(f.name).replace(path)
+        size = path.stat().st_size
+        with self._lock:
+            self._disk_size += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            evicted_keys = self._evict_disk()
+        for evicted_key in evicted_keys:
+            self._disk_entry_path(evicted_key).unlink(missing_ok=True)
+
+    def _evict_disk(self) -> list[str]:
+        evicted_keys = []
+        while self._disk_size > self._disk_max_size and self._disk:
+            evicted_key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            evicted_keys.append(evicted_key)
+            evictions_counter.add(1, {"tier": "disk"})
+        return evicted_keys
@@ -14,6 +14,7 @@ from openai.types.beta.realtime import (
     InputAudioBufferClearEvent,
     InputAudioBufferCommitEvent,
     RateLimitsUpdatedEvent,
+    RealtimeResponseStatus,
     ResponseCancelEvent,
     ResponseCreateEvent,
 )
@@ -209,6 +210,7 @@ class RealtimeResponse(BaseModel):
     status: Literal["completed", "cancelled", "failed", "incomplete"]
     output: list[ServerConversationItem]
     modalities: list[Literal["text", "audio"]]
+    status_details: RealtimeResponseStatus | None = None
     object: Literal["realtime.response"] = "realtime.response"
     # TODO: add and support additional fields
 
@@ -232,6 +234,8 @@ class TurnDetection(BaseModel):
     silence_duration_ms: int
     threshold: float = Field(..., ge=0.0, le=1.0)
     type: Literal["server_vad"] = "server_vad"
+    # whether the response being generated is cancelled when the user starts speaking
+    interrupt_response: bool = True
 
 
 class InputAudioTranscription(BaseModel):
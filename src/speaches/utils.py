@@ -1,6 +1,4 @@
-import asyncio
 import base64
-from collections.abc import AsyncGenerator, Generator
 from datetime import UTC, datetime
 import io
 import logging
@@ -63,52 +61,6 @@ def format_api_proxy_error(exc: "APIProxyError", context: str = "") -> str:
     return f"[ERROR] {user_message}\nSuggestions: {', '.join(suggestions)}" + (f"\n{debug_info}" if debug_info else "")
 
 
-def async_to_sync_generator[T](async_gen: AsyncGenerator[T]) -> Generator[T]:
-    try:
-        # Try to get the current event loop
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        # No running loop, create a new one
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        should_close_loop = True
-    else:
-        should_close_loop = False
-
-    try:
-        while True:
-            try:
-                # Get the next item from the async generator
-                if should_close_loop:
-                    item = loop.run_until_complete(async_gen.__anext__())
-                else:
-                    # If there's already a running loop, we need to run in a thread
-                    import concurrent.futures
-
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                        future = executor.submit(asyncio.run, async_gen.__anext__())
-                        item = future.result()
-                yield item
-            except StopAsyncIteration:
-                break
-    finally:
-        # Clean up the async generator
-        try:
-            if should_close_loop:
-                loop.run_until_complete(async_gen.aclose())
-            else:
-                import concurrent.futures
-
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(asyncio.run, async_gen.aclose())
-                    future.result()
-        except Exception:  # noqa: BLE001, S110
-            pass  # Ignore cleanup errors
-
-        if should_close_loop:
-            loop.close()
-
-
 # TODO: maybe add length validation. gte 2s lte 10s
 def parse_data_url_to_audio(data_url: str) -> np.typing.NDArray[np.float32]:
     if not data_url.startswith("data:"):
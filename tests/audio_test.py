@@ -0,0 +1,158 @@
+from collections.abc import Generator
+import io
+from typing import get_args
+
+import av
+from faster_whisper.audio import decode_audio as faster_whisper_decode_audio
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+import soundfile as sf
+
+from speaches.api_types import SpeechResponseFormat
+from speaches.audio import Audio, AudioBuffer, AudioEncoder, decode_audio, stream_audio_as_formatted_bytes
+
+
+def test_audio_buffer_append() -> None:
+    buffer = AudioBuffer(np.int16, initial_capacity=4)
+    for start in range(0, 100, 7):
+        buffer.append(np.arange(start, min(start + 7, 100), dtype=np.int16))
+    np.testing.assert_array_equal(buffer.data, np.arange(100))
+    np.testing.assert_array_equal(buffer.tail(5), np.arange(95, 100))
+    np.testing.assert_array_equal(buffer.tail(1000), np.arange(100))
+    np.testing.assert_array_equal(buffer.slice(10, 20), np.arange(10, 20))
+    np.testing.assert_array_equal(buffer.slice(90), np.arange(90, 100))
+
+
+def test_audio_buffer_views_survive_appends() -> None:
+    buffer = AudioBuffer(np.float32, initial_capacity=4)
+    buffer.append(np.ones(4, dtype=np.float32))
+    view = buffer.data
+    buffer.append(np.zeros(100, dtype=np.float32))
+    np.testing.assert_array_equal(view, np.ones(4))
+
+
+def test_audio_buffer_max_size() -> None:
+    buffer = AudioBuffer(np.int16, initial_capacity=4, max_size=10)
+    for start in range(0, 100, 3):
+        buffer.append(np.arange(start, min(start + 3, 100), dtype=np.int16))
+    assert len(buffer) == 10
+    assert buffer.total_size == 100
+    np.testing.assert_array_equal(buffer.data, np.arange(90, 100))
+    np.testing.assert_array_equal(buffer.slice(92, 95), np.arange(92, 95))
+    with pytest.raises(ValueError, match="no longer retained"):
+        buffer.slice(80, 95)
+
+
+def test_audio_extend() -> None:
+    audio = Audio(np.zeros(10, dtype=np.float32), sample_rate=16000)
+    audio.extend(np.ones(10, dtype=np.float32))
+    audio.data = audio.data[5:]
+    audio.extend(np.full(10, 2, dtype=np.float32))
+    np.testing.assert_array_equal(audio.data, np.concatenate([np.zeros(5), np.ones(10), np.full(10, 2)]))
+
+
+def test_audio_int16_storage() -> None:
+    samples = np.array([0, 16384, -32768, 32767], dtype=np.int16)
+    audio = Audio(samples, sample_rate=16000)
+    assert audio.size_in_bytes == samples.nbytes
+    assert audio.as_bytes() == samples.tobytes()
+    assert audio.data.dtype == np.float32
+    np.testing.assert_allclose(audio.data, [0.0, 0.5, -1.0, 32767 / 32768])
+    assert audio.data is audio.data  # the float32 conversion is cached
+
+    audio.extend(np.array([0.5], dtype=np.float32))
+    assert audio.samples.dtype == np.int16
+    assert len(audio.data) == 5
+
+
+def sine_file(audio_format: str, seconds: float, channels: int = 1, sample_rate: int = 44100) -> bytes:
+    """A tone of a different frequency and amplitude on each channel."""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    samples = np.stack([0.5 / (i + 1) * np.sin(2 * np.pi * 440 / (i + 1) * t) for i in range(channels)], axis=1)
+    file = io.BytesIO()
+    sf.write(file, samples.astype(np.float32), sample_rate, format=audio_format)
+    return file.getvalue()
+
+
+@pytest.mark.parametrize("audio_format", ["WAV", "FLAC", "MP3", "OGG"])
+@pytest.mark.parametrize("channels", [1, 2])
+def test_decode_audio_matches_faster_whisper(audio_format: str, channels: int) -> None:
+    data = sine_file(audio_format, 3, channels)
+
+    audio = decode_audio(io.BytesIO(data))
+    expected = faster_whisper_decode_audio(io.BytesIO(data))
+    assert audio.dtype == np.float32
+    assert len(audio) == len(expected)
+    # faster-whisper decodes to 16-bit samples
+    np.testing.assert_allclose(audio, expected, atol=2 / 32768)
+
+
+def test_decode_webm_opus() -> None:
+    # what browsers record with `MediaRecorder`
+    t = np.arange(48000 * 3) / 48000
+    frame = av.AudioFrame.from_ndarray(
+        (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32).reshape(1, -1), format="flt", layout="mono"
+    )
+    frame.sample_rate = 48000
+    file = io.BytesIO()
+    with av.open(file, mode="w", format="webm") as container:
+        stream = container.add_stream("libopus", rate=48000, layout="mono")
+        for resampled_frame in av.AudioResampler(format=stream.format.name, layout="mono", rate=48000).resample(frame):
+            container.mux(stream.encode(resampled_frame))
+        container.mux(stream.encode(None))
+
+    audio = decode_audio(io.BytesIO(file.getvalue()))
+    expected = faster_whisper_decode_audio(io.BytesIO(file.getvalue()))
+    assert len(audio) == len(expected)
+    np.testing.assert_allclose(audio, expected, atol=2 / 32768)
+
+
+def sine_chunks(sample_rate: int, num_chunks: int) -> Generator[Audio]:
+    chunk_size = sample_rate // 10
+    for i in range(num_chunks):
+        t = np.arange(i * chunk_size, (i + 1) * chunk_size) / sample_rate
+        yield Audio(0.5 * np.sin(2 * np.pi * 440 * t).astype(np.float32), sample_rate)
+
+
+@pytest.mark.parametrize("response_format", get_args(SpeechResponseFormat.__value__))
+def test_stream_audio_as_formatted_bytes(response_format: SpeechResponseFormat) -> None:
+    data = b"".join(stream_audio_as_formatted_bytes(sine_chunks(24000, 10), response_format, 16000))
+
+    if response_format == "pcm":
+        assert len(data) == 16000 * 2
+        return
+    with av.open(io.BytesIO(data), mode="r") as container:
+        stream = container.streams.audio[0]
+        num_samples = sum(frame.samples for frame in container.decode(audio=0))
+        # Opus is always decoded at 48kHz, whatever rate it was encoded at
+        assert stream.sample_rate == (48000 if response_format == "opus" else 16000)
+    # lossy codecs pad the start and the end of the audio with up to a frame or two of silence
+    assert num_samples / stream.sample_rate == pytest.approx(1.0, abs=0.1)
+
+
+def failing_sine_chunks(sample_rate: int, num_chunks: int) -> Generator[Audio]:
+    yield from sine_chunks(sample_rate, num_chunks)
+    raise RuntimeError("synthesis failed")
+
+
+def test_stream_audio_as_formatted_bytes_releases_the_encoder(mocker: MockerFixture) -> None:
+    discard = mocker.spy(AudioEncoder, "discard")
+
+    # the client went away
+    stream = stream_audio_as_formatted_bytes(sine_chunks(24000, 10), "mp3")
+    next(stream)
+    stream.close()
+    assert discard.call_count == 1
+
+    with pytest.raises(RuntimeError):
+        b"".join(stream_audio_as_formatted_bytes(failing_sine_chunks(24000, 10), "mp3"))
+    assert discard.call_count == 2
+
+
+def test_decode_audio_memory_mapped() -> None:
+    data = sine_file("WAV", 3)
+    expected = decode_audio(io.BytesIO(data))
+    audio = decode_audio(io.BytesIO(data), max_in_memory_samples=16000)
+    assert isinstance(audio, np.memmap)
+    np.testing.assert_array_equal(audio, expected)
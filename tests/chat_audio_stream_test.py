@@ -0,0 +1,138 @@
+import asyncio
+import base64
+from collections.abc import AsyncGenerator, Callable, Coroutine
+
+import numpy as np
+from openai.types.chat import ChatCompletionChunk
+import pytest
+from pytest_mock import MockerFixture
+
+from speaches.audio import Audio
+from speaches.inprocess_clients import InProcessClientError, SpeechClient
+from speaches.routers.chat import SPEECH_LOOKAHEAD_SENTENCES, AudioChatStream, CompletionCreateParamsBase
+from speaches.state_store import InMemoryStateStore
+from speaches.text_utils import ClauseChunker
+
+NUM_SENTENCES = 6
+
+type Synthesize = Callable[[int, str], Coroutine[None, None, Audio]]
+
+
+def create_audio_chat_stream(mocker: MockerFixture, synthesize: Synthesize) -> AudioChatStream:
+    """Create a stream of `NUM_SENTENCES` sentences, whose audio is produced by `synthesize(call_index, text)`."""
+    call_index = 0
+
+    async def synthesize_sentence(text: str, **_kwargs: object) -> AsyncGenerator[Audio]:
+        nonlocal call_index
+        call_index += 1
+        yield await synthesize(call_index - 1, text)
+
+    speech_client = mocker.create_autospec(SpeechClient, instance=True)
+    speech_client.synthesize.side_effect = synthesize_sentence
+    chunker = ClauseChunker(first_chunk_min_words=1, min_sentence_length=1)
+    for i in range(NUM_SENTENCES):
+        chunker.add_token(f"This is sentence number {i}. ")
+    chunker.close()
+    body = CompletionCreateParamsBase.model_validate(
+        {
+            "model": "model",
+            "messages": [],
+            "modalities": ["text", "audio"],
+            "audio": {"voice": "alloy", "format": "pcm16"},
+            "stream": True,
+        }
+    )
+    stream = AudioChatStream(mocker.MagicMock(), speech_client, InMemoryStateStore(max_entries=16), chunker, body)
+    # normally set by the text stream
+    stream.chat_completion_id = "chatcmpl-1"
+    stream.created = 0
+    return stream
+
+
+def sentence_audio(i: int) -> Audio:
+    # the number of samples identifies the sentence
+    return Audio(np.zeros(i + 1, dtype=np.float32), sample_rate=24000)
+
+
+def sentence_index(chunk: ChatCompletionChunk) -> int:
+    audio = chunk.choices[0].delta.audio  # pyrefly: ignore[missing-attribute]
+    return len(base64.b64decode(audio["data"])) // 2 - 1
+
+
+async def yielded_sentences(stream: AudioChatStream) -> list[int]:
+    return [sentence_index(chunk) async for chunk in stream.audio_chat_completion_chunk_stream()]
+
+
+@pytest.mark.asyncio
+async def test_audio_is_yielded_in_order(mocker: MockerFixture) -> None:
+    finished: list[int] = []
+
+    async def synthesize(i: int, _text: str) -> Audio:
+        # the sentences within the look-ahead window finish in reverse order
+        await asyncio.sleep(0.01 * (1 + SPEECH_LOOKAHEAD_SENTENCES - i % (1 + SPEECH_LOOKAHEAD_SENTENCES)))
+        finished.append(i)
+        return sentence_audio(i)
+
+    stream = create_audio_chat_stream(mocker, synthesize)
+    assert await yielded_sentences(stream) == list(range(NUM_SENTENCES))
+    assert finished != sorted(finished)
+
+
+@pytest.mark.asyncio
+async def test_look_ahead_is_bounded(mocker: MockerFixture) -> None:
+    num_in_flight = 0
+    max_in_flight = 0
+
+    async def synthesize(i: int, _text: str) -> Audio:
+        nonlocal num_in_flight, max_in_flight
+        num_in_flight += 1
+        max_in_flight = max(max_in_flight, num_in_flight)
+        await asyncio.sleep(0.01)
+        num_in_flight -= 1
+        return sentence_audio(i)
+
+    stream = create_audio_chat_stream(mocker, synthesize)
+    assert await yielded_sentences(stream) == list(range(NUM_SENTENCES))
+    assert max_in_flight == 1 + SPEECH_LOOKAHEAD_SENTENCES
+
+
+@pytest.mark.asyncio
+async def test_failed_sentence_raises(mocker: MockerFixture) -> None:
+    async def synthesize(i: int, _text: str) -> Audio:
+        if i == 2:
+            raise InProcessClientError("Synthesis failed", 500)
+        return sentence_audio(i)
+
+    stream = create_audio_chat_stream(mocker, synthesize)
+    audio_chunks = stream.audio_chat_completion_chunk_stream()
+    assert [sentence_index(await anext(audio_chunks)) for _ in range(2)] == [0, 1]
+    with pytest.raises(InProcessClientError):
+        await anext(audio_chunks)
+
+
+@pytest.mark.asyncio
+async def test_closing_early_cancels_pending_sentences(mocker: MockerFixture) -> None:
+    started: list[int] = []
+    cancelled: list[int] = []
+
+    async def synthesize(i: int, _text: str) -> Audio:
+        started.append(i)
+        if i == 0:
+            return sentence_audio(i)
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.append(i)
+            raise
+        return sentence_audio(i)
+
+    stream = create_audio_chat_stream(mocker, synthesize)
+    audio_chunks = stream.audio_chat_completion_chunk_stream()
+    await anext(audio_chunks)
+    # let the sentences within the look-ahead window start
+    await asyncio.sleep(0.01)
+    await audio_chunks.aclose()
+    await asyncio.sleep(0)
+
+    assert started == list(range(1 + SPEECH_LOOKAHEAD_SENTENCES))
+    assert cancelled == started[1:]
@@ -0,0 +1,101 @@
+import asyncio
+import base64
+import io
+from pathlib import Path
+
+from fastapi import HTTPException
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+import soundfile as sf
+
+from speaches.audio import Audio
+from speaches.inprocess_clients import TranscriptionClient
+from speaches.routers.chat import (
+    AUDIO_TRANSCRIPTS_NAMESPACE,
+    ChatCompletionContentPartTextParam,
+    CompletionCreateParamsBase,
+    prepare_messages,
+    save_audio_transcript,
+)
+from speaches.state_store import InMemoryStateStore, SqliteStateStore
+
+
+def wav_base64(seconds: float) -> str:
+    file = io.BytesIO()
+    sf.write(file, np.zeros(int(seconds * 16000), dtype=np.float32), samplerate=16000, format="wav")
+    return base64.b64encode(file.getvalue()).decode("utf-8")
+
+
+def transcripts(body: CompletionCreateParamsBase) -> list[str]:
+    transcripts: list[str] = []
+    for message in body.messages:
+        assert isinstance(message.content, list)
+        [content_part] = message.content
+        assert isinstance(content_part, ChatCompletionContentPartTextParam)
+        transcripts.append(content_part.text)
+    return transcripts
+
+
+def create_body(durations: list[float]) -> CompletionCreateParamsBase:
+    return CompletionCreateParamsBase.model_validate(
+        {
+            "model": "model",
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [{"type": "input_audio", "input_audio": {"data": wav_base64(d), "format": "wav"}}],
+                }
+                for d in durations
+            ],
+        }
+    )
+
+
+@pytest.mark.asyncio
+async def test_input_audio_is_transcribed_concurrently_and_cached(mocker: MockerFixture) -> None:
+    num_active = 0
+    max_active = 0
+
+    async def transcribe(audio: Audio, *, model: str) -> str:  # noqa: ARG001
+        nonlocal num_active, max_active
+        num_active += 1
+        max_active = max(max_active, num_active)
+        await asyncio.sleep(0.05)
+        num_active -= 1
+        return f"{audio.duration:.1f} seconds"
+
+    transcription_client = mocker.create_autospec(TranscriptionClient, instance=True)
+    transcription_client.transcribe.side_effect = transcribe
+    state_store = InMemoryStateStore(max_entries=16)
+    body = create_body([1.0, 2.0, 3.0])
+    await prepare_messages(body, transcription_client, state_store)
+    assert transcripts(body) == ["1.0 seconds", "2.0 seconds", "3.0 seconds"]
+    assert max_active > 1
+
+    # the history is resent along with a new message, only the new audio gets transcribed
+    body = create_body([1.0, 2.0, 3.0, 4.0])
+    await prepare_messages(body, transcription_client, state_store)
+    assert transcription_client.transcribe.await_count == 4
+
+
+@pytest.mark.asyncio
+async def test_unknown_assistant_audio_id(mocker: MockerFixture) -> None:
+    body = CompletionCreateParamsBase.model_validate(
+        {"model": "model", "messages": [{"role": "assistant", "audio": {"id": "audio_unknown"}}]}
+    )
+    with pytest.raises(HTTPException) as exc_info:
+        await prepare_messages(
+            body, mocker.create_autospec(TranscriptionClient, instance=True), InMemoryStateStore(max_entries=16)
+        )
+    assert exc_info.value.status_code == 400
+
+
+def test_audio_transcripts_are_shared_with_other_workers(tmp_path: Path) -> None:
+    worker = SqliteStateStore(tmp_path / "state.db", flush_interval_ms=60_000, max_batch_size=256)
+    other_worker = SqliteStateStore(tmp_path / "state.db", flush_interval_ms=60_000, max_batch_size=256)
+    save_audio_transcript(worker, "audio_1", "Hello there")
+    # committed right away rather than with the next batch
+    assert other_worker.get(AUDIO_TRANSCRIPTS_NAMESPACE, "audio_1") == "Hello there"
+    worker.close()
+    other_worker.close()
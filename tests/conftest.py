@@ -14,8 +14,12 @@ import pytest_asyncio
 from pytest_mock import MockerFixture
 
 from speaches.config import Config, WhisperConfig
+from speaches.decode_pool import DecodePool
 from speaches.dependencies import get_config
+from speaches.inprocess_clients import SpeechClient, TranscriptionClient
 from speaches.main import create_app
+from speaches.state_store import create_state_store
+from speaches.tts_cache import TtsCache
 
 DISABLE_LOGGERS = ["multipart.multipart", "faster_whisper"]
 OPENAI_BASE_URL = "https://api.openai.com/v1"
@@ -70,7 +74,20 @@ async def aclient_factory(mocker: MockerFixture) -> AclientFactory:
         # NOTE: all calls to `get_config` should be patched. One way to test that this works is to update the original `get_config` to raise an exception and see if the tests fail
         mocker.patch("speaches.dependencies.get_config", return_value=config)
         mocker.patch("speaches.main.get_config", return_value=config)
-        mocker.patch("speaches.dependencies.get_executor_registry", return_value=ExecutorRegistry(config))
+        executor_registry = ExecutorRegistry(config)
+        mocker.patch("speaches.dependencies.get_executor_registry", return_value=executor_registry)
+        decode_pool = DecodePool(config.decode_workers) if config.decode_workers > 0 else None
+        mocker.patch("speaches.dependencies.get_decode_pool", return_value=decode_pool)
+        mocker.patch("speaches.main.get_decode_pool", return_value=decode_pool)
+        tts_cache = TtsCache(config.tts_cache) if config.tts_cache.enabled else None
+        mocker.patch("speaches.dependencies.get_tts_cache", return_value=tts_cache)
+        mocker.patch("speaches.dependencies.get_speech_client", return_value=SpeechClient(executor_registry, tts_cache))
+        mocker.patch(
+            "speaches.dependencies.get_transcription_client", return_value=TranscriptionClient(executor_registry)
+        )
+        state_store = create_state_store(config.state_store)
+        mocker.patch("speaches.dependencies.get_state_store", return_value=state_store)
+        mocker.patch("speaches.main.get_state_store", return_value=state_store)
         # NOTE: I couldn't get the following to work but it shouldn't matter
         # mocker.patch(
         #     "speaches.text_utils.Transcription._ensure_no_word_overlap.get_config", return_value=config
@@ -79,8 +96,14 @@ async def aclient_factory(mocker: MockerFixture) -> AclientFactory:
         app = create_app()
         # https://fastapi.tiangolo.com/advanced/testing-dependencies/
         app.dependency_overrides[get_config] = lambda: config
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test", timeout=TIMEOUT) as aclient:
-            yield aclient
+        try:
+            async with AsyncClient(
+                transport=ASGITransport(app=app), base_url="http://test", timeout=TIMEOUT
+            ) as aclient:
+                yield aclient
+        finally:
+            if decode_pool is not None:
+                decode_pool.shutdown()
 
     return inner
 
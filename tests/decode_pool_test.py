@@ -0,0 +1,46 @@
+from collections.abc import Generator
+import io
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from speaches.audio import decode_audio
+from speaches.decode_pool import DecodePool
+
+
+@pytest.fixture(scope="module")
+def decode_pool() -> Generator[DecodePool]:
+    decode_pool = DecodePool(2)
+    yield decode_pool
+    decode_pool.shutdown()
+
+
+def encode(audio_format: str) -> bytes:
+    t = np.arange(44100 * 3) / 44100
+    file = io.BytesIO()
+    sf.write(file, (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32), 44100, format=audio_format)
+    return file.getvalue()
+
+
+@pytest.mark.parametrize("audio_format", ["MP3", "OGG", "WAV"])
+def test_decode(decode_pool: DecodePool, audio_format: str) -> None:
+    data = encode(audio_format)
+    audio = decode_pool.decode(data)
+    assert not isinstance(audio, np.memmap)
+    np.testing.assert_array_equal(audio, decode_audio(io.BytesIO(data)))
+
+
+def test_decode_time_range(decode_pool: DecodePool) -> None:
+    data = encode("OGG")
+    np.testing.assert_array_equal(
+        decode_pool.decode(data, offset=0.5, duration=1.5), decode_audio(io.BytesIO(data), offset=0.5, duration=1.5)
+    )
+    assert len(decode_pool.decode(data, offset=10)) == 0
+
+
+def test_decode_memory_mapped(decode_pool: DecodePool) -> None:
+    data = encode("OGG")
+    audio = decode_pool.decode(data, max_in_memory_samples=16000)
+    assert isinstance(audio, np.memmap)
+    np.testing.assert_array_equal(audio, decode_audio(io.BytesIO(data)))
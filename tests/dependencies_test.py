@@ -0,0 +1,96 @@
+import io
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+import soundfile as sf
+from starlette.datastructures import Headers
+
+from speaches.audio import int16_to_float32
+from speaches.config import Config
+from speaches.dependencies import audio_channels_dependency, audio_file_dependency
+from tests.conftest import DEFAULT_CONFIG
+
+
+def upload_file(tmp_path: Path, data: bytes, filename: str, content_type: str) -> UploadFile:
+    path = tmp_path / filename
+    path.write_bytes(data)
+    return UploadFile(
+        path.open("rb"), size=len(data), filename=filename, headers=Headers({"content-type": content_type})
+    )
+
+
+def stereo_flac() -> tuple[bytes, np.typing.NDArray[np.float32]]:
+    """Three seconds of a different tone on each channel, at the sample rate the audio gets decoded to."""
+    t = np.arange(16000 * 3) / 16000
+    samples = np.stack([0.5 * np.sin(2 * np.pi * 440 * t), 0.25 * np.sin(2 * np.pi * 220 * t)], axis=1)
+    file = io.BytesIO()
+    sf.write(file, samples.astype(np.float32), 16000, format="FLAC")
+    return file.getvalue(), samples.T.astype(np.float32)
+
+
+def patch_config(mocker: MockerFixture, config: Config) -> None:
+    mocker.patch("speaches.dependencies.get_config", return_value=config)
+    mocker.patch("speaches.dependencies.get_decode_pool", return_value=None)
+
+
+@pytest.mark.parametrize("memmap_audio_threshold_seconds", [None, 0])
+def test_pcm_upload(tmp_path: Path, mocker: MockerFixture, memmap_audio_threshold_seconds: float | None) -> None:
+    patch_config(
+        mocker, DEFAULT_CONFIG.model_copy(update={"memmap_audio_threshold_seconds": memmap_audio_threshold_seconds})
+    )
+    samples = np.arange(-16000, 16000, dtype=np.int16)
+    file = upload_file(tmp_path, samples.tobytes(), "audio.pcm", "audio/pcm")
+
+    audio = audio_file_dependency(file, offset=0.25, duration=0.5)
+    # long audio is converted into a memory-mapped file, short audio is kept as int16
+    assert isinstance(audio.samples, np.memmap) == (memmap_audio_threshold_seconds is not None)
+    np.testing.assert_array_equal(audio.data, int16_to_float32(samples[4000:12000]))
+
+
+def test_time_range_and_channel(tmp_path: Path, mocker: MockerFixture) -> None:
+    patch_config(mocker, DEFAULT_CONFIG)
+    data, channels = stereo_flac()
+
+    audio = audio_file_dependency(
+        upload_file(tmp_path, data, "audio.flac", "audio/flac"), offset=1, duration=1.5, channel=1
+    )
+    np.testing.assert_allclose(audio.data, channels[1][16000:40000], atol=1e-4)
+
+    with pytest.raises(HTTPException) as exc_info:
+        audio_file_dependency(upload_file(tmp_path, data, "audio.flac", "audio/flac"), channel=2)
+    assert exc_info.value.status_code == 400
+
+
+def test_split_channels(tmp_path: Path, mocker: MockerFixture) -> None:
+    patch_config(mocker, DEFAULT_CONFIG)
+    data, channels = stereo_flac()
+
+    left, right = audio_channels_dependency(
+        upload_file(tmp_path, data, "audio.flac", "audio/flac"), offset=1, split_channels=True
+    )
+    np.testing.assert_allclose(left.data, channels[0][16000:], atol=1e-4)
+    np.testing.assert_allclose(right.data, channels[1][16000:], atol=1e-4)
+    assert left.name == right.name == "audio"
+
+    # without `split_channels` the channels are downmixed, like `audio_file_dependency` does
+    [audio] = audio_channels_dependency(upload_file(tmp_path, data, "audio.flac", "audio/flac"))
+    np.testing.assert_allclose(audio.data, channels.mean(axis=0), atol=1e-4)
+
+    with pytest.raises(HTTPException) as exc_info:
+        audio_channels_dependency(
+            upload_file(tmp_path, data, "audio.flac", "audio/flac"), channel=0, split_channels=True
+        )
+    assert exc_info.value.status_code == 400
+
+
+def test_split_channels_pcm_upload(tmp_path: Path, mocker: MockerFixture) -> None:
+    patch_config(mocker, DEFAULT_CONFIG)
+    samples = np.arange(-16000, 16000, dtype=np.int16)
+
+    [audio] = audio_channels_dependency(
+        upload_file(tmp_path, samples.tobytes(), "audio.pcm", "audio/pcm"), split_channels=True
+    )
+    np.testing.assert_array_equal(audio.data, int16_to_float32(samples))
@@ -0,0 +1,69 @@
+from collections.abc import Generator
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, cast
+
+from fastapi import HTTPException
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+
+from speaches.audio import Audio
+from speaches.executors.shared.handler_protocol import SpeechRequest
+from speaches.inprocess_clients import InProcessClientError, SpeechClient, TranscriptionClient
+
+if TYPE_CHECKING:
+    from speaches.executors.shared.registry import ExecutorRegistry
+
+MODEL_SAMPLE_RATE = 22050
+
+
+@pytest.fixture
+def speech_client(mocker: MockerFixture) -> SpeechClient:
+    def handle_speech_request(request: SpeechRequest) -> Generator[Audio]:
+        for _ in request.text.split():
+            yield Audio(np.full(MODEL_SAMPLE_RATE // 10, 0.5, dtype=np.float32), sample_rate=MODEL_SAMPLE_RATE)
+
+    executor = SimpleNamespace(model_manager=SimpleNamespace(handle_speech_request=handle_speech_request))
+    mocker.patch("speaches.inprocess_clients.get_model_card_data_or_raise")
+    mocker.patch("speaches.inprocess_clients.find_executor_for_model_or_raise", return_value=executor)
+    return SpeechClient(cast("ExecutorRegistry", SimpleNamespace(text_to_speech=[executor])))
+
+
+@pytest.mark.asyncio
+async def test_synthesize(speech_client: SpeechClient) -> None:
+    audios = [audio async for audio in speech_client.synthesize("one two three", model="model", voice="voice")]
+    assert len(audios) == 3
+    assert all(audio.sample_rate == MODEL_SAMPLE_RATE for audio in audios)
+
+
+@pytest.mark.asyncio
+async def test_synthesize_resamples_the_whole_stream(speech_client: SpeechClient) -> None:
+    audios = [
+        audio
+        async for audio in speech_client.synthesize("one two three", model="model", voice="voice", sample_rate=24000)
+    ]
+    assert all(audio.sample_rate == 24000 for audio in audios)
+    assert sum(len(audio.samples) for audio in audios) == pytest.approx(3 * 2400, abs=1)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    ("error", "status_code"),
+    [
+        (HTTPException(status_code=404, detail="Model not found"), 404),
+        (ValueError("Voice 'voice' is not supported"), 400),
+        (RuntimeError("ORT failed"), 500),
+    ],
+)
+async def test_errors_are_raised_as_client_errors(mocker: MockerFixture, error: Exception, status_code: int) -> None:
+    mocker.patch("speaches.inprocess_clients.get_model_card_data_or_raise", side_effect=error)
+    executor_registry = cast("ExecutorRegistry", SimpleNamespace())
+
+    with pytest.raises(InProcessClientError) as exc_info:
+        [audio async for audio in SpeechClient(executor_registry).synthesize("one", model="model", voice="voice")]
+    assert exc_info.value.status_code == status_code
+    with pytest.raises(InProcessClientError) as exc_info:
+        await TranscriptionClient(executor_registry).transcribe(
+            Audio(np.zeros(16000, dtype=np.float32), sample_rate=16000), model="model"
+        )
+    assert exc_info.value.status_code == status_code
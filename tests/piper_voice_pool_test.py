@@ -0,0 +1,71 @@
+from collections.abc import Generator
+import threading
+import time
+from types import SimpleNamespace
+from typing import cast
+
+import numpy as np
+from piper.config import SynthesisConfig
+from piper.voice import PiperVoice
+import pytest
+
+from speaches.executors.piper import PiperVoicePool
+from speaches.text_utils import split_sentences
+
+NUM_SENTENCES = 10
+TEXT = " ".join(f"This is sentence number {i}." for i in range(NUM_SENTENCES))
+
+
+def create_voices(
+    num_voices: int, synthesized: list[int], threads: set[str], unblock: threading.Event | None = None
+) -> list[PiperVoice]:
+    """Fake voices, the audio of a sentence is filled with the sentence's number."""
+
+    def synthesize(text: str, _syn_config: SynthesisConfig) -> Generator[SimpleNamespace]:
+        # like `PiperVoice.synthesize`, yields a chunk per sentence
+        for sentence in split_sentences(text):
+            threads.add(threading.current_thread().name)
+            i = int(sentence.removesuffix(".").split()[-1])
+            synthesized.append(i)
+            if unblock is not None:
+                unblock.wait()
+            # earlier sentences take longer, so that they finish out of order
+            time.sleep((NUM_SENTENCES - i) / 1000)
+            yield SimpleNamespace(audio_int16_array=np.full(10, i, dtype=np.int16))
+
+    voice = SimpleNamespace(config=SimpleNamespace(sample_rate=22050), synthesize=synthesize)
+    return [cast("PiperVoice", voice) for _ in range(num_voices)]
+
+
+@pytest.mark.parametrize("num_workers", [1, 3])
+def test_audio_is_yielded_in_order(num_workers: int) -> None:
+    synthesized: list[int] = []
+    threads: set[str] = set()
+    pool = PiperVoicePool(create_voices(num_workers, synthesized, threads))
+
+    audio_chunks = list(pool.synthesize(TEXT, SynthesisConfig()))
+
+    assert [int(audio_chunk[0]) for audio_chunk in audio_chunks] == list(range(NUM_SENTENCES))
+    assert sorted(synthesized) == list(range(NUM_SENTENCES))
+    if num_workers == 1:
+        # synthesized in the requesting thread
+        assert threads == {threading.current_thread().name}
+    else:
+        assert threading.current_thread().name not in threads
+
+
+def test_closing_the_stream_cancels_the_sentences_ahead() -> None:
+    synthesized: list[int] = []
+    unblock = threading.Event()
+    num_voices = 2
+    pool = PiperVoicePool(create_voices(num_voices, synthesized, set(), unblock))
+
+    audio_chunks = pool.synthesize(TEXT, SynthesisConfig())
+    unblock.set()
+    assert int(next(audio_chunks)[0]) == 0
+    audio_chunks.close()
+    # let the sentences that were already running finish
+    time.sleep(0.1)
+
+    # the first sentence and at most one more per replica were synthesized ahead of the one being yielded
+    assert len(synthesized) <= 1 + num_voices
@@ -0,0 +1,104 @@
+from openai.types.chat import ChatCompletionMessageParam
+
+from speaches.realtime.chat_utils import ChatMessageCache, estimate_message_tokens, limit_chat_history
+from speaches.types.realtime import (
+    ConversationItem,
+    ConversationItemContentAudio,
+    ConversationItemContentInputAudio,
+    ConversationItemContentText,
+    ConversationItemFunctionCall,
+    ConversationItemMessage,
+)
+
+
+def user(content: str) -> ChatCompletionMessageParam:
+    return {"role": "user", "content": content}
+
+
+def assistant(content: str) -> ChatCompletionMessageParam:
+    return {"role": "assistant", "content": content}
+
+
+def tool_call() -> ChatCompletionMessageParam:
+    return {
+        "role": "assistant",
+        "tool_calls": [{"id": "call", "type": "function", "function": {"name": "get_time", "arguments": "{}"}}],
+    }
+
+
+def tool_output() -> ChatCompletionMessageParam:
+    return {"role": "tool", "tool_call_id": "call", "content": "12:00"}
+
+
+MESSAGES = [
+    assistant("Hi, how can I help?"),
+    user("What time is it?"),
+    tool_call(),
+    tool_output(),
+    assistant("It's noon."),
+    user("Thanks!"),
+    assistant("You're welcome."),
+]
+
+
+def test_limit_chat_history_without_limits() -> None:
+    assert limit_chat_history(MESSAGES, None, None) == MESSAGES
+    assert limit_chat_history(MESSAGES, 10, 10_000) == MESSAGES
+    assert limit_chat_history([], 1, 1) == []
+
+
+def test_limit_chat_history_max_turns() -> None:
+    assert limit_chat_history(MESSAGES, 1, None) == MESSAGES[5:]
+    # the tool call is kept along with its output
+    assert limit_chat_history(MESSAGES, 2, None) == MESSAGES[1:]
+
+
+def test_limit_chat_history_max_tokens() -> None:
+    last_two_turns_tokens = sum(estimate_message_tokens(message) for message in MESSAGES[1:])
+    assert limit_chat_history(MESSAGES, None, last_two_turns_tokens) == MESSAGES[1:]
+    assert limit_chat_history(MESSAGES, None, last_two_turns_tokens - 1) == MESSAGES[5:]
+    # the latest turn is kept even if it's over the budget
+    assert limit_chat_history(MESSAGES, None, 1) == MESSAGES[5:]
+
+
+def test_chat_message_cache() -> None:
+    cache = ChatMessageCache()
+    audio = ConversationItemContentInputAudio(type="input_audio", transcript=None)
+    user_item = ConversationItemMessage(role="user", status="completed", content=[audio])
+    text = ConversationItemContentText(text="Hel")
+    assistant_item = ConversationItemMessage(role="assistant", status="incomplete", content=[text])
+    # neither the transcript nor the response are available yet
+    assert cache.items_to_chat_messages([user_item, assistant_item]) == []
+
+    audio.transcript = "Hello"
+    text.text = "Hello there"
+    assistant_item.status = "completed"
+    assert cache.items_to_chat_messages([user_item, assistant_item]) == [user("Hello"), assistant("Hello there")]
+
+    # completed items aren't converted again
+    audio.transcript = "Changed"
+    assert cache.items_to_chat_messages([user_item]) == [user("Hello")]
+    cache.discard(user_item.id)
+    assert cache.items_to_chat_messages([user_item]) == [user("Changed")]
+
+
+def test_chat_message_cache_incomplete_items() -> None:
+    cache = ChatMessageCache()
+    user_item = ConversationItemMessage(
+        role="user", status="completed", content=[ConversationItemContentInputAudio(transcript="Tell me a story")]
+    )
+    cancelled_item = ConversationItemMessage(
+        role="assistant", status="incomplete", content=[ConversationItemContentAudio(audio="", transcript="Once upon")]
+    )
+    empty_item = ConversationItemMessage(
+        role="assistant", status="incomplete", content=[ConversationItemContentText(text="")]
+    )
+    function_call_item = ConversationItemFunctionCall(
+        status="incomplete", call_id="call", name="get_time", arguments='{"time'
+    )
+    for item in (cancelled_item, empty_item, function_call_item):
+        cache.add_incomplete_item(item)
+    # the partial transcript is kept, the items without anything usable are left out
+    items: list[ConversationItem] = [user_item, cancelled_item, empty_item, function_call_item]
+    assert cache.items_to_chat_messages(items) == [user("Tell me a story"), assistant("Once upon")]
+    assert cancelled_item.status == "incomplete"
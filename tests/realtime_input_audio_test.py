@@ -0,0 +1,176 @@
+import asyncio
+import base64
+import json
+import threading
+from typing import TYPE_CHECKING, cast
+
+import numpy as np
+from numpy.typing import NDArray
+import pytest
+
+from speaches.audio import int16_to_float32
+from speaches.config import RealtimeHistoryConfig
+from speaches.realtime.context import SessionContext
+from speaches.realtime.input_audio_buffer import SAMPLE_RATE
+from speaches.realtime.input_audio_buffer_event_router import event_router, handle_input_audio_buffer_message
+from speaches.realtime.session import create_session_object_configuration
+from speaches.resample import resample
+from speaches.types.realtime import (
+    ErrorEvent,
+    Event,
+    InputAudioBufferAppendEvent,
+    InputAudioBufferClearedEvent,
+    InputAudioBufferClearEvent,
+    InputAudioBufferCommitEvent,
+    InputAudioBufferCommittedEvent,
+)
+
+if TYPE_CHECKING:
+    from speaches.executors.silero_vad_v5 import SileroVADModelManager
+    from speaches.inprocess_clients import TranscriptionClient
+    from speaches.routers.chat import InProcessChatCompletions
+
+
+def create_context() -> SessionContext:
+    session = create_session_object_configuration("model", "conversation", None, None)
+    session.turn_detection = None
+    return SessionContext(
+        # none of them are used without turn detection, until a response is created
+        transcription_client=cast("TranscriptionClient", None),
+        completion_client=cast("InProcessChatCompletions", None),
+        vad_model_manager=cast("SileroVADModelManager", None),
+        session=session,
+        history_config=RealtimeHistoryConfig(),
+    )
+
+
+def encode_audio(milliseconds: int) -> str:
+    audio = np.full(24 * milliseconds, 1000, dtype=np.int16)
+    return base64.b64encode(audio.tobytes()).decode()
+
+
+def append_event(milliseconds: int) -> InputAudioBufferAppendEvent:
+    return InputAudioBufferAppendEvent(type="input_audio_buffer.append", audio=encode_audio(milliseconds))
+
+
+def append_message(milliseconds: int) -> str:
+    return json.dumps({"type": "input_audio_buffer.append", "audio": encode_audio(milliseconds)})
+
+
+async def dispatch_all(ctx: SessionContext, events: list[Event]) -> None:
+    # like the event listener, which handles every event in a task of its own
+    async with asyncio.TaskGroup() as tg:
+        for event in events:
+            tg.create_task(event_router.dispatch(ctx, event))
+
+
+async def wait_for_audio_worker(ctx: SessionContext) -> None:
+    await ctx.run_in_audio_worker(lambda: None)
+    # let the callbacks publishing the results run
+    await asyncio.sleep(0)
+
+
+def pending_events(queue: asyncio.Queue[Event]) -> list[Event]:
+    return [queue.get_nowait() for _ in range(queue.qsize())]
+
+
+@pytest.mark.asyncio
+async def test_appended_audio_is_processed_off_the_event_loop_in_order() -> None:
+    ctx = create_context()
+    queue = ctx.pubsub.subscribe()
+    process = ctx.input_audio_resampler.process
+    threads: set[str] = set()
+
+    def record_thread(data: NDArray[np.float32], out: NDArray[np.float32] | None = None) -> NDArray[np.float32]:
+        threads.add(threading.current_thread().name)
+        return process(data, out)
+
+    ctx.input_audio_resampler.process = record_thread
+    input_audio_buffer = ctx.input_audio_buffers[next(reversed(ctx.input_audio_buffers))]
+
+    await dispatch_all(
+        ctx, [append_event(20) for _ in range(10)] + [InputAudioBufferCommitEvent(type="input_audio_buffer.commit")]
+    )
+    await wait_for_audio_worker(ctx)
+    ctx.close()
+
+    assert threads == {f"audio-{ctx.session.id}_0"}
+    # the commit was handled after all of the audio appended before it
+    assert input_audio_buffer.duration_ms == pytest.approx(200, abs=10)
+    [event] = pending_events(queue)
+    assert isinstance(event, InputAudioBufferCommittedEvent)
+    assert event.item_id == input_audio_buffer.id
+    assert next(reversed(ctx.input_audio_buffers)) != input_audio_buffer.id
+
+
+@pytest.mark.asyncio
+async def test_clear_discards_the_audio_appended_before_it() -> None:
+    ctx = create_context()
+    queue = ctx.pubsub.subscribe()
+    await dispatch_all(
+        ctx, [append_event(20) for _ in range(5)] + [InputAudioBufferClearEvent(type="input_audio_buffer.clear")]
+    )
+    await wait_for_audio_worker(ctx)
+    ctx.close()
+
+    assert isinstance(queue.get_nowait(), InputAudioBufferClearedEvent)
+    assert len(ctx.input_audio_buffers) == 1
+    assert ctx.input_audio_buffers[next(reversed(ctx.input_audio_buffers))].size == 0
+
+
+@pytest.mark.asyncio
+async def test_fast_path_keeps_the_messages_in_order() -> None:
+    ctx = create_context()
+    queue = ctx.pubsub.subscribe()
+    messages = [
+        *[append_message(20) for _ in range(10)],
+        json.dumps({"type": "input_audio_buffer.commit"}),
+        append_message(20),
+    ]
+    assert all(handle_input_audio_buffer_message(ctx, message) for message in messages)
+    await wait_for_audio_worker(ctx)
+    ctx.close()
+
+    [event] = pending_events(queue)
+    assert isinstance(event, InputAudioBufferCommittedEvent)
+    committed_input_audio_buffer, input_audio_buffer = ctx.input_audio_buffers.values()
+    assert committed_input_audio_buffer.id == event.item_id
+    assert committed_input_audio_buffer.duration_ms == pytest.approx(200, abs=10)
+    assert input_audio_buffer.duration_ms == pytest.approx(20, abs=10)
+
+
+@pytest.mark.asyncio
+async def test_fast_path_skips_other_messages() -> None:
+    ctx = create_context()
+    queue = ctx.pubsub.subscribe()
+    assert not handle_input_audio_buffer_message(ctx, json.dumps({"type": "response.create"}))
+    assert not handle_input_audio_buffer_message(ctx, '{"type": "input_audio_buffer.append"')
+    assert not handle_input_audio_buffer_message(ctx, json.dumps({"type": "input_audio_buffer.append", "audio": 1}))
+
+    assert handle_input_audio_buffer_message(
+        ctx, json.dumps({"type": "input_audio_buffer.append", "audio": "not base64"})
+    )
+    ctx.close()
+    [event] = pending_events(queue)
+    assert isinstance(event, ErrorEvent)
+    assert event.error.type == "invalid_request_error"
+
+
+@pytest.mark.asyncio
+async def test_full_scale_audio_does_not_wrap() -> None:
+    ctx = create_context()
+    # a full scale 24kHz square wave, which the 24kHz -> 16kHz resampler overshoots
+    audio = np.where(np.sin(2 * np.pi * 440 * np.arange(24 * 200) / 24000) >= 0, 32767, -32768).astype(np.int16)
+    messages = [
+        json.dumps({"type": "input_audio_buffer.append", "audio": base64.b64encode(chunk.tobytes()).decode()})
+        for chunk in np.array_split(audio, 10)
+    ]
+    assert all(handle_input_audio_buffer_message(ctx, message) for message in messages)
+    await wait_for_audio_worker(ctx)
+    ctx.close()
+
+    data = ctx.input_audio_buffers[next(reversed(ctx.input_audio_buffers))].data
+    expected = resample(int16_to_float32(audio), 24000, SAMPLE_RATE)[: len(data)]
+    assert np.abs(expected).max() > 1.0
+    loud = np.abs(expected) > 0.5
+    np.testing.assert_array_equal(np.sign(data[loud]), np.sign(expected[loud]))
@@ -0,0 +1,130 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from typing import TYPE_CHECKING, Any, cast
+
+from openai.types.chat import ChatCompletionChunk
+import pytest
+
+from speaches.config import RealtimeHistoryConfig
+from speaches.realtime.context import SessionContext
+from speaches.realtime.response_event_router import (
+    handle_input_audio_buffer_speech_started,
+    handle_response_cancel_event,
+    run_response,
+)
+from speaches.realtime.session import create_session_object_configuration
+from speaches.types.realtime import (
+    Event,
+    InputAudioBufferSpeechStartedEvent,
+    Response,
+    ResponseCancelEvent,
+    ResponseDoneEvent,
+)
+
+if TYPE_CHECKING:
+    from speaches.executors.silero_vad_v5 import SileroVADModelManager
+    from speaches.inprocess_clients import TranscriptionClient
+    from speaches.routers.chat import InProcessChatCompletions
+
+
+class FakeCompletionClient:
+    """Streams audio chunks until the stream is closed."""
+
+    def __init__(self) -> None:
+        self.closed = False
+
+    async def create(self, **_params: Any) -> AsyncGenerator[ChatCompletionChunk]:
+        async def stream() -> AsyncGenerator[ChatCompletionChunk]:
+            try:
+                while True:
+                    yield ChatCompletionChunk.model_validate(
+                        {
+                            "id": "chatcmpl",
+                            "created": 0,
+                            "model": "model",
+                            "object": "chat.completion.chunk",
+                            "choices": [{"index": 0, "delta": {"audio": {"transcript": "a", "data": "AAAA"}}}],
+                        }
+                    )
+                    await asyncio.sleep(0.001)
+            finally:
+                self.closed = True
+
+        return stream()
+
+
+def create_context(completion_client: FakeCompletionClient) -> SessionContext:
+    return SessionContext(
+        # neither transcription nor voice activity detection are used by responses
+        transcription_client=cast("TranscriptionClient", None),
+        completion_client=cast("InProcessChatCompletions", completion_client),
+        vad_model_manager=cast("SileroVADModelManager", None),
+        session=create_session_object_configuration("model", "conversation", None, None),
+        history_config=RealtimeHistoryConfig(),
+    )
+
+
+def pending_events(queue: asyncio.Queue[Event]) -> list[Event]:
+    return [queue.get_nowait() for _ in range(queue.qsize())]
+
+
+@pytest.mark.asyncio
+async def test_response_cancel() -> None:
+    completion_client = FakeCompletionClient()
+    ctx = create_context(completion_client)
+    queue = ctx.pubsub.subscribe()
+    configuration = Response(conversation="auto", input=[], **ctx.session.model_dump())
+    task = asyncio.create_task(run_response(ctx, configuration))
+    await asyncio.sleep(0.05)
+    assert ctx.response is not None
+
+    handle_response_cancel_event(ctx, ResponseCancelEvent(type="response.cancel"))
+    await task
+    assert completion_client.closed
+    assert ctx.response is None
+
+    events = pending_events(queue)
+    # the audio that hadn't been sent yet is dropped
+    assert not any(event.type == "response.audio.delta" for event in events)
+    assert any(event.type == "response.audio_transcript.delta" for event in events)
+    response_done = events[-1]
+    assert isinstance(response_done, ResponseDoneEvent)
+    assert response_done.response.status == "cancelled"
+    assert response_done.response.status_details is not None
+    assert response_done.response.status_details.reason == "client_cancelled"
+    assert response_done.response.output[0].status == "incomplete"
+    # the transcript generated before the response was cancelled is part of the following responses
+    [item] = ctx.conversation.items.values()
+    assert item.type == "message"
+    [content] = item.content
+    assert content.type == "audio"
+    assert content.transcript
+    assert ctx.conversation.chat_message_cache.items_to_chat_messages([item]) == [
+        {"role": "assistant", "content": content.transcript}
+    ]
+
+
+@pytest.mark.asyncio
+async def test_response_cancel_without_active_response() -> None:
+    ctx = create_context(FakeCompletionClient())
+    queue = ctx.pubsub.subscribe()
+    handle_response_cancel_event(ctx, ResponseCancelEvent(type="response.cancel"))
+    assert [event.type for event in pending_events(queue)] == ["error"]
+
+
+@pytest.mark.asyncio
+async def test_speech_started_interrupts_response() -> None:
+    completion_client = FakeCompletionClient()
+    ctx = create_context(completion_client)
+    queue = ctx.pubsub.subscribe()
+    configuration = Response(conversation="auto", input=[], **ctx.session.model_dump())
+    task = asyncio.create_task(run_response(ctx, configuration))
+    await asyncio.sleep(0.05)
+
+    handle_input_audio_buffer_speech_started(ctx, InputAudioBufferSpeechStartedEvent(item_id="item", audio_start_ms=0))
+    await task
+    assert completion_client.closed
+    response_done = pending_events(queue)[-1]
+    assert isinstance(response_done, ResponseDoneEvent)
+    assert response_done.response.status_details is not None
+    assert response_done.response.status_details.reason == "turn_detected"
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from speaches.audio import float32_to_int16
+from speaches.resample import StreamingResampler, resample
+
+SAMPLE_RATE_PAIRS = [(24000, 16000), (24000, 48000), (22050, 24000), (8000, 16000), (48000, 24000)]
+
+
+@pytest.mark.parametrize(("sample_rate", "target_sample_rate"), SAMPLE_RATE_PAIRS)
+def test_streaming_matches_one_shot(sample_rate: int, target_sample_rate: int) -> None:
+    rng = np.random.default_rng(0)
+    data = rng.uniform(-0.5, 0.5, sample_rate + 123).astype(np.float32)
+    expected = resample(data, sample_rate, target_sample_rate)
+    assert len(expected) == len(data) * target_sample_rate // sample_rate
+
+    resampler = StreamingResampler(sample_rate, target_sample_rate)
+    chunks = []
+    for chunk in np.array_split(data, np.sort(rng.integers(0, len(data), 20))):
+        out = np.empty(resampler.output_size(len(chunk)), dtype=np.float32)
+        chunks.append(resampler.process(chunk, out=out))
+    chunks.append(resampler.flush())
+    np.testing.assert_allclose(np.concatenate(chunks), expected, atol=1e-6)
+
+
+@pytest.mark.parametrize(("sample_rate", "target_sample_rate"), SAMPLE_RATE_PAIRS)
+def test_tone_is_preserved(sample_rate: int, target_sample_rate: int) -> None:
+    frequency = 1000
+    data = np.sin(2 * np.pi * frequency * np.arange(sample_rate) / sample_rate).astype(np.float32)
+    resampled = resample(data, sample_rate, target_sample_rate)
+    expected = np.sin(2 * np.pi * frequency * np.arange(len(resampled)) / target_sample_rate)
+    # ignore the edges where the filter sees the implicit silence around the signal
+    np.testing.assert_allclose(resampled[100:-100], expected[100:-100], atol=1e-3)
+
+
+def test_aliasing_is_suppressed() -> None:
+    sample_rate, target_sample_rate = 24000, 16000
+    # well above the target Nyquist frequency, would fold back to 6kHz
+    data = np.sin(2 * np.pi * 10000 * np.arange(sample_rate) / sample_rate).astype(np.float32)
+    resampled = resample(data, sample_rate, target_sample_rate)
+    assert np.abs(resampled[100:-100]).max() < 1e-3
+
+
+@pytest.mark.parametrize(("sample_rate", "target_sample_rate"), SAMPLE_RATE_PAIRS)
+def test_full_scale_input_does_not_wrap(sample_rate: int, target_sample_rate: int) -> None:
+    # a full scale square wave makes the filter ring past [-1.0, 1.0]
+    data = np.sign(np.sin(2 * np.pi * 440 * np.arange(sample_rate) / sample_rate)).astype(np.float32)
+    resampled = resample(data, sample_rate, target_sample_rate)
+    assert np.abs(resampled).max() > 1.0
+    pcm = float32_to_int16(resampled)
+    loud = np.abs(resampled) > 0.5
+    np.testing.assert_array_equal(np.sign(pcm[loud]), np.sign(resampled[loud]))
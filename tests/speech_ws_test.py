@@ -0,0 +1,133 @@
+from collections.abc import Generator
+import json
+import threading
+from types import SimpleNamespace
+
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+from starlette.websockets import WebSocketState
+
+from speaches.audio import Audio
+from speaches.executors.shared.handler_protocol import SpeechRequest
+from speaches.main import create_app
+from speaches.routers.speech_ws import SpeechStream, _SegmentEncoder
+from tests.conftest import DEFAULT_CONFIG
+
+SAMPLE_RATE = 24000
+URL = "/v1/audio/speech/stream?model=test-model&voice=test-voice"
+
+
+@pytest.fixture
+def requests(mocker: MockerFixture) -> list[SpeechRequest]:
+    """Patch the model lookup with a fake executor that outputs 100ms of audio per sentence and records the requests."""
+    requests: list[SpeechRequest] = []
+
+    def handle_speech_request(request: SpeechRequest) -> Generator[Audio]:
+        requests.append(request)
+        yield Audio(np.full(SAMPLE_RATE // 10, 0.5, dtype=np.float32), sample_rate=SAMPLE_RATE)
+
+    mocker.patch("speaches.main.get_config", return_value=DEFAULT_CONFIG)
+    mocker.patch("speaches.dependencies.get_config", return_value=DEFAULT_CONFIG)
+    executor = SimpleNamespace(model_manager=SimpleNamespace(handle_speech_request=handle_speech_request))
+    mocker.patch("speaches.routers.speech_ws.get_model_card_data_or_raise")
+    mocker.patch("speaches.routers.speech_ws.find_executor_for_model_or_raise", return_value=executor)
+    return requests
+
+
+def test_sentences_are_synthesized_as_they_complete(requests: list[SpeechRequest]) -> None:
+    with TestClient(create_app()) as client, client.websocket_connect(URL) as ws:
+        for token in ["Hello there, ", "how are you ", "doing today? I'm ", "fine."]:
+            ws.send_text(json.dumps({"type": "input_text.delta", "delta": token}))
+        audio = ws.receive_bytes()
+        assert len(audio) == SAMPLE_RATE // 10 * 2
+        # the second sentence isn't complete until the input is flushed
+        assert [request.text for request in requests] == ["Hello there, how are you doing today?"]
+
+        ws.send_text(json.dumps({"type": "input_text.flush"}))
+        ws.receive_bytes()
+        assert json.loads(ws.receive_text()) == {"type": "audio.done"}
+        assert requests[-1].text == "I'm fine."
+
+        ws.send_text(json.dumps({"type": "input_text.delta", "delta": "Goodbye"}))
+        ws.send_text(json.dumps({"type": "input_text.done"}))
+        ws.receive_bytes()
+        assert json.loads(ws.receive_text()) == {"type": "audio.done"}
+        assert requests[-1].text == "Goodbye"
+
+
+def test_cancel_discards_pending_text(requests: list[SpeechRequest]) -> None:
+    with TestClient(create_app()) as client, client.websocket_connect(URL) as ws:
+        ws.send_text(json.dumps({"type": "input_text.delta", "delta": "This will never be"}))
+        ws.send_text(json.dumps({"type": "cancel"}))
+        assert json.loads(ws.receive_text()) == {"type": "cancelled"}
+        ws.send_text(json.dumps({"type": "input_text.delta", "delta": "Something else"}))
+        ws.send_text(json.dumps({"type": "input_text.done"}))
+        ws.receive_bytes()
+        assert json.loads(ws.receive_text()) == {"type": "audio.done"}
+        assert [request.text for request in requests] == ["Something else"]
+
+
+def test_invalid_message(requests: list[SpeechRequest]) -> None:  # noqa: ARG001
+    with TestClient(create_app()) as client, client.websocket_connect(URL) as ws:
+        ws.send_text(json.dumps({"type": "unknown"}))
+        assert json.loads(ws.receive_text())["type"] == "error"
+        ws.send_bytes(b"not text")
+        assert json.loads(ws.receive_text())["type"] == "error"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "error",
+    [WebSocketDisconnect(code=1006), RuntimeError('Cannot call "send" once a close message has been sent.')],
+)
+async def test_client_disconnect_while_sending_audio(mocker: MockerFixture, error: Exception) -> None:
+    def handle_speech_request(_request: SpeechRequest) -> Generator[Audio]:
+        yield Audio(np.full(SAMPLE_RATE // 10, 0.5, dtype=np.float32), sample_rate=SAMPLE_RATE)
+
+    # the client went away, sending fails like it does for a closed connection
+    ws = mocker.MagicMock(
+        client_state=WebSocketState.DISCONNECTED,
+        application_state=WebSocketState.DISCONNECTED,
+        send_bytes=mocker.AsyncMock(side_effect=error),
+        send_json=mocker.AsyncMock(side_effect=error),
+    )
+    stream = SpeechStream(ws, handle_speech_request, None, "model", "voice", 1.0, "pcm", None)
+    stream.add_text("Hello there.")
+    # neither `done` nor `close` raise, and no error event is sent to the closed connection
+    await stream.done()
+    await stream.close()
+    ws.send_bytes.assert_awaited_once()
+    ws.send_json.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_audio_is_encoded_off_the_event_loop(mocker: MockerFixture) -> None:
+    def handle_speech_request(_request: SpeechRequest) -> Generator[Audio]:
+        yield Audio(np.full(SAMPLE_RATE // 10, 0.5, dtype=np.float32), sample_rate=SAMPLE_RATE)
+
+    threads: set[threading.Thread] = set()
+    encode, close = _SegmentEncoder.encode, _SegmentEncoder.close
+
+    def record_encode(encoder: _SegmentEncoder, audio: Audio) -> bytes:
+        threads.add(threading.current_thread())
+        return encode(encoder, audio)
+
+    def record_close(encoder: _SegmentEncoder) -> bytes:
+        threads.add(threading.current_thread())
+        return close(encoder)
+
+    mocker.patch.object(_SegmentEncoder, "encode", autospec=True, side_effect=record_encode)
+    mocker.patch.object(_SegmentEncoder, "close", autospec=True, side_effect=record_close)
+    ws = mocker.MagicMock(send_bytes=mocker.AsyncMock(), send_json=mocker.AsyncMock())
+    stream = SpeechStream(ws, handle_speech_request, None, "model", "voice", 1.0, "mp3", None)
+    stream.add_text("Hello there.")
+    await stream.done()
+    await stream.close()
+
+    assert len(threads) > 0
+    assert threading.main_thread() not in threads
+    assert b"".join(call.args[0] for call in ws.send_bytes.await_args_list)
+    ws.send_json.assert_awaited_once_with({"type": "audio.done"})
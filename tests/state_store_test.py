@@ -0,0 +1,101 @@
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from speaches.state_store import InMemoryStateStore, SqliteStateStore, StateStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def state_store(request: pytest.FixtureRequest, tmp_path: Path) -> StateStore:
+    if request.param == "memory":
+        return InMemoryStateStore(max_entries=16)
+    return SqliteStateStore(tmp_path / "state.db", flush_interval_ms=10, max_batch_size=256)
+
+
+def test_get_set_delete(state_store: StateStore) -> None:
+    assert state_store.get("ns", "key") is None
+    state_store.set("ns", "key", "value")
+    assert state_store.get("ns", "key") == "value"
+    assert state_store.get("other", "key") is None
+    state_store.delete("ns", "key")
+    assert state_store.get("ns", "key") is None
+    state_store.close()
+
+
+def test_ttl(state_store: StateStore) -> None:
+    state_store.set("ns", "key", "value", ttl=0.05)
+    assert state_store.get("ns", "key") == "value"
+    time.sleep(0.1)
+    assert state_store.get("ns", "key") is None
+    state_store.close()
+
+
+def test_memory_evicts_oldest_entries() -> None:
+    state_store = InMemoryStateStore(max_entries=2)
+    for key in ["a", "b", "c"]:
+        state_store.set("ns", key, key)
+    assert [state_store.get("ns", key) for key in ["a", "b", "c"]] == [None, "b", "c"]
+
+
+def test_sqlite_writes_are_shared_once_flushed(tmp_path: Path) -> None:
+    writer = SqliteStateStore(tmp_path / "state.db", flush_interval_ms=60_000, max_batch_size=256)
+    reader = SqliteStateStore(tmp_path / "state.db", flush_interval_ms=60_000, max_batch_size=256)
+    writer.set("ns", "key", "value")
+    # visible to the writer right away, but only committed with the next batch
+    assert writer.get("ns", "key") == "value"
+    assert reader.get("ns", "key") is None
+    writer.flush()
+    assert reader.get("ns", "key") == "value"
+    writer.close()
+    reader.close()
+
+
+def test_sqlite_full_batch_is_flushed(tmp_path: Path) -> None:
+    writer = SqliteStateStore(tmp_path / "state.db", flush_interval_ms=60_000, max_batch_size=4)
+    reader = SqliteStateStore(tmp_path / "state.db", flush_interval_ms=60_000, max_batch_size=4)
+    for i in range(4):
+        writer.set("ns", str(i), str(i))
+    deadline = time.monotonic() + 5
+    while reader.get("ns", "3") is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [reader.get("ns", str(i)) for i in range(4)] == ["0", "1", "2", "3"]
+    writer.close()
+    reader.close()
+
+
+def test_sqlite_pending_writes_are_committed_on_close(tmp_path: Path) -> None:
+    state_store = SqliteStateStore(tmp_path / "state.db", flush_interval_ms=60_000, max_batch_size=256)
+    state_store.set("ns", "key", "value", ttl=60)
+    state_store.close()
+    state_store = SqliteStateStore(tmp_path / "state.db", flush_interval_ms=0, max_batch_size=256)
+    assert state_store.get("ns", "key") == "value"
+    state_store.close()
+
+
+def test_sqlite_get_does_not_wait_for_a_commit(tmp_path: Path) -> None:
+    state_store = SqliteStateStore(tmp_path / "state.db", flush_interval_ms=60_000, max_batch_size=256)
+    state_store.set("ns", "committed", "value")
+    state_store.flush()
+    state_store.set("ns", "key", "value")
+    # another worker's write transaction makes the commit wait for it
+    other_worker = sqlite3.connect(tmp_path / "state.db", isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")
+    flush_thread = threading.Thread(target=state_store.flush)
+    flush_thread.start()
+    time.sleep(0.1)
+
+    start = time.perf_counter()
+    assert state_store.get("ns", "committed") == "value"
+    # still readable while it's being committed
+    assert state_store.get("ns", "key") == "value"
+    assert time.perf_counter() - start < 0.5
+    assert flush_thread.is_alive()
+
+    other_worker.execute("COMMIT")
+    flush_thread.join()
+    other_worker.close()
+    assert state_store.get("ns", "key") == "value"
+    state_store.close()
@@ -0,0 +1,119 @@
+import io
+
+import av
+from fastapi import APIRouter, FastAPI, UploadFile
+from httpx import ASGITransport, AsyncClient
+import numpy as np
+import pytest
+from pytest_mock import MockerFixture
+import soundfile as sf
+
+from speaches.audio import decode_audio
+from speaches.dependencies import AudioFileDependency, AudioUploadRoute
+from speaches.streaming_upload import AudioUploadFile, StreamingDecoder
+from tests.conftest import DEFAULT_CONFIG
+
+
+def encode(audio_format: str, seconds: int = 3) -> bytes:
+    t = np.arange(44100 * seconds) / 44100
+    file = io.BytesIO()
+    sf.write(file, (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32), 44100, format=audio_format)
+    return file.getvalue()
+
+
+def encode_m4a() -> bytes:
+    file = io.BytesIO()
+    # the muxer writes the index after the audio, so the file can't be demuxed without seeking
+    with av.open(file, mode="w", format="mp4") as container:
+        stream = container.add_stream("aac", rate=44100, layout="mono")
+        t = np.arange(44100 * 10) / 44100
+        samples = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32).reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(samples, format="fltp", layout="mono")
+        frame.sample_rate = 44100
+        container.mux(stream.encode(frame))
+        container.mux(stream.encode(None))
+    return file.getvalue()
+
+
+def streaming_decoder(offset: float = 0.0, duration: float | None = None) -> StreamingDecoder:
+    return StreamingDecoder(
+        sample_rate=16000, max_in_memory_samples=None, offset=offset, duration=duration, channel=None
+    )
+
+
+def feed(decoder: StreamingDecoder, data: bytes, chunk_size: int = 4096) -> None:
+    for i in range(0, len(data), chunk_size):
+        decoder.feed(data[i : i + chunk_size])
+
+
+@pytest.mark.parametrize("audio_format", ["MP3", "OGG", "WAV", "FLAC"])
+def test_matches_decode_audio(audio_format: str) -> None:
+    data = encode(audio_format)
+    decoder = streaming_decoder(duration=1.5)
+    feed(decoder, data)
+    decoder.finish()
+
+    audio = decoder.decoded_audio(offset=0.0, duration=1.5, channel=None)
+    assert audio is not None
+    np.testing.assert_array_equal(audio, decode_audio(io.BytesIO(data), duration=1.5))
+
+
+def test_decodes_before_the_upload_is_complete() -> None:
+    data = encode("WAV", seconds=30)
+    decoder = streaming_decoder(duration=1.0)
+    # the decoder is done once it has the first second (and whatever the demuxer probes)
+    feed(decoder, data[: len(data) // 2])
+
+    audio = decoder.decoded_audio(offset=0.0, duration=1.0, channel=None)
+    assert audio is not None
+    assert len(audio) == 16000
+
+
+def test_falls_back_to_decoding_the_received_upload() -> None:
+    decoder = streaming_decoder()
+    feed(decoder, encode("WAV"))
+    decoder.finish()
+    # the fields were sent after the file, so the decoder was started without them
+    assert decoder.decoded_audio(offset=1.0, duration=None, channel=None) is None
+
+    decoder = streaming_decoder()
+    feed(decoder, encode_m4a())
+    decoder.finish()
+    assert decoder.decoded_audio(offset=0.0, duration=None, channel=None) is None
+
+    decoder = streaming_decoder()
+    feed(decoder, b"not audio")
+    decoder.finish()
+    assert decoder.decoded_audio(offset=0.0, duration=None, channel=None) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("decode_uploads_while_receiving", [True, False])
+@pytest.mark.parametrize("audio_format", ["OGG", "M4A"])
+async def test_audio_upload_route(
+    mocker: MockerFixture, decode_uploads_while_receiving: bool, audio_format: str
+) -> None:
+    mocker.patch(
+        "speaches.dependencies.get_config",
+        return_value=DEFAULT_CONFIG.model_copy(
+            update={"decode_uploads_while_receiving": decode_uploads_while_receiving}
+        ),
+    )
+    mocker.patch("speaches.dependencies.get_decode_pool", return_value=None)
+    router = APIRouter(route_class=AudioUploadRoute)
+
+    @router.post("/upload")
+    def upload(audio: AudioFileDependency, file: UploadFile) -> dict[str, object]:
+        return {"decoded_while_receiving": isinstance(file, AudioUploadFile), "samples": audio.data.tolist()}
+
+    app = FastAPI()
+    app.include_router(router)
+    data = encode_m4a() if audio_format == "M4A" else encode(audio_format)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post(
+            "/upload", data={"duration": "1.5"}, files={"file": (f"audio.{audio_format.lower()}", data)}
+        )
+    response.raise_for_status()
+
+    assert response.json()["decoded_while_receiving"] == decode_uploads_while_receiving
+    np.testing.assert_allclose(response.json()["samples"], decode_audio(io.BytesIO(data), duration=1.5), atol=1e-6)
@@ -0,0 +1,81 @@
+import openai.types.audio
+from openai.types.audio import TranscriptionSegment, TranscriptionWord
+import pytest
+
+from speaches.routers.stt import ResponseFormat, merge_channel_transcriptions
+
+
+def segment(id_: int, start: float, end: float, text: str) -> TranscriptionSegment:
+    return TranscriptionSegment(
+        id=id_,
+        seek=0,
+        start=start,
+        end=end,
+        text=text,
+        tokens=[],
+        temperature=0.0,
+        avg_logprob=0.0,
+        compression_ratio=0.0,
+        no_speech_prob=0.0,
+    )
+
+
+def transcription(
+    duration: float, segments: list[TranscriptionSegment], words: list[TranscriptionWord] | None = None
+) -> openai.types.audio.TranscriptionVerbose:
+    return openai.types.audio.TranscriptionVerbose(
+        language="en",
+        duration=duration,
+        text="".join(segment.text for segment in segments),
+        segments=segments,
+        words=words,
+    )
+
+
+TRANSCRIPTIONS = [
+    transcription(
+        10,
+        [segment(0, 0.0, 2.0, " Hello."), segment(1, 5.0, 6.0, " Bye.")],
+        [TranscriptionWord(word="Hello.", start=0.0, end=2.0), TranscriptionWord(word="Bye.", start=5.0, end=6.0)],
+    ),
+    transcription(9.5, [segment(0, 3.0, 4.0, " Hi there.")], [TranscriptionWord(word="Hi", start=3.0, end=3.5)]),
+]
+
+
+def test_merge_channel_transcriptions_verbose_json() -> None:
+    res = merge_channel_transcriptions(TRANSCRIPTIONS, "verbose_json")
+
+    assert isinstance(res, openai.types.audio.TranscriptionVerbose)
+    assert res.text == "Hello. Hi there. Bye."
+    assert res.duration == 10
+    assert res.segments is not None
+    assert [(segment.id, segment.start) for segment in res.segments] == [(0, 0.0), (1, 3.0), (2, 5.0)]
+    assert res.words is not None
+    assert [word.word for word in res.words] == ["Hello.", "Hi", "Bye."]
+
+
+def test_merge_channel_transcriptions_without_words() -> None:
+    res = merge_channel_transcriptions([transcription(1, [segment(0, 0.0, 1.0, " Hello.")])], "verbose_json")
+    assert isinstance(res, openai.types.audio.TranscriptionVerbose)
+    assert res.words is None
+
+
+@pytest.mark.parametrize(
+    ("response_format", "expected"),
+    [
+        ("text", ("Hello. Hi there. Bye.", "text/plain")),
+        ("json", openai.types.audio.Transcription(text="Hello. Hi there. Bye.")),
+    ],
+)
+def test_merge_channel_transcriptions(
+    response_format: ResponseFormat, expected: tuple[str, str] | openai.types.audio.Transcription
+) -> None:
+    assert merge_channel_transcriptions(TRANSCRIPTIONS, response_format) == expected
+
+
+def test_merge_channel_transcriptions_subtitles() -> None:
+    res = merge_channel_transcriptions(TRANSCRIPTIONS, "vtt")
+    assert isinstance(res, tuple)
+    text, media_type = res
+    assert media_type == "text/vtt"
+    assert text.index("Hello.") < text.index("Hi there.") < text.index("Bye.")
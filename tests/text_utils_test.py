@@ -3,7 +3,9 @@ import asyncio
 import pytest
 
 from speaches.text_utils import (
+    ClauseChunker,
     EOFTextChunker,
+    split_sentences,
     srt_format_timestamp,
     strip_markdown_emphasis,
     vtt_format_timestamp,
@@ -121,3 +123,67 @@ async def test_eof_text_chunker_closed_error() -> None:
 
     with pytest.raises(RuntimeError):
         chunker.add_token("This should fail")
+
+
+def test_split_sentences() -> None:
+    assert split_sentences("") == []
+    assert split_sentences("Hi.") == ["Hi."]
+    assert split_sentences(
+        'Hello there, how are you doing? Pi is roughly 3.14, not 3! "A quoted sentence here." Short one.\nNew line here.'
+    ) == [
+        "Hello there, how are you doing?",
+        "Pi is roughly 3.14, not 3!",
+        '"A quoted sentence here."',
+        "Short one. New line here.",
+    ]
+    # a trailing short sentence is merged into the previous one
+    assert split_sentences("This is a long enough sentence. Ok.") == ["This is a long enough sentence. Ok."]
+
+
+async def chunk(text: str, token_length: int) -> list[str]:
+    chunker = ClauseChunker()
+    for i in range(0, len(text), token_length):
+        chunker.add_token(text[i : i + token_length])
+    chunker.close()
+    return [chunk async for chunk in chunker]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("token_length", [1, 3, 1000])
+async def test_clause_chunker(token_length: int) -> None:
+    # the first chunk ends at the first clause boundary with enough words, later chunks are whole sentences
+    assert await chunk(
+        "Well, I think that this is fine, but let's see. I went to see Dr. Smith, who said pi is 3.14. Then J. R. R. Tolkien arrived!",
+        token_length,
+    ) == [
+        "Well, I think that this is fine,",
+        "but let's see. I went to see Dr. Smith, who said pi is 3.14.",
+        "Then J. R. R. Tolkien arrived!",
+    ]
+    assert await chunk('"Sure." Here is a list:\n1. First item\n2. Second item', token_length) == [
+        '"Sure."',
+        # shorter than `min_sentence_length`, so the line break doesn't end it
+        "Here is a list:\n1. First item",
+        "2. Second item",
+    ]
+    # "no" only abbreviates "number" when one follows
+    assert await chunk(
+        "Well, I think the answer is no. We should take bus No. 5 because of the rain today.", token_length
+    ) == ["Well, I think the answer is no.", "We should take bus No. 5 because of the rain today."]
+    assert await chunk("", token_length) == []
+
+
+@pytest.mark.asyncio
+async def test_clause_chunker_yields_chunks_before_close() -> None:
+    chunker = ClauseChunker()
+    chunks = aiter(chunker)
+    chunker.add_token("Okay, so the answer is")
+    chunker.add_token(" yes, definitely.")
+    assert await anext(chunks) == "Okay, so the answer is yes,"
+    # "definitely." is too short to be a chunk of its own after the first one
+    chunker.add_token(" Bye")
+    chunker.close()
+    assert [chunk async for chunk in chunks] == ["definitely. Bye"]
+
+    with pytest.raises(RuntimeError):
+        chunker.add_token("This should fail")
@@ -0,0 +1,76 @@
+from collections.abc import Generator
+from pathlib import Path
+
+import numpy as np
+
+from speaches.audio import Audio, float32_to_int16
+from speaches.config import TtsCacheConfig
+from speaches.executors.shared.handler_protocol import SpeechRequest
+from speaches.tts_cache import TtsCache, cache_key
+
+SAMPLE_RATE = 24000
+
+
+def synthesize(num_chunks: int = 3, value: float = 0.5) -> Generator[Audio]:
+    for _ in range(num_chunks):
+        yield Audio(np.full(SAMPLE_RATE, value, dtype=np.float32), sample_rate=SAMPLE_RATE)
+
+
+def collect(audio_generator: Generator[Audio]) -> list[np.typing.NDArray[np.int16]]:
+    return [audio.as_int16() for audio in audio_generator]
+
+
+def test_cache_key_normalizes_whitespace() -> None:
+    request = SpeechRequest(model="model", voice="voice", text="Hello,  world!\n", speed=1.0)
+    assert cache_key(request) == cache_key(request.model_copy(update={"text": " Hello, world!"}))
+    assert cache_key(request) != cache_key(request.model_copy(update={"voice": "other"}))
+    assert cache_key(request) != cache_key(request.model_copy(update={"speed": 1.25}))
+
+
+def test_memory_tier() -> None:
+    cache = TtsCache(TtsCacheConfig(enabled=True))
+    request = SpeechRequest(model="model", voice="voice", text="Hello", speed=1.0)
+    expected = collect(cache.cached(request, synthesize()))
+    assert len(expected) == 3
+
+    started = False
+
+    def should_not_run() -> Generator[Audio]:
+        nonlocal started
+        started = True
+        yield from synthesize()
+
+    chunks = collect(cache.cached(request, should_not_run()))
+    assert not started
+    for chunk, expected_chunk in zip(chunks, expected, strict=True):
+        np.testing.assert_array_equal(chunk, expected_chunk)
+
+
+def test_partially_consumed_output_is_not_stored() -> None:
+    cache = TtsCache(TtsCacheConfig(enabled=True))
+    request = SpeechRequest(model="model", voice="voice", text="Hello", speed=1.0)
+    audio_generator = cache.cached(request, synthesize())
+    next(audio_generator)
+    audio_generator.close()
+    assert cache.get(cache_key(request)) is None
+
+
+def test_disk_tier_and_eviction(tmp_path: Path) -> None:
+    # each entry is 3 * 24000 int16 samples (~140KB), so only one fits in memory and two on disk
+    config = TtsCacheConfig(enabled=True, memory_max_size_mb=0.2, disk_path=tmp_path, disk_max_size_mb=0.3)
+    cache = TtsCache(config)
+    requests = [SpeechRequest(model="model", voice="voice", text=f"Prompt {i}", speed=1.0) for i in range(3)]
+    for i, request in enumerate(requests):
+        collect(cache.cached(request, synthesize(value=i / 10)))
+    assert len(list(tmp_path.glob("*.npz"))) == 2
+    assert cache.get(cache_key(requests[0])) is None
+
+    # a fresh instance picks up the entries that were written to disk
+    cache = TtsCache(config)
+    entry = cache.get(cache_key(requests[1]))
+    assert entry is not None
+    assert entry.sample_rate == SAMPLE_RATE
+    assert [len(chunk) for chunk in entry.chunks] == [SAMPLE_RATE] * 3
+    np.testing.assert_array_equal(
+        np.concatenate(entry.chunks), float32_to_int16(np.full(3 * SAMPLE_RATE, 0.1, dtype=np.float32))
+    )
@@ -1,8 +1,13 @@
+import io
+import json
 from pathlib import Path
 
 import anyio
 from httpx import AsyncClient
+from httpx_sse import aconnect_sse
+import numpy as np
 import pytest
+import soundfile as sf
 
 from speaches.routers.vad import MODEL_ID, SpeechTimestamp
 
@@ -24,4 +29,52 @@ async def test_speech_timestamps_basic(aclient: AsyncClient) -> None:
     assert len(speech_timestamps) == 1
 
 
+@pytest.mark.asyncio
+async def test_speech_timestamps_stream(aclient: AsyncClient) -> None:
+    extension = Path(FILE_PATH).suffix[1:]
+    async with await anyio.open_file(FILE_PATH, "rb") as f:
+        data = await f.read()
+    files = {"file": (f"audio.{extension}", data, f"audio/{extension}")}
+    res = await aclient.post(ENDPOINT, files=files, data={"model": MODEL_ID})
+    res.raise_for_status()
+    expected_speech_timestamps = [SpeechTimestamp.model_validate(x) for x in res.json()]
+
+    events = []
+    async with aconnect_sse(
+        aclient, "POST", ENDPOINT, files=files, data={"model": MODEL_ID, "stream": True}
+    ) as event_source:
+        async for event in event_source.aiter_sse():
+            events.append(json.loads(event.data))  # noqa: PERF401
+
+    probability_events = [event for event in events if event["type"] == "speech.probabilities"]
+    assert len(probability_events) > 0
+    assert all(len(event["probabilities"]) > 0 for event in probability_events)
+    assert any(event["type"] == "speech.segment" for event in events)
+    assert events[-1]["type"] == "speech.timestamps.done"
+    assert [SpeechTimestamp.model_validate(x) for x in events[-1]["timestamps"]] == expected_speech_timestamps
+
+
+@pytest.mark.asyncio
+async def test_speech_timestamps_energy_pre_gate(aclient: AsyncClient) -> None:
+    audio, sample_rate = sf.read(FILE_PATH, dtype="float32")
+    silence = np.zeros(sample_rate * 20, dtype=np.float32)
+    buffer = io.BytesIO()
+    sf.write(
+        buffer, np.concatenate([silence, audio, silence, audio, silence[: sample_rate * 3]]), sample_rate, format="WAV"
+    )
+    files = {"file": ("audio.wav", buffer.getvalue(), "audio/wav")}
+
+    res = await aclient.post(ENDPOINT, files=files, data={"model": MODEL_ID})
+    res.raise_for_status()
+    expected_speech_timestamps = [SpeechTimestamp.model_validate(x) for x in res.json()]
+    res = await aclient.post(ENDPOINT, files=files, data={"model": MODEL_ID, "min_energy_dbfs": -60})
+    res.raise_for_status()
+    speech_timestamps = [SpeechTimestamp.model_validate(x) for x in res.json()]
+
+    assert len(speech_timestamps) == len(expected_speech_timestamps) == 2
+    for speech_timestamp, expected_speech_timestamp in zip(speech_timestamps, expected_speech_timestamps, strict=True):
+        assert speech_timestamp.start == pytest.approx(expected_speech_timestamp.start, abs=100)
+        assert speech_timestamp.end == pytest.approx(expected_speech_timestamp.end, abs=100)
+
+
 # TODO: add more tests